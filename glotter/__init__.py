@@ -1,3 +1,20 @@
-from glotter.settings import Settings
-from glotter.decorators import project_test, project_fixture
-from glotter.__main__ import main as main
\ No newline at end of file
+# these are imported when they are first used, so running a command does not load pytest and the test helpers
+_LAZY_ATTRIBUTES = {
+    'Settings': 'glotter.settings',
+    'project_test': 'glotter.decorators',
+    'project_fixture': 'glotter.decorators',
+    'main': 'glotter.__main__',
+}
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    import importlib
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
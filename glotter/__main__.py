@@ -1,29 +1,42 @@
+import os
 import sys
 import argparse
 
-from glotter.run import run
-from glotter.test import test
-from glotter.download import download
-from glotter.report import report
+# commands are imported when they are chosen, so a command only loads the dependencies it needs and --help loads
+# none of them
 
 
 def main():
+    sys.argv[1:] = _apply_config_option(sys.argv[1:])
+    _forward_to_server(sys.argv[1:])
+    run_command()
+
+
+def run_command():
+    """Run the command in sys.argv"""
     parser = argparse.ArgumentParser(
         prog='glotter',
-        usage='''usage: glotter [-h] COMMAND
+        usage='''usage: glotter [-h] [--config GLOTTER_YML] COMMAND
+
+Options:
+  --config GLOTTER_YML  path to .glotter.yml, instead of searching the current directory for it. Can also be set
+                        with the GLOTTER_CONFIG environment variable
 
 Commands:
   run         Run sources or group of sources. Use `glotter run --help` for more information.
   test        Run tests for sources or a group of sources. Use `glotter test --help` for more information.
   download    Download all the docker images required to run the tests
   report      Output a report of discovered sources for configured projects and languages
+  merge       Merge the result files written by each shard of a run
+  clean       Remove containers and temporary files left behind by runs that were killed
+  serve       Keep sources and containers warm for the run and test commands started in this directory
 '''
     )
     parser.add_argument(
         'command',
         type=str,
         help='Subcommand to run',
-        choices=['run', 'test', 'download', 'report']
+        choices=['run', 'test', 'download', 'report', 'merge', 'clean', 'serve']
     )
     args = parser.parse_args(sys.argv[1:2])
     commands = {
@@ -31,17 +44,62 @@ Commands:
         'run': parse_run,
         'test': parse_test,
         'report': parse_report,
+        'merge': parse_merge,
+        'clean': parse_clean,
+        'serve': parse_serve,
     }
     commands[args.command]()
 
 
+def _apply_config_option(argv):
+    """
+    Handle a --config option given before the command. The path is handed to Settings through the environment, so
+    processes started by the command, such as test workers, use it too
+
+    :param argv: the command line arguments after the program name
+    :return: the arguments without the option
+    """
+    if argv and argv[0].startswith('--config='):
+        path, argv = argv[0].partition('=')[2], argv[1:]
+    elif len(argv) >= 2 and argv[0] == '--config':
+        path, argv = argv[1], argv[2:]
+    else:
+        return argv
+    from glotter.settings import SettingsParser
+    os.environ[SettingsParser.CONFIG_VARIABLE] = os.path.abspath(path)
+    return argv
+
+
+def _forward_to_server(argv):
+    """
+    Hand a run or test to the server started with `glotter serve` in the current directory if there is one. Exits
+    with the command's exit code if it ran there
+
+    :param argv: the command line arguments after the program name
+    """
+    from glotter.server import forward
+    from glotter.settings import SettingsParser
+    code = forward(argv, os.getcwd(), os.environ.get(SettingsParser.CONFIG_VARIABLE))
+    if code is not None:
+        sys.exit(code)
+
+
 def parse_download():
     parser = argparse.ArgumentParser(
         prog='glotter',
         description='Download images for a source or a group of sources. This command can be filtered by language, '
                     'project, or a single source. Only one option may be specified.',
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        metavar='N',
+        type=int,
+        default=4,
+        help='number of images to pull at the same time',
+    )
+    _add_shard_argument(parser)
     args = _parse_args_for_verb(parser)
+    from glotter.download import download
     download(args)
 
 
@@ -51,7 +109,17 @@ def parse_run():
         description='Run a source or a group of sources. This command can be filtered by language, project'
                     'or a single source. Only one option may be specified.',
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        metavar='N',
+        type=int,
+        default=1,
+        help='number of sources to run at the same time',
+    )
+    _add_shard_argument(parser)
+    _add_results_argument(parser)
     args = _parse_args_for_verb(parser)
+    from glotter.run import run
     run(args)
 
 
@@ -61,10 +129,56 @@ def parse_test():
         description='Test a source or a group of sources. This command can be filtered by language, project'
                     'or a single source. Only one option may be specified.',
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        metavar='N',
+        type=int,
+        default=1,
+        help='number of worker processes to spread sources across',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='run every test even if it passed before with the same inputs, and rebuild every source',
+    )
+    _add_shard_argument(parser)
+    _add_results_argument(parser)
     args = _parse_args_for_verb(parser)
+    from glotter.test import test
     test(args)
 
 
+def _parse_shard(value):
+    from glotter.shard import parse_shard
+    return parse_shard(value)
+
+
+def _add_shard_argument(parser):
+    parser.add_argument(
+        '--shard',
+        metavar='I/N',
+        type=_parse_shard,
+        help='only use the I-th of N slices of the sources. Slices are balanced by the durations recorded in the '
+             'cache directory, or in DURATIONS_PATH when it is given, and by number of sources when there are none',
+    )
+    parser.add_argument(
+        '--durations',
+        metavar='DURATIONS_PATH',
+        type=str,
+        help='balance shards by the durations in DURATIONS_PATH, such as a file merged from the results of an earlier '
+             'run. The file is only read, so every machine given the same file picks the same slices',
+    )
+
+
+def _add_results_argument(parser):
+    parser.add_argument(
+        '--results',
+        metavar='RESULTS_PATH',
+        type=str,
+        help='write the outcome and duration of each source or test as json to RESULTS_PATH',
+    )
+
+
 def _parse_args_for_verb(parser):
     group = parser.add_mutually_exclusive_group()
     group.add_argument(
@@ -102,8 +216,64 @@ def parse_report():
         help='output the report as a csv at REPORT_PATH instead of to stdout',
     )
     args = parser.parse_args(sys.argv[2:])
+    from glotter.report import report
     report(args)
 
 
+def parse_merge():
+    parser = argparse.ArgumentParser(
+        prog='glotter',
+        description='Merge the result files written by each shard of a run. The merged file can be given to the '
+                    'next sharded run with --durations to balance its shards',
+    )
+    parser.add_argument(
+        'results',
+        metavar='RESULTS_PATH',
+        nargs='+',
+        type=str,
+        help='result files written with --results',
+    )
+    parser.add_argument(
+        '-o', '--output',
+        metavar='OUTPUT_PATH',
+        type=str,
+        required=True,
+        help='where to write the merged results',
+    )
+    args = parser.parse_args(sys.argv[2:])
+    from glotter.merge import merge
+    merge(args)
+
+
+def parse_clean():
+    parser = argparse.ArgumentParser(
+        prog='glotter',
+        description='Remove containers and temporary files left behind by runs that were killed. Containers are '
+                    'left alone while the process that started them is still running',
+    )
+    parser.add_argument(
+        '--all',
+        action='store_true',
+        help='remove every glotter container, including ones from runs that are still going or that were started '
+             'on other hosts',
+    )
+    args = parser.parse_args(sys.argv[2:])
+    from glotter.clean import clean
+    clean(args)
+
+
+def parse_serve():
+    parser = argparse.ArgumentParser(
+        prog='glotter',
+        description='Keep settings, discovered sources and warm containers in a process that the run and test '
+                    'commands started in this directory hand their work to, so they do not start from scratch. '
+                    'Commands are run one at a time. Set GLOTTER_NO_SERVER to run a command in its own process '
+                    'while the server is up. Restart the server after changing .glotter.yml',
+    )
+    args = parser.parse_args(sys.argv[2:])
+    from glotter.serve import serve
+    serve(args)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,117 @@
+import os
+import hashlib
+import threading
+
+from glotter.settings import Settings
+from glotter.singleton import Singleton
+from glotter.containerfactory import ContainerFactory
+
+
+class BuildCache(metaclass=Singleton):
+    """
+    A cache of build outputs for sources with a build command.
+
+    Entries are keyed by the contents of the source, the id of the image it is built in and the build command. Each
+    entry is a tar archive of the source's directory inside of its container taken right after a successful build.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Initialize a BuildCache. This class is a singleton.
+
+        :param cache_dir: optionally set where build outputs are stored. Defaults to a directory in the cache
+                          directory from .glotter.yml
+        """
+        self._cache_dir = cache_dir or os.path.join(Settings().cache_dir, 'builds')
+        self._hits = 0
+        self._misses = 0
+        self._enabled = True
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """Returns whether builds are restored from the cache. New builds are stored either way"""
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        self._enabled = value
+
+    @property
+    def hits(self):
+        """Returns the number of builds restored from the cache"""
+        return self._hits
+
+    @property
+    def misses(self):
+        """Returns the number of builds that were not found in the cache"""
+        return self._misses
+
+    def get_key(self, source, command):
+        """
+        Get the cache key for building a source
+
+        :param source: the source to build
+        :param command: the build command
+        :return: the cache key as a hex string
+        """
+        digest = hashlib.sha256()
+        with open(source.full_path, 'rb') as file:
+            digest.update(file.read())
+        digest.update(ContainerFactory().get_image_digest(source.test_info.container_info).encode('utf-8'))
+        digest.update(command.encode('utf-8'))
+        return digest.hexdigest()
+
+    def restore(self, source, key):
+        """
+        Restore the build outputs for a source into its container
+
+        :param source: the source being built
+        :param key: the cache key from get_key
+        :return: whether the build outputs were found and restored
+        """
+        if not self._enabled:
+            return False
+
+        try:
+            with open(self._get_path(key), 'rb') as file:
+                archive = file.read()
+        except OSError:
+            self._count(hit=False)
+            return False
+
+        ContainerFactory().import_working_dir(source, archive)
+        self._count(hit=True)
+        return True
+
+    def store(self, source, key):
+        """
+        Store the build outputs of a source from its container. Failing to write the cache is not an error
+
+        :param source: the source that was built
+        :param key: the cache key from get_key
+        """
+        archive = ContainerFactory().export_working_dir(source)
+        path = self._get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as file:
+                file.write(archive)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def summary(self):
+        """Returns a line describing the hits and misses of the cache"""
+        return f'build cache: {self._hits} hits, {self._misses} misses'
+
+    def _get_path(self, key):
+        return os.path.join(self._cache_dir, f'{key}.tar')
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
@@ -0,0 +1,74 @@
+class SourceCatalog:
+    """
+    Every source discovered under a directory, indexed by project type, language and filename so verbs and fixtures
+    can look sources up without walking the directory or scanning every source again.
+
+    Language and filename lookups are case insensitive. They return a dict of project type to sources, in the same
+    shape as get_sources, with only the project types that have matching sources.
+    """
+
+    def __init__(self, sources_by_type):
+        """
+        Initialize a SourceCatalog
+
+        :param sources_by_type: a dict of project type to a list of sources, as returned by get_sources
+        """
+        self._sources_by_type = sources_by_type
+        self._by_language = {}
+        self._by_filename = {}
+        for project_type, sources in sources_by_type.items():
+            for source in sources:
+                self._add(self._by_language, source.language.lower(), project_type, source)
+                self._add(self._by_filename, f'{source.name}{source.extension}'.lower(), project_type, source)
+
+    @classmethod
+    def discover(cls, path):
+        """
+        Create a SourceCatalog of the sources under a directory
+
+        :param path: the directory to discover sources in
+        :return: a new SourceCatalog
+        """
+        from glotter.source import get_sources
+        return cls(get_sources(path))
+
+    @staticmethod
+    def _add(index, key, project_type, source):
+        index.setdefault(key, {}).setdefault(project_type, []).append(source)
+
+    @property
+    def sources_by_type(self):
+        """Returns a dict of project type to a list of sources"""
+        return self._sources_by_type
+
+    @property
+    def sources(self):
+        """Returns a list of every source"""
+        return [source for sources in self._sources_by_type.values() for source in sources]
+
+    def by_project(self, project_type):
+        """
+        Get the sources for a project type
+
+        :param project_type: the project type. Case is ignored
+        :return: a list of sources, empty if the project type is unknown
+        """
+        return self._sources_by_type.get(project_type.lower(), [])
+
+    def by_language(self, language):
+        """
+        Get the sources in a language
+
+        :param language: the language, such as the name of its directory
+        :return: a dict of project type to a list of sources
+        """
+        return self._by_language.get(language.lower(), {})
+
+    def by_filename(self, filename):
+        """
+        Get the sources with a filename
+
+        :param filename: the filename including extension but not the path
+        :return: a dict of project type to a list of sources
+        """
+        return self._by_filename.get(filename.lower(), {})
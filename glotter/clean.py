@@ -0,0 +1,9 @@
+from glotter.settings import Settings
+from glotter.reaper import remove_stale_temp_files
+from glotter.containerfactory import ContainerFactory
+
+
+def clean(args):
+    containers = ContainerFactory().remove_orphans(include_live=args.all)
+    files = remove_stale_temp_files(Settings().cache_dir)
+    print(f'removed {containers} containers and {files} temporary files')
@@ -1,93 +1,650 @@
+import io
+import os
+import re
+import time
+import atexit
 import docker
-import shutil
-import tempfile
+import signal
+import socket
+import hashlib
+import tarfile
+import threading
 
-from datetime import datetime, timedelta
 from uuid import uuid4 as uuid
 
+from glotter.reaper import is_process_running
+from glotter.settings import Settings
 from glotter.singleton import Singleton
+from glotter.execstream import ExecStream
+from glotter.pullprogress import PullProgress
+
+
+# every container glotter starts is labelled so it can be found and removed if glotter does not get to clean it up
+LABEL = 'glotter'
+RUN_ID_LABEL = 'glotter.run_id'
+PID_LABEL = 'glotter.pid'
+HOST_LABEL = 'glotter.host'
+# processes started by a run, such as test workers, inherit its run id through this environment variable
+RUN_ID_VARIABLE = 'GLOTTER_RUN_ID'
+
+
+def get_run_id():
+    """
+    Returns the id of the current run, which labels every container the run starts. It is shared with any
+    processes started after it is first read
+
+    :return: the run id
+    """
+    return os.environ.setdefault(RUN_ID_VARIABLE, uuid().hex)
 
 
 class ContainerFactory(metaclass=Singleton):
+    # containers run "sleep 1h", so stop handing a container out well before it exits
+    MAX_CONTAINER_AGE = 30 * 60
 
-    def __init__(self, docker_client=None):
+    def __init__(self, docker_client=None, pool_size=None, idle_timeout=None, max_containers=None):
         """
         Initialize a ContainerFactory. This class is a singleton.
 
+        Containers are pooled by image and resource limits. Each source leases a container from the pool of its image
+        and gets its own directory inside of it, which the source is streamed into as a tar archive. Nothing is
+        created or copied on the host. When a source is cleaned up its directory is removed and the container is kept
+        warm for the next source that uses the same image.
+
+        Every container is labelled with the run id, so the containers of a run are removed in bulk when the process
+        exits or is terminated, and ones left behind by a run that was killed can be found later.
+
         :param docker_client: optionally set the docker client. Defaults to setting from the environment
+        :param pool_size: number of idle containers to keep warm per image. Defaults to the value in .glotter.yml
+        :param idle_timeout: seconds an idle container is kept before it is removed. Defaults to the value in
+                             .glotter.yml
+        :param max_containers: maximum number of containers across all images. Defaults to the value in .glotter.yml
         """
-        self._containers = {}
-        self._volume_dis = {}
+        settings = Settings()
+        self._pool_size = pool_size if pool_size is not None else settings.container_pool_size
+        self._idle_timeout = idle_timeout if idle_timeout is not None else settings.container_idle_timeout
+        self._max_containers = max_containers if max_containers is not None else settings.max_containers
+        self._pools = {}
+        self._leases = {}
+        self._keep_warm = False
+        self._finished_images = set()
+        self._images = None
+        self._images_lock = threading.Lock()
+        self._lock = threading.RLock()
+        self._released = threading.Condition(self._lock)
         self._client = docker_client or docker.from_env()
         self._api_client = self._client.api
+        self._run_id = get_run_id()
+        atexit.register(self.reap)
+        _install_signal_handlers()
+
+    @property
+    def run_id(self):
+        """Returns the id of the run the containers are labelled with"""
+        return self._run_id
+
+    @property
+    def keep_warm(self):
+        """
+        Returns whether idle containers are kept when the last source of their image is done, such as in a server
+        that runs sources for many invocations. They are still removed once they have been idle for the idle timeout
+        """
+        return self._keep_warm
+
+    @keep_warm.setter
+    def keep_warm(self, value):
+        self._keep_warm = value
 
     def get_container(self, source):
         """
-        Returns a running container for a give source. This will return an existing container if one exists
-        or create a new one if necessary
+        Returns a running container for a give source. This will return the container already leased to the source
+        if one exists or lease one from the pool for the source's image if necessary
 
         :param source: the source to use inside the container
         :return: a running container specific to the source
         """
+        return self._get_lease(source).pooled.container
+
+    def get_working_dir(self, source):
+        """
+        Returns the directory inside of the container that holds the source
+
+        :param source: the source to use inside the container
+        :return: the absolute path to the source's directory inside of its container
+        """
+        return self._get_lease(source).working_dir
+
+    def exec_stream(self, source, command):
+        """
+        Start a command inside the container for a source, in the source's directory. If the command runs longer
+        than the source's timeout its container is removed, since that is the only reliable way to stop it. Sources
+        with a timeout never share their container, so this does not stop the commands of other sources
+
+        :param source: the source to use inside the container
+        :param command: the command to run
+        :return: an ExecStream of the command's output
+        """
+        lease = self._get_lease(source)
+        exec_id = self._api_client.exec_create(lease.pooled.container.id, cmd=command, workdir=lease.working_dir)
+        return ExecStream(
+            self._api_client,
+            exec_id['Id'],
+            command=command,
+            timeout=source.limits.timeout,
+            on_timeout=lambda: self._discard(lease.pooled),
+        )
+
+    def export_working_dir(self, source):
+        """
+        Returns the contents of the source's directory inside of its container
+
+        :param source: the source to use inside the container
+        :return: the contents of the directory as a tar archive
+        """
+        lease = self._get_lease(source)
+        chunks, _ = lease.pooled.container.get_archive(lease.working_dir)
+        # docker archives the directory under its own name, so rename its entries to be relative to it
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=io.BytesIO(b''.join(chunks))) as src, \
+                tarfile.open(fileobj=buffer, mode='w') as dest:
+            for member in src:
+                _, _, relative = member.name.partition('/')
+                member.name = f'./{relative}' if relative else '.'
+                dest.addfile(member, src.extractfile(member) if member.isfile() else None)
+        return buffer.getvalue()
+
+    def import_working_dir(self, source, archive):
+        """
+        Extract an archive into the source's directory inside of its container
+
+        :param source: the source to use inside the container
+        :param archive: a tar archive such as one returned by export_working_dir
+        """
+        lease = self._get_lease(source)
+        lease.pooled.container.put_archive(lease.working_dir, archive)
+
+    def _get_lease(self, source):
+        """
+        Get the lease of a source, leasing a container for it if it has none. The pool is only locked to reserve a
+        container, starting it and copying the source into it happen outside of the lock so other sources can lease
+        containers at the same time
+        """
         key = source.full_path
+        removed = []
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.pooled.removed:
+                del self._leases[key]
+                lease = None
+            if lease is not None:
+                created = False
+            else:
+                pooled, start = self._reserve(source.test_info.container_info, source.limits, key, removed)
+                lease = _Lease(pooled, _get_dir_name(source))
+                self._leases[key] = lease
+                created = True
+        _remove_containers(removed)
+        if not created:
+            lease.wait()
+            return lease
 
-        tmp_dir = tempfile.mkdtemp()
-        shutil.copy(source.full_path, tmp_dir)
-        self._volume_dis[key] = tmp_dir
-
-        image = self.get_image(source.test_info.container_info)
-        volume_info = {tmp_dir: {'bind': '/src', 'mode': 'rw'}}
-        if key not in self._containers:
-            self._containers[key] = self._client.containers.run(
-                image=image,
-                name=f'{source.name}_{uuid().hex}',
-                command='sleep 1h',
-                working_dir='/src',
-                volumes=volume_info,
-                detach=True,
-            )
-        return self._containers[key]
+        try:
+            if start:
+                self._start(lease.pooled, source.test_info.container_info, source.limits)
+            lease.pooled.wait()
+            lease.pooled.container.put_archive('/src', _archive_source(source, lease.dir_name))
+        except BaseException as e:
+            with self._lock:
+                if self._leases.get(key) is lease:
+                    del self._leases[key]
+                lease.pooled.sources.discard(key)
+                self._released.notify_all()
+            lease.fail(e)
+            raise
+        lease.set_ready()
+        return lease
+
+    def _reserve(self, container_info, limits, key, removed):
+        """
+        Reserve a container for an image while holding the lock. Prefer an idle pooled container, then reserve a new
+        one if the container limit allows it. At the limit, the least recently used idle container of any image is
+        evicted. If there is nothing to evict, the least busy container of the image is shared, or we wait until a
+        container is released. Containers are not shared with or by sources with a timeout, since a timeout removes
+        the container.
+
+        :param container_info: metadata about the image
+        :param limits: the ResourceLimits of the container
+        :param key: the key of the source the container is reserved for
+        :param removed: a list that containers to remove once the lock is released are added to
+        :return: a tuple of the _PooledContainer and whether it still needs to be started
+        """
+        pool_key = (container_info.image, str(container_info.tag), limits.cpus, limits.memory)
+        self._finished_images.discard(pool_key[:2])
+        removed.extend(self._evict_idle())
+        while True:
+            pool = self._pools.setdefault(pool_key, [])
+            idle = [pooled for pooled in pool if not pooled.sources]
+            if idle:
+                idle[0].sources.add(key)
+                idle[0].exclusive = limits.timeout is not None
+                return idle[0], False
+
+            if self._count() >= self._max_containers:
+                lru = self._least_recently_used_idle()
+                if lru is not None:
+                    removed.append(self._detach(lru))
+
+            if self._count() < self._max_containers:
+                pooled = _PooledContainer()
+                pooled.sources.add(key)
+                pooled.exclusive = limits.timeout is not None
+                pool.append(pooled)
+                return pooled, True
+
+            shared = [pooled for pooled in pool if not pooled.exclusive] if limits.timeout is None else []
+            if shared:
+                pooled = min(shared, key=lambda p: len(p.sources))
+                pooled.sources.add(key)
+                return pooled, False
+
+            self._released.wait()
+
+    def _start(self, pooled, container_info, limits):
+        try:
+            try:
+                container = self._run(container_info, limits)
+            except docker.errors.ImageNotFound:
+                # the image was removed since it was cached, so look it up again and pull it if necessary
+                self._forget_image(f'{container_info.image}:{str(container_info.tag)}')
+                container = self._run(container_info, limits)
+        except BaseException as e:
+            with self._lock:
+                self._detach(pooled)
+                self._released.notify_all()
+            pooled.fail(e)
+            raise
+        with self._lock:
+            discarded = pooled.removed
+            pooled.container = container
+        if discarded:
+            # the pool was emptied while the container started
+            _remove_containers([container])
+        pooled.set_ready()
+
+    def _run(self, container_info, limits):
+        image = self.get_image(container_info)
+        name = re.sub(r'[^a-zA-Z0-9_.-]', '_', f'{container_info.image}_{container_info.tag}')
+        options = {}
+        if limits.cpus is not None:
+            options['nano_cpus'] = int(float(limits.cpus) * 1e9)
+        if limits.memory is not None:
+            options['mem_limit'] = limits.memory
+        return self._client.containers.run(
+            image=image,
+            name=f'glotter_{name}_{uuid().hex}',
+            command='sleep 1h',
+            working_dir='/src',
+            labels={
+                LABEL: '',
+                RUN_ID_LABEL: self._run_id,
+                PID_LABEL: str(os.getpid()),
+                HOST_LABEL: socket.gethostname(),
+            },
+            detach=True,
+            **options,
+        )
+
+    def _count(self):
+        return sum(len(pool) for pool in self._pools.values())
+
+    def _least_recently_used_idle(self):
+        idle = [pooled for pool in self._pools.values() for pooled in pool if not pooled.sources]
+        return min(idle, key=lambda p: p.last_used) if idle else None
+
+    def evict_idle(self):
+        """
+        Remove the containers that have been idle longer than the idle timeout or are too old to hand out. This
+        happens whenever a container is acquired, so it only needs to be called when containers are kept warm
+        between runs
+        """
+        with self._lock:
+            removed = self._evict_idle()
+        _remove_containers(removed)
+
+    def _evict_idle(self):
+        """Detach the containers to evict while holding the lock. Returns the containers to remove"""
+        now = time.monotonic()
+        removed = []
+        for pool in self._pools.values():
+            for pooled in list(pool):
+                if pooled.sources:
+                    continue
+                if now - pooled.last_used > self._idle_timeout or now - pooled.started > self.MAX_CONTAINER_AGE:
+                    removed.append(self._detach(pooled))
+        return removed
+
+    def _detach(self, pooled):
+        """
+        Take a container out of the pool while holding the lock. Returns the docker container, which is removed
+        after the lock is released, or None if it has not started yet
+        """
+        for pool in self._pools.values():
+            if pooled in pool:
+                pool.remove(pooled)
+        pooled.removed = True
+        return pooled.container
 
-    def get_image(self, container_info, quiet=False):
+    def _discard(self, pooled):
+        with self._lock:
+            removed = [] if pooled.removed else [self._detach(pooled)]
+            self._released.notify_all()
+        _remove_containers(removed)
+
+    def get_image(self, container_info, quiet=False, progress=None):
         """
-        Pull a docker image
+        Pull a docker image. Local images are looked up in a cache filled by listing every image once, so only
+        images missing from the cache cost a call to the docker daemon
 
         :param container_info: metadata about the image to pull
         :param quiet: whether to print output while downloading
+        :param progress: optionally set a PullProgress shared between several pulls. Defaults to a new one for this
+                         pull unless quiet is set
         :return: a docker image
         """
-        images = self._client.images.list(name=f'{container_info.image}:{str(container_info.tag)}')
-        if len(images) == 1:
-            return images[0]
-        if not quiet:
-            print(f'Pulling {container_info.image}:{container_info.tag}... ', end='')
-        last_update = datetime.now()
-        for _ in self._api_client.pull(
+        name = f'{container_info.image}:{str(container_info.tag)}'
+        image = self._find_image(name)
+        if image is not None:
+            return image
+
+        own_progress = progress is None and not quiet
+        if own_progress:
+            print(f'Pulling {name}')
+            progress = PullProgress(1)
+        for event in self._api_client.pull(
                 repository=container_info.image,
                 tag=str(container_info.tag),
                 stream=True,
                 decode=True
         ):
-            if datetime.now() - last_update > timedelta(seconds=5) and not quiet:
-                print('... ', end='')
-                last_update = datetime.now()
-        if not quiet:
-            print('done')
-        images = self._client.images.list(name=f'{container_info.image}:{str(container_info.tag)}')
-        if len(images) == 1:
-            return images[0]
+            if progress is not None:
+                progress.update(name, event)
+        if progress is not None:
+            progress.image_done(name)
+        if own_progress:
+            progress.close()
+        return self._refresh_image(name)
+
+    def get_image_digest(self, container_info, pull=True):
+        """
+        Returns the id of the local image for some container info, pulling the image if necessary
+
+        :param container_info: metadata about the image
+        :param pull: whether to pull the image if it is not available locally
+        :return: the image id, or None if the image is not available locally and pull is not set
+        """
+        if not pull:
+            image = self._find_image(f'{container_info.image}:{str(container_info.tag)}')
+            return image.id if image is not None else None
+        return self.get_image(container_info, quiet=True).id
+
+    def _find_image(self, name):
+        with self._images_lock:
+            if self._images is None:
+                self._images = {tag: image for image in self._client.images.list() for tag in image.tags}
+            if name in self._images:
+                return self._images[name]
+        return self._refresh_image(name)
+
+    def _refresh_image(self, name):
+        try:
+            image = self._client.images.get(name)
+        except docker.errors.ImageNotFound:
+            image = None
+        with self._images_lock:
+            if self._images is not None:
+                if image is None:
+                    self._images.pop(name, None)
+                else:
+                    self._images[name] = image
+        return image
+
+    def _forget_image(self, name):
+        with self._images_lock:
+            if self._images is not None:
+                self._images.pop(name, None)
 
     def cleanup(self, source):
         """
-        Cleanup docker container and temporary folder. Also remove both from their
-        respective dictionaries
+        Release the container leased to a source and remove the source's directory. The container is returned
+        to the pool, or removed if the pool for its image already holds enough idle containers
 
         :param source: source for determining what to cleanup
         """
         key = source.full_path
+        with self._lock:
+            lease = self._leases.pop(key, None)
+            if lease is None:
+                return
+
+            pooled = lease.pooled
+            pooled.sources.discard(key)
+            pooled.last_used = time.monotonic()
+            pool_key, pool = next(
+                ((key, pool) for key, pool in self._pools.items() if pooled in pool), (None, [])
+            )
+            finished = pool_key is not None and pool_key[:2] in self._finished_images
+            removed, clean = [], False
+            if not pooled.removed:
+                if not pooled.sources and (finished or len([p for p in pool if not p.sources]) > self._pool_size):
+                    removed.append(self._detach(pooled))
+                else:
+                    clean = True
+            self._released.notify_all()
+        _remove_containers(removed)
+        if clean and pooled.container is not None:
+            try:
+                pooled.container.exec_run(['rm', '-rf', lease.working_dir])
+            except docker.errors.APIError:
+                # the container is idle once released, so it may have been evicted and removed in the meantime
+                pass
+
+    def cleanup_image(self, container_info):
+        """
+        Remove the containers for an image, such as when no more sources need it. Idle containers are removed now
+        and containers that are still leased are removed once their last source is cleaned up, unless the image is
+        leased again before that. Nothing is removed when containers are kept warm
+
+        :param container_info: metadata about the image
+        """
+        if self._keep_warm:
+            return
+        with self._lock:
+            self._finished_images.add((container_info.image, str(container_info.tag)))
+            removed = [
+                self._detach(pooled)
+                for key, pool in list(self._pools.items())
+                if key[:2] == (container_info.image, str(container_info.tag))
+                for pooled in [pooled for pooled in pool if not pooled.sources]
+            ]
+        _remove_containers(removed)
+
+    def cleanup_all(self):
+        """
+        Remove every container in the pool
+        """
+        with self._lock:
+            self._leases = {}
+            self._finished_images = set()
+            removed = [self._detach(pooled) for pool in list(self._pools.values()) for pooled in list(pool)]
+            self._pools = {}
+            self._released.notify_all()
+        _remove_containers(removed)
+
+    def reap(self, whole_run=False):
+        """
+        Remove every container started by this process in one pass over the labelled containers, including any the
+        pool lost track of. Unlike cleanup_all this does not wait for other threads, so it is safe to call while
+        the process is exiting or handling a signal
+
+        :param whole_run: whether to also remove the containers started by other processes of the same run, such as
+                          test workers that were killed
+        """
+        labels = [f'{RUN_ID_LABEL}={self._run_id}']
+        if not whole_run:
+            labels.append(f'{PID_LABEL}={os.getpid()}')
+        for pool in list(self._pools.values()):
+            for pooled in list(pool):
+                pooled.removed = True
+        self._leases = {}
+        self._pools = {}
+        _remove_containers(self._client.containers.list(all=True, filters={'label': labels}))
+
+    def find_orphans(self, include_live=False):
+        """
+        Find containers left behind by earlier runs. A container is orphaned if it stopped, or if the process that
+        started it on this host is no longer running. Containers started on other hosts are only included with
+        include_live, since there is no way to tell whether their run is still going
+
+        :param include_live: whether to include every glotter container, even ones whose run may still be going
+        :return: a list of docker containers
+        """
+        containers = self._client.containers.list(all=True, filters={'label': LABEL})
+        return [
+            container for container in containers
+            if container.labels.get(RUN_ID_LABEL) != self._run_id and (include_live or _is_orphaned(container))
+        ]
+
+    def remove_orphans(self, include_live=False):
+        """
+        Remove containers left behind by earlier runs
+
+        :param include_live: whether to remove every glotter container, even ones whose run may still be going
+        :return: the number of containers removed
+        """
+        orphans = self.find_orphans(include_live)
+        _remove_containers(orphans)
+        return len(orphans)
+
+
+class _Pending:
+    """Something that is made ready outside of the factory's lock, which other threads may have to wait for"""
+
+    def __init__(self):
+        self._ready = threading.Event()
+        self._error = None
+
+    def set_ready(self):
+        self._ready.set()
+
+    def fail(self, error):
+        self._error = error
+        self._ready.set()
+
+    def wait(self):
+        self._ready.wait()
+        if self._error is not None:
+            raise RuntimeError('container could not be prepared') from self._error
+
+
+class _PooledContainer(_Pending):
+    """A warm container and the sources leasing it. The container is None until it has started"""
+
+    def __init__(self, container=None):
+        super().__init__()
+        self.container = container
+        self.sources = set()
+        # whether the container is leased to a source with a timeout, which must not share it
+        self.exclusive = False
+        self.removed = False
+        self.started = time.monotonic()
+        self.last_used = self.started
+        if container is not None:
+            self.set_ready()
+
+
+class _Lease(_Pending):
+    """A source's directory inside of a pooled container. It is ready once the source is copied into the container"""
+
+    def __init__(self, pooled, dir_name):
+        super().__init__()
+        self.pooled = pooled
+        self.dir_name = dir_name
+
+    @property
+    def working_dir(self):
+        return f'/src/{self.dir_name}'
+
+
+def _remove_containers(containers):
+    for container in containers:
+        if container is None:
+            continue
+        try:
+            container.remove(v=True, force=True)
+        except docker.errors.NotFound:
+            # removed by someone else in the meantime
+            pass
+
+
+def _is_orphaned(container):
+    if container.status not in ('created', 'running'):
+        return True
+    if container.labels.get(HOST_LABEL) != socket.gethostname():
+        return False
+    try:
+        pid = int(container.labels.get(PID_LABEL, ''))
+    except ValueError:
+        return False
+    return not is_process_running(pid)
+
+
+_signal_handlers_installed = False
+
+
+def _install_signal_handlers():
+    """
+    Remove this process's containers when it is told to stop. Interrupts already raise KeyboardInterrupt and run the
+    atexit handlers, so only signals that would end the process without them are handled. Handlers can only be
+    installed from the main thread, so a factory created on another thread first relies on atexit alone
+    """
+    global _signal_handlers_installed
+    if _signal_handlers_installed or threading.current_thread() is not threading.main_thread():
+        return
+    _signal_handlers_installed = True
+    for name in ('SIGTERM', 'SIGHUP'):
+        signum = getattr(signal, name, None)
+        if signum is not None:
+            signal.signal(signum, _make_signal_handler(signal.getsignal(signum)))
+
+
+def _make_signal_handler(previous):
+    def handler(signum, frame):
+        factory = Singleton._instances.get(ContainerFactory)
+        if factory is not None:
+            factory.reap()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            # end the process the way the signal would have
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+    return handler
+
+
+def _get_dir_name(source):
+    """Returns a directory name that is unique to a source, since sources with the same name can share a container"""
+    path_hash = hashlib.sha1(source.full_path.encode('utf-8')).hexdigest()[:8]
+    return re.sub(r'[^a-zA-Z0-9_.-]', '_', f'{source.name}_{path_hash}')
 
-        self._containers[key].remove(v=True, force=True)
-        shutil.rmtree(self._volume_dis[key], ignore_errors=True)
 
-        del self._volume_dis[key]
-        del self._containers[key]
+def _archive_source(source, dir_name):
+    """Returns a tar archive holding a directory with the source file in it"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        directory = tarfile.TarInfo(dir_name)
+        directory.type = tarfile.DIRTYPE
+        directory.mode = 0o777
+        directory.mtime = int(time.time())
+        tar.addfile(directory)
+        tar.add(source.full_path, arcname=f'{dir_name}/{os.path.basename(source.full_path)}')
+    return buffer.getvalue()
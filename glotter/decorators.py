@@ -2,7 +2,6 @@ import pytest
 import functools
 
 from glotter import Settings
-from glotter.source import get_sources
 
 
 def project_test(project_type):
@@ -19,7 +18,7 @@ def project_test(project_type):
 
 
 def project_fixture(project_type):
-    sources = get_sources(Settings().source_root).get(project_type)
+    sources = Settings().source_catalog.by_project(project_type)
     return pytest.fixture(
         scope='module',
         params=sources,
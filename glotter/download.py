@@ -1,24 +1,53 @@
-import os
 import sys
 
-from glotter.source import get_sources
+from concurrent.futures import ThreadPoolExecutor
+
 from glotter.settings import Settings
+from glotter.shard import get_shard_stats
+from glotter.source import render_test_infos
+from glotter.scheduler import ImagePlan
+from glotter.pullprogress import PullProgress
 from glotter.containerfactory import ContainerFactory
 
 
 def download(args):
+    jobs = max(getattr(args, 'jobs', 1), 1)
+    shard = getattr(args, 'shard', None)
+    durations_path = getattr(args, 'durations', None)
     if args.language:
-        _download_language(args.language)
+        _download_language(args.language, jobs, shard, durations_path)
     elif args.project:
-        _download_project(args.project)
+        _download_project(args.project, jobs, shard, durations_path)
     elif args.source:
-        _download_source(args.source)
+        _download_source(args.source, jobs, shard, durations_path)
     else:
-        _download_all()
+        _download_all(jobs, shard, durations_path)
+
+
+def _download_images_from_sources(sources, jobs, shard=None, durations_path=None):
+    """
+    Pull the images needed by some sources. Sources that share an image are pulled once and images are pulled in
+    parallel
 
+    :param sources: the sources to pull images for
+    :param jobs: the number of images to pull at the same time
+    :param shard: optionally only pull the images for this Shard's sources
+    :param durations_path: optionally balance shards by the durations in this file rather than the cache directory
+    """
+    if shard is not None:
+        sources = shard.select(sources, get_shard_stats(durations_path))
+    render_test_infos(sources)
+    container_infos = [group[0].test_info.container_info for group in ImagePlan(sources).groups]
+    if not container_infos:
+        return
 
-def _download_image_from_source(source):
-    ContainerFactory().get_image(source.test_info.container_info)
+    factory = ContainerFactory()
+    progress = PullProgress(len(container_infos))
+    with ThreadPoolExecutor(max_workers=min(jobs, len(container_infos))) as executor:
+        futures = [executor.submit(factory.get_image, info, progress=progress) for info in container_infos]
+        for future in futures:
+            future.result()
+    progress.close()
 
 
 def _error_and_exit(msg):
@@ -26,42 +55,28 @@ def _error_and_exit(msg):
     sys.exit(1)
 
 
-def _download_all():
-    sources_by_type = get_sources(Settings().source_root)
-    for _, sources in sources_by_type.items():
-        for source in sources:
-            _download_image_from_source(source)
+def _download_all(jobs, shard=None, durations_path=None):
+    _download_images_from_sources(Settings().source_catalog.sources, jobs, shard, durations_path)
 
 
-def _download_language(language):
-    sources_by_type = get_sources(path=os.path.join(Settings().source_root, language[0], language))
-    if all([len(sources) <= 0 for _, sources in sources_by_type.items()]):
+def _download_language(language, jobs, shard=None, durations_path=None):
+    sources_by_type = Settings().source_catalog.by_language(language)
+    if not sources_by_type:
         _error_and_exit(f'No valid sources found for language: "{language}"')
-    for project_type, sources in sources_by_type.items():
-        for source in sources:
-            _download_image_from_source(source)
-
-
-def _download_project(project):
-    sources_by_type = get_sources(Settings().source_root)
-    try:
-        Settings().verify_project_type(project)
-        sources = sources_by_type[project]
-        for source in sources:
-            _download_image_from_source(source)
-    except KeyError:
+    _download_images_from_sources([source for sources in sources_by_type.values() for source in sources], jobs,
+                                  shard, durations_path)
+
+
+def _download_project(project, jobs, shard=None, durations_path=None):
+    settings = Settings()
+    sources = settings.source_catalog.by_project(project) if settings.verify_project_type(project) else []
+    if not sources:
         _error_and_exit(f'No valid sources found for project: "{project}"')
+    _download_images_from_sources(sources, jobs, shard, durations_path)
 
 
-def _download_source(source):
-    sources_by_type = get_sources(Settings.source_root)
-    for project_type, sources in sources_by_type.items():
-        for src in sources:
-            if f'{src.name}{src.extension}'.lower() == source.lower():
-                _download_image_from_source(src)
-                break
-        else:  # If didn't break inner loop continue
-            continue
-        break  # Else break this loop as well
-    else:
-        _error_and_exit(f'Source "{source}" could not be found')
+def _download_source(source, jobs, shard=None, durations_path=None):
+    for sources in Settings().find_sources(source).values():
+        _download_images_from_sources(sources[:1], jobs, shard, durations_path)
+        return
+    _error_and_exit(f'Source "{source}" could not be found')
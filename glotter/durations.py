@@ -0,0 +1,138 @@
+import os
+import json
+import threading
+
+from glotter.settings import Settings
+
+
+def get_source_key(source, source_root=None):
+    """
+    Returns a key for a source that is the same in every checkout of the sources
+
+    :param source: the source
+    :param source_root: optionally set the directory the key is relative to. Defaults to the source root from
+                        .glotter.yml
+    :return: the path to the source relative to the source root, with / separators
+    """
+    return os.path.relpath(source.full_path, source_root or Settings().source_root).replace(os.sep, '/')
+
+
+class DurationStats:
+    """
+    How long each source took to build and run in previous runs, used to start the slowest sources first.
+
+    Durations are kept per source in a json file in the cache directory, keyed by the source's path relative to the
+    source root so the file can be shared between checkouts. A new duration is averaged with the previous one so a
+    single slow run does not change the order too much.
+    """
+
+    VERSION = 2
+    # weight of a new duration against the previous average
+    SMOOTHING = 0.5
+    # weight of a source that has never run when no source has run
+    DEFAULT_DURATION = 1.0
+
+    def __init__(self, path=None, read_only=False):
+        """
+        Initialize DurationStats, loading previously recorded durations
+
+        :param path: optionally set where durations are stored. Defaults to a file in the cache directory from
+                     .glotter.yml
+        :param read_only: whether to never write recorded durations back to the file
+        """
+        self._path = path or os.path.join(Settings().cache_dir, 'durations.json')
+        self._read_only = read_only
+        self._source_root = Settings().source_root
+        self._durations = self.load(self._path)
+        self._recorded = {}
+        self._lock = threading.Lock()
+
+    def get(self, source):
+        """
+        Returns the recorded duration of a source
+
+        :param source: the source
+        :return: the duration in seconds or None if the source has not run before
+        """
+        return self._durations.get(self.get_key(source))
+
+    def weight(self, source):
+        """
+        Returns the expected duration of a source, for scheduling. Sources that have not run before are expected to
+        take the average time of the sources that have
+
+        :param source: the source
+        :return: the expected duration in seconds
+        """
+        duration = self.get(source)
+        if duration is not None:
+            return duration
+        if not self._durations:
+            return self.DEFAULT_DURATION
+        return sum(self._durations.values()) / len(self._durations)
+
+    def record(self, source, duration):
+        """
+        Record how long a source took to build and run
+
+        :param source: the source
+        :param duration: the duration in seconds
+        """
+        key = self.get_key(source)
+        with self._lock:
+            previous = self._durations.get(key)
+            if previous is not None:
+                duration = self.SMOOTHING * duration + (1 - self.SMOOTHING) * previous
+            self._durations[key] = duration
+            self._recorded[key] = duration
+
+    def save(self):
+        """
+        Write recorded durations to disk. Durations recorded by other processes since these stats were loaded are
+        kept. Failing to write the file is not an error. Nothing is written for read only stats
+        """
+        with self._lock:
+            if self._read_only or not self._recorded:
+                return
+            durations = self.load(self._path)
+            durations.update(self._recorded)
+            tmp_path = f'{self._path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with open(tmp_path, 'w') as file:
+                    json.dump({'version': self.VERSION, 'durations': durations}, file)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                return
+            self._recorded = {}
+
+    @property
+    def exists(self):
+        """Returns whether any durations were recorded before"""
+        return bool(self._durations)
+
+    def get_key(self, source):
+        """
+        Returns the key a source's duration is stored under
+
+        :param source: the source
+        :return: the path to the source relative to the source root
+        """
+        return get_source_key(source, self._source_root)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read the durations in a file
+
+        :param path: a file written by DurationStats.save or a merged result file
+        :return: a dict of source key to duration, empty if the file is missing or unreadable
+        """
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != cls.VERSION:
+            return {}
+        return data.get('durations', {})
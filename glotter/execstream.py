@@ -0,0 +1,127 @@
+import codecs
+import tempfile
+import threading
+
+
+class ExecStream:
+    """
+    The output of a command running inside of a container, read as it arrives.
+
+    Iterating yields chunks of output as bytes. The exit code is available once the output is exhausted. If the
+    command runs longer than its timeout, on_timeout is called to stop it and the output ends early.
+    """
+
+    # output collected beyond this many bytes is written to a temporary file instead of kept in memory
+    DEFAULT_MAX_MEMORY = 16 * 1024 * 1024
+
+    def __init__(self, api_client, exec_id, command=None, timeout=None, on_timeout=None):
+        """
+        Initialize an ExecStream for an exec that was created but not started
+
+        :param api_client: the low level docker api client
+        :param exec_id: the id of the exec instance
+        :param command: optionally set the command being run, for error messages
+        :param timeout: optionally set the seconds the command may run, counted from when its output is first read
+        :param on_timeout: called from another thread when the timeout expires. It should stop the command, for
+                           example by removing its container
+        """
+        self._api_client = api_client
+        self._exec_id = exec_id
+        self._command = command
+        self._timeout = timeout
+        self._on_timeout = on_timeout
+        self._started = False
+        self._finished = False
+        self._timed_out = False
+        self._exit_code = None
+
+    def __iter__(self):
+        if self._started:
+            raise RuntimeError('exec output can only be read once')
+        self._started = True
+        timer = None
+        if self._timeout is not None:
+            timer = threading.Timer(self._timeout, self._expire)
+            timer.daemon = True
+            timer.start()
+        try:
+            for chunk in self._api_client.exec_start(self._exec_id, stream=True):
+                yield chunk
+        except Exception:
+            # stopping the command can break the connection the output is read from
+            if not self._timed_out:
+                raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        self._finished = True
+
+    @property
+    def command(self):
+        """Returns the command being run"""
+        return self._command
+
+    @property
+    def timeout(self):
+        """Returns the seconds the command may run or None"""
+        return self._timeout
+
+    @property
+    def timed_out(self):
+        """Returns whether the command was stopped because it ran longer than its timeout"""
+        return self._timed_out
+
+    @property
+    def exit_code(self):
+        """Returns the exit code of the command, or None if its output has not been read to the end or it timed out"""
+        if self._finished and not self._timed_out and self._exit_code is None:
+            self._exit_code = self._api_client.exec_inspect(self._exec_id)['ExitCode']
+        return self._exit_code
+
+    def iter_text(self):
+        """Yields the output decoded as utf-8, without splitting characters across chunks"""
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        for chunk in self:
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+    def collect(self, max_memory=None):
+        """
+        Read all of the output
+
+        :param max_memory: optionally set how many bytes are kept in memory before the output is spilled to a
+                           temporary file. Defaults to DEFAULT_MAX_MEMORY
+        :return: a file object positioned at the start of the output. The caller is responsible for closing it
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=max_memory or self.DEFAULT_MAX_MEMORY)
+        for chunk in self:
+            output.write(chunk)
+        output.seek(0)
+        return output
+
+    def _expire(self):
+        self._timed_out = True
+        if self._on_timeout is not None:
+            self._on_timeout()
+
+
+class ExecTimeout(Exception):
+    """Raised when a command inside of a container runs longer than its timeout"""
+
+    def __init__(self, command, timeout, output=None):
+        """
+        Initialize an ExecTimeout
+
+        :param command: the command that timed out
+        :param timeout: the timeout in seconds
+        :param output: optionally the output of the command before it was stopped
+        """
+        message = f'"{command}" timed out after {timeout}s'
+        super().__init__(f'{message} with output:\n{output}' if output is not None else message)
+        self.command = command
+        self.timeout = timeout
+        self.output = output
@@ -0,0 +1,76 @@
+class ResourceLimits:
+    """Limits applied while running a source. A limit that is None is not applied"""
+
+    def __init__(self, timeout=None, cpus=None, memory=None):
+        """
+        Initialize ResourceLimits
+
+        :param timeout: seconds a single command may run before it is stopped
+        :param cpus: number of cpus the container may use, such as 0.5
+        :param memory: memory the container may use, as an integer number of bytes or a string such as "256m"
+        """
+        self._timeout = timeout
+        self._cpus = cpus
+        self._memory = memory
+
+    @property
+    def timeout(self):
+        """Returns the seconds a single command may run before it is stopped"""
+        return self._timeout
+
+    @property
+    def cpus(self):
+        """Returns the number of cpus the container may use"""
+        return self._cpus
+
+    @property
+    def memory(self):
+        """Returns the memory the container may use"""
+        return self._memory
+
+    @classmethod
+    def from_dict(cls, dictionary):
+        """
+        Create ResourceLimits from a dictionary. Keys other than timeout, cpus and memory are ignored
+
+        :param dictionary: a dictionary such as the container section of a testinfo file or a project in .glotter.yml
+        :return: new ResourceLimits
+        """
+        return ResourceLimits(
+            timeout=dictionary.get('timeout'),
+            cpus=dictionary.get('cpus'),
+            memory=dictionary.get('memory'),
+        )
+
+    def to_dict(self):
+        """
+        Create a dictionary from ResourceLimits. Limits that are not set are left out
+
+        :return: the dictionary representing the limits
+        """
+        return {
+            key: value
+            for key, value in (('timeout', self.timeout), ('cpus', self.cpus), ('memory', self.memory))
+            if value is not None
+        }
+
+    def override(self, other):
+        """
+        Combine two sets of limits
+
+        :param other: limits that take precedence over these limits wherever they are set
+        :return: new ResourceLimits
+        """
+        return ResourceLimits(
+            timeout=other.timeout if other.timeout is not None else self.timeout,
+            cpus=other.cpus if other.cpus is not None else self.cpus,
+            memory=other.memory if other.memory is not None else self.memory,
+        )
+
+    def __eq__(self, other):
+        return self.timeout == other.timeout and \
+               self.cpus == other.cpus and \
+               self.memory == other.memory
+
+    def __repr__(self):
+        return f'ResourceLimits(timeout: {self.timeout}, cpus: {self.cpus}, memory: {self.memory})'
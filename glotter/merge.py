@@ -0,0 +1,47 @@
+import sys
+
+from glotter.shard import Shard
+from glotter.resultfile import ResultFile
+
+
+def _error_and_exit(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def merge(args):
+    result_files = []
+    for path in args.results:
+        try:
+            result_files.append(ResultFile.load(path))
+        except (OSError, ValueError) as e:
+            _error_and_exit(f'Could not read result file "{path}": {e}')
+    merged = ResultFile.merge(result_files)
+    merged.save(args.output)
+
+    failed = merged.failed
+    print(f'merged {len(merged.results)} results from {len(result_files)} files, {len(failed)} failed')
+    for result in failed:
+        print(f'{result["outcome"].upper():8} {result["id"]}')
+    missing = get_missing_shards(merged.shards)
+    if missing:
+        print(f'missing shards: {", ".join(str(shard) for shard in missing)}')
+    if failed or missing:
+        sys.exit(1)
+
+
+def get_missing_shards(shards):
+    """
+    Find the shards of a run that have no results
+
+    :param shards: the shards that have results, such as ["1/3", "3/3"]
+    :return: a list of the missing Shards
+    """
+    found = [Shard.from_string(shard) for shard in shards]
+    counts = {shard.count for shard in found}
+    return [
+        Shard(index, count)
+        for count in sorted(counts)
+        for index in range(1, count + 1)
+        if Shard(index, count) not in found
+    ]
@@ -0,0 +1,253 @@
+import pytest
+
+from glotter.source import Source
+from glotter.settings import Settings
+from glotter.scheduler import ImagePlan
+from glotter.execstream import ExecTimeout
+from glotter.resultfile import ResultFile
+from glotter.containerfactory import ContainerFactory
+
+
+def get_item_source(item):
+    """
+    Get the source a collected test runs against
+
+    :param item: a collected pytest item
+    :return: the Source the item is parametrized with or None
+    """
+    callspec = getattr(item, 'callspec', None)
+    if callspec is None:
+        return None
+    return next((param for param in callspec.params.values() if isinstance(param, Source)), None)
+
+
+class SelectionPlugin:
+    """
+    A pytest plugin that keeps only the tests for a language, project or source during collection, so a test run
+    collects once instead of collecting, selecting node ids and starting a second session
+    """
+
+    def __init__(self, language=None, project=None, source=None, paths=None, keep_other_tests=False):
+        """
+        Initialize a SelectionPlugin. Only one of language, project or source is expected to be set
+
+        :param language: only keep tests for sources of this language
+        :param project: only keep tests for this project type
+        :param source: only keep tests for the source with this filename including extension
+        :param paths: optionally only keep tests for sources whose full path is in this collection
+        :param keep_other_tests: whether to keep tests that do not run against a source when only filtering by paths
+        """
+        self._language = language.lower() if language else None
+        self._project = project.lower() if project else None
+        self._source = source.lower() if source else None
+        self._paths = set(paths) if paths is not None else None
+        self._keep_other_tests = keep_other_tests or paths is None
+        self._projects_by_function = None
+        self.selected = []
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, config, items):
+        self._projects_by_function = self._get_projects_by_function()
+        chosen = {id(item) for item in self._select(ItemIndex(items))}
+        selected = []
+        deselected = []
+        for item in items:
+            (selected if id(item) in chosen else deselected).append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+        self.selected = [item.nodeid for item in selected]
+
+    @staticmethod
+    def _get_projects_by_function():
+        settings = Settings()
+        return {
+            function: project_type
+            for project_type in settings.test_mappings
+            for function in settings.get_test_mapping_name(project_type)
+        }
+
+    def _select(self, index):
+        """
+        Look up the selected items in an ItemIndex. Only the test functions of the selected project, and only the
+        entry for the selected source, are looked at instead of every item
+
+        :param index: an ItemIndex of the collected items
+        :return: a list of the selected items
+        """
+        selected = []
+        if self._keep_other_tests and self._language is None and self._project is None and self._source is None:
+            selected.extend(index.get_unmapped(self._projects_by_function))
+        for function, project_type in self._projects_by_function.items():
+            if self._project is not None and project_type != self._project:
+                continue
+            for source, items in index.get(function, self._source):
+                if self.matches_source(project_type, source):
+                    selected.extend(items)
+        return selected
+
+    def matches_source(self, project_type, source):
+        """
+        Check whether the tests for a source are selected
+
+        :param project_type: the project type of the source
+        :param source: the source
+        :return: whether the source's tests are kept
+        """
+        if self._paths is not None and source.full_path not in self._paths:
+            return False
+        if self._language is not None:
+            return source.language.lower() == self._language
+        if self._project is not None:
+            return project_type == self._project
+        if self._source is not None:
+            return f'{source.name}{source.extension}'.lower() == self._source
+        return True
+
+
+class ItemIndex:
+    """Collected items keyed by test function and the filename of the source they are parametrized with"""
+
+    def __init__(self, items):
+        """
+        Index collected items. Items are found under their source's filename, ignoring case, and under None for every
+        source of their test function
+
+        :param items: the collected pytest items
+        """
+        self._index = {}
+        self._unmapped = []
+        for item in items:
+            source = get_item_source(item)
+            if source is None:
+                self._unmapped.append(item)
+                continue
+            function = getattr(item, 'originalname', None) or item.name
+            for filename in (None, f'{source.name}{source.extension}'.lower()):
+                by_source = self._index.setdefault((function, filename), {})
+                by_source.setdefault(id(source), (source, []))[1].append(item)
+
+    def get(self, function, filename=None):
+        """
+        Get the items of a test function
+
+        :param function: the name of the test function
+        :param filename: optionally only get the items for sources with this filename including extension
+        :return: a list of (source, items) tuples
+        """
+        key = (function, filename.lower() if filename is not None else None)
+        return list(self._index.get(key, {}).values())
+
+    def get_unmapped(self, functions):
+        """
+        Get the items that do not run against a source or whose test function is not registered for a project
+
+        :param functions: the names of the test functions registered for a project
+        :return: a list of items
+        """
+        mapped = [
+            item
+            for (function, filename), by_source in self._index.items()
+            if filename is None and function not in functions
+            for _, items in by_source.values()
+            for item in items
+        ]
+        return self._unmapped + mapped
+
+
+class TimeoutReportPlugin:
+    """
+    A pytest plugin that reports tests that failed because a source ran longer than its timeout as TIMEOUT. They
+    still count as failures, so their partial output is shown with the other failures
+    """
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_makereport(self, item, call):
+        outcome = yield
+        if call.excinfo is not None and call.excinfo.errisinstance(ExecTimeout):
+            outcome.get_result().user_properties.append(('glotter', 'timeout'))
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_report_teststatus(self, report):
+        if report.failed and ('glotter', 'timeout') in report.user_properties:
+            return 'failed', 'T', 'TIMEOUT'
+
+
+class ImageAffinityPlugin:
+    """
+    A pytest plugin that runs the tests for sources that share an image back to back, and removes the image's idle
+    containers once its last test is done. Given DurationStats, the slowest images and sources run first
+    """
+
+    def __init__(self, stats=None):
+        self._stats = stats
+        self._plan = None
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        weight = self._stats.weight if self._stats is not None else None
+        self._plan = ImagePlan(items, get_source=get_item_source, weight=weight)
+        items[:] = self._plan.items
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_runtest_teardown(self, item):
+        container_info = self._plan.finish(item) if self._plan is not None else None
+        if container_info is not None:
+            ContainerFactory().cleanup_image(container_info)
+
+
+class DurationPlugin:
+    """A pytest plugin that records how long the tests for each source took in DurationStats"""
+
+    def __init__(self, stats):
+        self._stats = stats
+        self._sources = {}
+        self._durations = {}
+
+    def pytest_collection_modifyitems(self, items):
+        self._sources = {item.nodeid: get_item_source(item) for item in items}
+
+    def pytest_runtest_logreport(self, report):
+        source = self._sources.get(report.nodeid)
+        if source is None or report.skipped:
+            return
+        self._durations.setdefault(source.full_path, [source, 0])[1] += report.duration
+
+    def pytest_sessionfinish(self):
+        for source, duration in self._durations.values():
+            self._stats.record(source, duration)
+        self._stats.save()
+
+
+class ResultFilePlugin:
+    """A pytest plugin that writes the outcome and duration of each test to a ResultFile"""
+
+    def __init__(self, path, shard=None):
+        """
+        Initialize a ResultFilePlugin
+
+        :param path: where to write the results
+        :param shard: optionally the Shard being run
+        """
+        self._path = path
+        self._result_file = ResultFile(shards=[str(shard)] if shard is not None else None)
+        self._sources = {}
+        self._reports = {}
+
+    def pytest_collection_modifyitems(self, items):
+        self._sources = {item.nodeid: get_item_source(item) for item in items}
+
+    def pytest_runtest_logreport(self, report):
+        outcome, duration = self._reports.get(report.nodeid, ('passed', 0))
+        if report.failed and report.when != 'call':
+            outcome = 'error'
+        elif report.failed:
+            outcome = 'timeout' if ('glotter', 'timeout') in report.user_properties else 'failed'
+        elif report.skipped and outcome == 'passed':
+            outcome = 'skipped'
+        self._reports[report.nodeid] = (outcome, duration + report.duration)
+
+    def pytest_sessionfinish(self):
+        for nodeid, (outcome, duration) in self._reports.items():
+            self._result_file.add(nodeid, outcome, duration, source=self._sources.get(nodeid))
+        self._result_file.save(self._path)
@@ -1,5 +1,7 @@
 from enum import Enum, auto
 
+from glotter.limits import ResourceLimits
+
 
 class NamingScheme(Enum):
     hyphen = auto()
@@ -16,11 +18,12 @@ class AcronymScheme(Enum):
 
 
 class Project:
-    def __init__(self, words, requires_parameters=False, acronyms=None, acronym_scheme=None):
+    def __init__(self, words, requires_parameters=False, acronyms=None, acronym_scheme=None, limits=None):
         self._words = words
         self._requires_parameters = requires_parameters
         self._acronyms = [acronym.upper() for acronym in acronyms] if acronyms else []
         self._acronym_scheme = acronym_scheme or AcronymScheme.two_letter_limit
+        self._limits = limits or ResourceLimits()
 
     @property
     def words(self):
@@ -38,6 +41,10 @@ class Project:
     def acronym_scheme(self):
         return self._acronym_scheme
 
+    @property
+    def limits(self):
+        return self._limits
+
     @property
     def display_name(self):
         return self._as_display()
@@ -97,4 +104,5 @@ class Project:
         return self._words == other.words and \
                self._requires_parameters == other.requires_parameters and \
                self._acronyms == other.acronyms and \
-               self._acronym_scheme == other.acronym_scheme
+               self._acronym_scheme == other.acronym_scheme and \
+               self._limits == other.limits
@@ -0,0 +1,102 @@
+import sys
+import threading
+import time
+
+
+class PullProgress:
+    """Aggregates the layer events of one or more image pulls into a single progress line"""
+
+    LAYER_STATUSES = {
+        'Pulling fs layer', 'Waiting', 'Downloading', 'Verifying Checksum', 'Download complete', 'Extracting',
+        'Pull complete', 'Already exists',
+    }
+
+    def __init__(self, total_images, stream=None, interval=None):
+        """
+        Initialize a PullProgress
+
+        :param total_images: the number of images being pulled
+        :param stream: where to write progress. Defaults to stdout
+        :param interval: minimum seconds between progress lines. Defaults to redrawing a single line often when the
+                         stream is a terminal and to writing a new line every few seconds otherwise
+        """
+        self._total_images = total_images
+        self._stream = stream or sys.stdout
+        self._is_tty = self._stream.isatty()
+        self._interval = interval if interval is not None else (0.1 if self._is_tty else 5)
+        self._images_done = 0
+        self._layers = {}
+        self._last_write = 0
+        self._lock = threading.Lock()
+
+    def update(self, image, event):
+        """
+        Record an event from the docker pull stream
+
+        :param image: the image being pulled as image:tag
+        :param event: a decoded event from the pull stream
+        """
+        status = event.get('status')
+        if status not in self.LAYER_STATUSES or 'id' not in event:
+            return
+
+        with self._lock:
+            layer = self._layers.setdefault((image, event['id']), {'current': 0, 'total': 0, 'done': False})
+            detail = event.get('progressDetail') or {}
+            if status == 'Downloading' and detail.get('total'):
+                layer['current'] = detail.get('current', 0)
+                layer['total'] = detail['total']
+            elif status in ('Download complete', 'Pull complete', 'Already exists'):
+                layer['current'] = layer['total']
+            if status in ('Pull complete', 'Already exists'):
+                layer['done'] = True
+            self._write(force=False)
+
+    def image_done(self, image):
+        """
+        Record that an image finished pulling
+
+        :param image: the image that was pulled as image:tag
+        """
+        with self._lock:
+            self._images_done += 1
+            self._write(force=True, message=f'Pulled {image}')
+
+    def close(self):
+        """Write the final progress line"""
+        with self._lock:
+            self._write(force=True)
+            if self._is_tty:
+                self._stream.write('\n')
+                self._stream.flush()
+
+    def summary(self):
+        """Returns a line describing the progress of all pulls"""
+        layers = list(self._layers.values())
+        done = len([layer for layer in layers if layer['done']])
+        current = sum(layer['current'] for layer in layers)
+        total = sum(layer['total'] for layer in layers)
+        return f'{self._images_done}/{self._total_images} images, {done}/{len(layers)} layers, ' \
+               f'{_format_bytes(current)}/{_format_bytes(total)} downloaded'
+
+    def _write(self, force, message=None):
+        now = time.monotonic()
+        if not force and now - self._last_write < self._interval:
+            return
+        self._last_write = now
+        if self._is_tty:
+            line = f'{message}: {self.summary()}' if message else self.summary()
+            self._stream.write(f'\r\033[K{line}')
+        else:
+            if message:
+                self._stream.write(f'{message}\n')
+            self._stream.write(f'{self.summary()}\n')
+        self._stream.flush()
+
+
+def _format_bytes(count):
+    for unit in ('B', 'KB', 'MB'):
+        if count < 1024:
+            return f'{count:.0f} {unit}' if unit == 'B' else f'{count:.1f} {unit}'
+        count /= 1024
+    return f'{count:.1f} GB'
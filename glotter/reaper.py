@@ -0,0 +1,43 @@
+import os
+import re
+
+# temporary files are written as <path>.<pid>[.<thread id>].tmp and renamed into place once complete
+_TEMP_FILE_PATTERN = re.compile(r'\.(\d+)(?:\.\d+)?\.tmp$')
+
+
+def is_process_running(pid):
+    """
+    Check whether a process is running on this host
+
+    :param pid: the process id
+    :return: whether the process exists
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def remove_stale_temp_files(directory):
+    """
+    Remove temporary files left in a directory by processes that were killed while writing them
+
+    :param directory: the directory to search, such as the cache directory
+    :return: the number of files removed
+    """
+    removed = 0
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            match = _TEMP_FILE_PATTERN.search(filename)
+            if match is None or is_process_running(int(match.group(1))):
+                continue
+            try:
+                os.remove(os.path.join(root, filename))
+            except OSError:
+                continue
+            removed += 1
+    return removed
@@ -1,7 +1,6 @@
 import csv
 import sys
 
-from glotter.source import get_sources
 from glotter.settings import Settings
 
 
@@ -31,7 +30,7 @@ class Reporter:
 
     def _collect_language_stats(self):
         language_stats = {}
-        sources_by_type = get_sources(Settings().source_root)
+        sources_by_type = Settings().source_catalog.sources_by_type
 
         for project, sources in sources_by_type.items():
             display_name = self._get_project_display_name(project)
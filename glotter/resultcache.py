@@ -0,0 +1,115 @@
+import os
+import json
+import inspect
+import hashlib
+
+import pytest
+
+from glotter.settings import Settings
+from glotter.plugin import get_item_source
+from glotter.containerfactory import ContainerFactory
+
+
+class ResultCache:
+    """
+    A record of tests that passed.
+
+    A test is recorded under a key built from its node id, the contents of its source, the rendered testinfo of its
+    source, the id of the image the source runs in and the code of the test function. If any of those change the key
+    changes and the test has to run again.
+    """
+
+    def __init__(self, cache_dir=None):
+        """
+        Initialize a ResultCache
+
+        :param cache_dir: optionally set where results are stored. Defaults to a directory in the cache directory
+                          from .glotter.yml
+        """
+        self._cache_dir = cache_dir or os.path.join(Settings().cache_dir, 'results')
+
+    def get_key(self, item):
+        """
+        Get the cache key for a test. Images are not pulled to compute keys, so a test whose image is not available
+        locally has no key yet
+
+        :param item: a collected pytest item
+        :return: the cache key as a hex string or None if the test does not test a source or its image is not local
+        """
+        source = get_item_source(item)
+        if source is None:
+            return None
+        image_digest = ContainerFactory().get_image_digest(source.test_info.container_info, pull=False)
+        if image_digest is None:
+            return None
+
+        digest = hashlib.sha256()
+        digest.update(item.nodeid.encode('utf-8'))
+        with open(source.full_path, 'rb') as file:
+            digest.update(file.read())
+        digest.update(json.dumps(source.test_info.to_dict(), sort_keys=True).encode('utf-8'))
+        digest.update(image_digest.encode('utf-8'))
+        digest.update(inspect.getsource(item.function).encode('utf-8'))
+        return digest.hexdigest()
+
+    def has_passed(self, key):
+        """
+        Check whether a test passed with the given key
+
+        :param key: the cache key from get_key
+        :return: whether the test passed before
+        """
+        return os.path.exists(self._get_path(key))
+
+    def record_pass(self, key):
+        """
+        Record that a test passed. Failing to write the cache is not an error
+
+        :param key: the cache key from get_key
+        """
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(self._get_path(key), 'w'):
+                pass
+        except OSError:
+            pass
+
+    def _get_path(self, key):
+        return os.path.join(self._cache_dir, key)
+
+
+class ResultCachePlugin:
+    """Skips tests whose key matches a previous pass and reports them as cached"""
+
+    def __init__(self, cache=None):
+        self._cache = cache or ResultCache()
+        self._keys = {}
+        self._unkeyed = {}
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, items):
+        for item in items:
+            key = self._cache.get_key(item)
+            if key is None:
+                if get_item_source(item) is not None:
+                    # the image is pulled when the test runs, so the key can be computed once it passed
+                    self._unkeyed[item.nodeid] = item
+                continue
+            self._keys[item.nodeid] = key
+            if self._cache.has_passed(key):
+                item.add_marker(pytest.mark.skip(reason='passed with the same inputs in a previous run'))
+                item.user_properties.append(('glotter', 'cached'))
+
+    def pytest_runtest_logreport(self, report):
+        if report.when != 'call' or not report.passed:
+            return
+        key = self._keys.get(report.nodeid)
+        if key is None and report.nodeid in self._unkeyed:
+            key = self._cache.get_key(self._unkeyed.pop(report.nodeid))
+        if key is not None:
+            self._cache.record_pass(key)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_report_teststatus(self, report):
+        if report.skipped and ('glotter', 'cached') in report.user_properties:
+            return 'cached', 'c', 'CACHED'
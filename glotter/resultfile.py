@@ -0,0 +1,121 @@
+import os
+import json
+
+from glotter.durations import DurationStats, get_source_key
+
+
+class ResultFile:
+    """
+    The outcome of each test or run on one machine, written so the files from every shard of a run can be merged.
+
+    Durations are kept per source in the same format as DurationStats, so a merged result file can be used as the
+    durations file for the next sharded run.
+    """
+
+    def __init__(self, shards=None, results=None, durations=None):
+        """
+        Initialize a ResultFile
+
+        :param shards: optionally set the shards the results are for, such as ["1/4"]
+        :param results: optionally set a list of result dicts with id, outcome and duration keys
+        :param durations: optionally set a dict of source key to the seconds spent on that source
+        """
+        self._shards = list(shards or [])
+        self._results = list(results or [])
+        self._durations = dict(durations or {})
+
+    @property
+    def shards(self):
+        """Returns the shards the results are for"""
+        return self._shards
+
+    @property
+    def results(self):
+        """Returns a list of result dicts with id, outcome and duration keys"""
+        return self._results
+
+    @property
+    def durations(self):
+        """Returns a dict of source key to the seconds spent on that source"""
+        return self._durations
+
+    @property
+    def failed(self):
+        """Returns the results that did not pass or get skipped"""
+        return [result for result in self._results if result['outcome'] not in ('passed', 'skipped')]
+
+    def add(self, result_id, outcome, duration, source=None):
+        """
+        Add the result of a test or run
+
+        :param result_id: what ran, such as a test's node id
+        :param outcome: how it went, such as "passed" or "failed"
+        :param duration: the duration in seconds
+        :param source: optionally the source that ran, whose duration is increased by this duration
+        """
+        self._results.append({'id': result_id, 'outcome': outcome, 'duration': duration})
+        if source is not None:
+            key = get_source_key(source)
+            self._durations[key] = self._durations.get(key, 0) + duration
+
+    def save(self, path):
+        """
+        Write the results
+
+        :param path: where to write the results
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read results written by save
+
+        :param path: the result file
+        :return: the ResultFile
+        """
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    @classmethod
+    def merge(cls, result_files):
+        """
+        Combine the results of several shards. Shards that appear in more than one file, such as the files written by
+        the workers of one shard, are listed once
+
+        :param result_files: the ResultFiles to combine
+        :return: a ResultFile with every shard, result and duration
+        """
+        merged = cls()
+        for result_file in result_files:
+            merged._shards.extend(shard for shard in result_file.shards if shard not in merged._shards)
+            merged._results.extend(result_file.results)
+            for key, duration in result_file.durations.items():
+                merged._durations[key] = merged._durations.get(key, 0) + duration
+        merged._results.sort(key=lambda result: result['id'])
+        return merged
+
+    @classmethod
+    def from_dict(cls, dictionary):
+        """
+        Create a ResultFile from a dictionary
+
+        :param dictionary: a dictionary written by to_dict
+        :return: the ResultFile
+        """
+        if dictionary.get('version') != DurationStats.VERSION:
+            raise ValueError(f'unsupported result file version: {dictionary.get("version")}')
+        return cls(dictionary.get('shards'), dictionary.get('results'), dictionary.get('durations'))
+
+    def to_dict(self):
+        """Returns the results as a dictionary"""
+        return {
+            'version': DurationStats.VERSION,
+            'shards': self._shards,
+            'results': self._results,
+            'durations': self._durations,
+        }
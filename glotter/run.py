@@ -1,19 +1,56 @@
-import os
 import sys
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
-from glotter.source import get_sources
 from glotter.settings import Settings
+from glotter.source import render_test_infos
+from glotter.scheduler import ImagePlan
+from glotter.buildcache import BuildCache
+from glotter.shard import get_shard_stats
+from glotter.durations import DurationStats, get_source_key
+from glotter.resultfile import ResultFile
+from glotter.execstream import ExecTimeout
+from glotter.containerfactory import ContainerFactory
 
 
 def run(args):
+    jobs = max(getattr(args, 'jobs', 1), 1)
     if args.language:
-        _run_language(args.language)
+        runs = _get_language_runs(args.language)
     elif args.project:
-        _run_project(args.project)
+        runs = _get_project_runs(args.project)
     elif args.source:
-        _run_source(args.source)
+        runs = _get_source_runs(args.source)
     else:
-        _run_all()
+        runs = _get_all_runs()
+    stats = DurationStats()
+    shard = getattr(args, 'shard', None)
+    if shard is not None:
+        durations_path = getattr(args, 'durations', None)
+        runs = _select_shard(runs, shard, stats if durations_path is None else get_shard_stats(durations_path))
+    # created before the sources run on worker threads, since the factory only handles signals from the main thread
+    ContainerFactory()
+    BuildCache()
+    render_test_infos([source for source, _ in runs])
+    start = time.monotonic()
+    results = _run_sources(runs, jobs, stats)
+    stats.save()
+    _print_summary(results, time.monotonic() - start)
+    _print_build_cache_summary()
+    results_path = getattr(args, 'results', None)
+    if results_path is not None:
+        _save_results(results, results_path, shard)
+    if any(not result.succeeded for result in results):
+        sys.exit(1)
+
+
+def _print_build_cache_summary():
+    cache = BuildCache()
+    if cache.hits or cache.misses:
+        print()
+        print(cache.summary())
 
 
 def _prompt_params(project_type):
@@ -22,11 +59,193 @@ def _prompt_params(project_type):
     return input(f'input parameters for "{project_type}": ')
 
 
-def _build_and_run(source, params):
+def _collect_runs(sources_by_type):
+    """
+    Pair each source with the parameters for its project type. Parameters are prompted for once per project type,
+    before any source runs
+
+    :param sources_by_type: a dict of project type to the sources to run
+    :return: a list of (source, params) tuples
+    """
+    runs = []
+    for project_type, sources in sources_by_type.items():
+        if not sources:
+            continue
+        params = _prompt_params(project_type)
+        runs.extend((source, params) for source in sources)
+    return runs
+
+
+def _select_shard(runs, shard, stats=None):
+    """
+    Keep only the runs for the sources in a shard
+
+    :param runs: a list of (source, params) tuples
+    :param shard: the Shard to run
+    :param stats: optional DurationStats to balance the shards by
+    :return: the runs for the shard's sources
+    """
+    params = {id(source): p for source, p in runs}
+    selected = shard.select([source for source, _ in runs], stats)
+    print(f'shard {shard}: running {len(selected)} of {len(runs)} sources')
+    return [(source, params[id(source)]) for source in selected]
+
+
+def _save_results(results, path, shard=None):
+    result_file = ResultFile(shards=[str(shard)] if shard is not None else None)
+    for result in results:
+        outcome = 'passed' if result.succeeded else 'timeout' if result.timed_out else 'failed'
+        result_file.add(get_source_key(result.source), outcome, result.duration, source=result.source)
+    result_file.save(path)
+
+
+def _run_sources(runs, jobs, stats=None):
+    """
+    Build and run sources, up to jobs at a time. Sources that share an image run back to back and the image's
+    containers are removed after its last source. Given DurationStats, the slowest sources are started first and
+    each source's duration is recorded. Output is printed line by line as it arrives, with a prefix naming the
+    source
+
+    :param runs: a list of (source, params) tuples
+    :param jobs: the number of sources to run at the same time
+    :param stats: optional DurationStats
+    :return: a list of RunResult in the order the sources were started
+    """
+    if not runs:
+        return []
+    lock = threading.Lock()
+    weight = stats.weight if stats is not None else None
+    plan = ImagePlan(runs, get_source=lambda r: r[0], weight=weight)
+    with ThreadPoolExecutor(max_workers=min(jobs, len(runs))) as executor:
+        futures = []
+        try:
+            for planned_run in plan.items:
+                futures.append(executor.submit(_run_planned, plan, planned_run, lock, stats))
+            return [future.result() for future in futures]
+        except KeyboardInterrupt:
+            # sources that have not started are dropped, running ones finish so their containers are cleaned up
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+            raise
+
+
+def _run_planned(plan, planned_run, lock, stats):
+    source, params = planned_run
+    result = _build_and_run(source, params, lock)
+    if stats is not None:
+        stats.record(source, result.duration)
+    container_info = plan.finish(planned_run)
+    if container_info is not None:
+        ContainerFactory().cleanup_image(container_info)
+    return result
+
+
+def _build_and_run(source, params, lock):
+    output = _PrefixedWriter(_get_prefix(source), lock)
+    start = time.monotonic()
+    error = None
+    try:
+        source.build()
+        stream = source.run_stream(params)
+        for text in stream.iter_text():
+            output.write(text)
+        if stream.timed_out:
+            raise ExecTimeout(stream.command, stream.timeout)
+    except ExecTimeout as e:
+        error = e
+        output.flush()
+        output.write(f'timed out after {e.timeout}s\n')
+    except Exception as e:
+        error = e
+        output.write(f'error: {e}\n')
+    finally:
+        output.flush()
+        source.cleanup()
+    return RunResult(source, time.monotonic() - start, error)
+
+
+def _get_prefix(source):
+    return f'[{source.language}/{source.name}{source.extension}]'
+
+
+def _print_summary(results, elapsed):
+    if not results:
+        return
     print()
-    print(f'Running "{source.name}{source.extension}"...')
-    source.build()
-    print(source.run(params))
+    for result in sorted(results, key=lambda r: r.duration, reverse=True):
+        status = 'ok' if result.succeeded else 'timeout' if result.timed_out else 'failed'
+        print(f'{result.duration:8.2f}s  {status:6}  {_get_prefix(result.source)}')
+    failed = len([result for result in results if not result.succeeded])
+    print(f'ran {len(results)} sources in {elapsed:.2f}s, {failed} failed')
+
+
+class RunResult:
+    """The outcome of building and running one source"""
+
+    def __init__(self, source, duration, error=None):
+        """
+        Initialize a RunResult
+
+        :param source: the source that ran
+        :param duration: seconds spent building and running the source
+        :param error: the exception raised while building or running the source, if any
+        """
+        self._source = source
+        self._duration = duration
+        self._error = error
+
+    @property
+    def source(self):
+        """Returns the source that ran"""
+        return self._source
+
+    @property
+    def duration(self):
+        """Returns the seconds spent building and running the source"""
+        return self._duration
+
+    @property
+    def error(self):
+        """Returns the exception raised while building or running the source or None"""
+        return self._error
+
+    @property
+    def timed_out(self):
+        """Returns whether building or running the source took longer than its timeout"""
+        return isinstance(self._error, ExecTimeout)
+
+    @property
+    def succeeded(self):
+        """Returns whether the source built and ran without raising an error"""
+        return self._error is None
+
+
+class _PrefixedWriter:
+    """Writes complete lines to stdout with a prefix. Partial lines are held until they are completed or flushed"""
+
+    def __init__(self, prefix, lock):
+        self._prefix = prefix
+        self._lock = lock
+        self._pending = ''
+
+    def write(self, text):
+        lines = (self._pending + text).split('\n')
+        self._pending = lines.pop()
+        self._print(lines)
+
+    def flush(self):
+        if self._pending:
+            self._print([self._pending])
+            self._pending = ''
+
+    def _print(self, lines):
+        if not lines:
+            return
+        with self._lock:
+            for line in lines:
+                print(f'{self._prefix} {line}')
+            sys.stdout.flush()
 
 
 def _error_and_exit(msg):
@@ -34,46 +253,26 @@ def _error_and_exit(msg):
     sys.exit(1)
 
 
-def _run_all():
-    sources_by_type = get_sources(Settings().source_root)
-    for project_type, sources in sources_by_type.items():
-        params = _prompt_params(project_type)
-        for source in sources:
-            _build_and_run(source, params)
+def _get_all_runs():
+    return _collect_runs(Settings().source_catalog.sources_by_type)
 
 
-def _run_language(language):
-    sources_by_type = get_sources(path=os.path.join(Settings().source_root, language[0], language))
-    if all([len(sources) <= 0 for _, sources in sources_by_type.items()]):
+def _get_language_runs(language):
+    sources_by_type = Settings().source_catalog.by_language(language)
+    if not sources_by_type:
         _error_and_exit(f'No valid sources found for language: "{language}"')
-    for project_type, sources in sources_by_type.items():
-        for source in sources:
-            params = _prompt_params(project_type)
-            _build_and_run(source, params)
+    return _collect_runs(sources_by_type)
 
 
-def _run_project(project):
-    sources_by_type = get_sources(Settings().source_root)
-    try:
-        Settings().verify_project_type(project)
-        sources = sources_by_type[project]
-        params = _prompt_params(project)
-        for source in sources:
-            _build_and_run(source, params)
-    except KeyError:
+def _get_project_runs(project):
+    settings = Settings()
+    sources = settings.source_catalog.by_project(project) if settings.verify_project_type(project) else []
+    if not sources:
         _error_and_exit(f'No valid sources found for project: "{project}"')
+    return _collect_runs({project.lower(): sources})
 
 
-def _run_source(source):
-    sources_by_type = get_sources(Settings().source_root)
-    for project_type, sources in sources_by_type.items():
-        for src in sources:
-            if f'{src.name}{src.extension}'.lower() == source.lower():
-                params = _prompt_params(project_type)
-                _build_and_run(src, params)
-                break
-        else:  # If didn't break inner loop continue
-            continue
-        break  # Else break this loop as well
-    else:
-        _error_and_exit(f'Source "{source}" could not be found')
+def _get_source_runs(source):
+    for project_type, sources in Settings().find_sources(source).items():
+        return _collect_runs({project_type: sources[:1]})
+    _error_and_exit(f'Source "{source}" could not be found')
@@ -0,0 +1,133 @@
+import threading
+
+
+def partition(items, count, weight=None):
+    """
+    Split items into a number of balanced groups. Items are handed out heaviest first, each to the group with the
+    least total weight so far
+
+    :param items: the items to split
+    :param count: the number of groups to split the items into
+    :param weight: optional function returning the weight of an item. Defaults to 1 for every item
+    :return: a list of ``count`` lists of items. Some lists may be empty if there are fewer items than groups
+    """
+    weight = weight or (lambda _: 1)
+    groups = [[] for _ in range(max(count, 1))]
+    totals = [0] * len(groups)
+    for item in sorted(items, key=weight, reverse=True):
+        index = totals.index(min(totals))
+        groups[index].append(item)
+        totals[index] += weight(item)
+    return groups
+
+
+def partition_by_image(sources, count, weight=None):
+    """
+    Split sources into a number of balanced groups, keeping sources that share an image in the same group. The
+    sources of an image that weigh more than an even share are split into chunks so no group is left empty
+
+    :param sources: the sources to split
+    :param count: the number of groups to split the sources into
+    :param weight: optional function returning the weight of a source. Defaults to 1 for every source
+    :return: a list of ``count`` lists of sources
+    """
+    weight = weight or (lambda _: 1)
+    share = sum(weight(source) for source in sources) / max(count, 1)
+    chunks = []
+    for group in ImagePlan(sources, weight=weight).groups:
+        chunk, total = [], 0
+        for source in group:
+            if chunk and total + weight(source) > share:
+                chunks.append(chunk)
+                chunk, total = [], 0
+            chunk.append(source)
+            total += weight(source)
+        chunks.append(chunk)
+    groups = partition(chunks, count, weight=lambda c: sum(weight(source) for source in c))
+    return [[source for chunk in group for source in chunk] for group in groups]
+
+
+def get_image_key(source):
+    """
+    Returns the image a source runs in
+
+    :param source: the source
+    :return: an (image, tag) tuple
+    """
+    container_info = source.test_info.container_info
+    return container_info.image, str(container_info.tag)
+
+
+class ImagePlan:
+    """
+    Orders work so work for sources that share an image runs back to back, so each image's containers are started
+    once, used by every source that needs them, and can be removed once the image's last source is finished.
+
+    Without weights, images are ordered by where their first source appears. With weights, the heaviest image goes
+    first and the heaviest sources go first within each image, so the longest work is never started last.
+    """
+
+    def __init__(self, items, get_source=None, weight=None):
+        """
+        Initialize an ImagePlan
+
+        :param items: the work to order, such as sources or tests
+        :param get_source: optional function returning the source of an item, or None for items that do not run a
+                           source. Defaults to treating each item as a source
+        :param weight: optional function returning the expected duration of a source
+        """
+        self._get_source = get_source or (lambda item: item)
+        self._groups = {}
+        self._unplanned = []
+        for item in items:
+            source = self._get_source(item)
+            if source is None:
+                self._unplanned.append(item)
+            else:
+                self._groups.setdefault(get_image_key(source), []).append(item)
+        if weight is not None:
+            self._groups = self._order_by_weight(self._groups, weight)
+        self._remaining = {key: len(group) for key, group in self._groups.items()}
+        self._lock = threading.Lock()
+
+    @property
+    def items(self):
+        """Returns every item, image by image. Items that do not run a source come first"""
+        return self._unplanned + [item for group in self._groups.values() for item in group]
+
+    @property
+    def groups(self):
+        """Returns a list with the items for each image"""
+        return list(self._groups.values())
+
+    def _order_by_weight(self, groups, weight):
+        weighted_groups = []
+        for key, group in groups.items():
+            # items for the same source stay together, such as the tests for a source
+            by_source = {}
+            for item in group:
+                source = self._get_source(item)
+                by_source.setdefault(id(source), (weight(source), []))[1].append(item)
+            buckets = sorted(by_source.values(), key=lambda bucket: bucket[0], reverse=True)
+            weighted_groups.append((
+                sum(source_weight for source_weight, _ in buckets),
+                key,
+                [item for _, items in buckets for item in items],
+            ))
+        weighted_groups.sort(key=lambda weighted: weighted[0], reverse=True)
+        return {key: items for _, key, items in weighted_groups}
+
+    def finish(self, item):
+        """
+        Record that an item is done
+
+        :param item: the finished item
+        :return: the ContainerInfo of the item's image if it was the last item for that image, otherwise None
+        """
+        source = self._get_source(item)
+        if source is None:
+            return None
+        key = get_image_key(source)
+        with self._lock:
+            self._remaining[key] -= 1
+            return source.test_info.container_info if self._remaining[key] == 0 else None
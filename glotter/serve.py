@@ -0,0 +1,309 @@
+import os
+import sys
+import site
+import queue
+import select
+import signal
+import socket
+import threading
+import traceback
+
+from contextlib import redirect_stdout, redirect_stderr
+
+from glotter import __main__ as command_line
+from glotter.settings import Settings, SettingsParser
+from glotter.singleton import Singleton
+from glotter.catalog import SourceCatalog
+from glotter.source import get_sources
+from glotter.sourceindex import SourceIndex
+from glotter.buildcache import BuildCache
+from glotter.containerfactory import ContainerFactory
+from glotter.server import Connection, get_socket_path, is_server_running, is_trusted_socket, make_socket_dir
+
+
+def _error_and_exit(msg):
+    print(msg)
+    sys.exit(1)
+
+
+def serve(args):
+    server = Server()
+    if is_server_running(server.path):
+        _error_and_exit(f'A server is already running for this directory on "{server.path}"')
+    print(f'serving runs and tests for "{Settings().project_root}" on "{server.path}", press Ctrl+C to stop')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    except PermissionError as e:
+        _error_and_exit(f'could not serve on "{server.path}": {e}')
+
+
+class Server:
+    """
+    Runs the run and test commands that clients send to a unix socket, one at a time, in a process that stays up
+    between them. A client that is interrupted asks the server to interrupt its command, which then ends the same way
+    it would after Ctrl+C.
+
+    Settings, the SourceIndex and the ContainerFactory are kept between commands, so a command does not import
+    dependencies, load the index or start containers that are still warm from the commands before it. Sources are
+    indexed again before every command, so sources and testinfo files can change while the server is running, but
+    changes to .glotter.yml need a restart.
+    """
+
+    # seconds between checks for containers that have been idle for too long
+    POLL_INTERVAL = 1
+
+    def __init__(self, path=None):
+        """
+        Initialize a Server
+
+        :param path: optionally set the path of the socket. Defaults to the path clients in the current directory
+                     look for
+        """
+        settings = Settings()
+        self._path = path or get_socket_path(settings.project_root, os.environ.get(SettingsParser.CONFIG_VARIABLE))
+        self._index = SourceIndex(settings.source_root)
+        self._catalog = None
+        self._factory = ContainerFactory()
+        self._factory.keep_warm = True
+        self._socket = None
+        # the Event of the running command, set once the command is cancelled
+        self._command = None
+        self._cancel_pending = False
+        self._previous_interrupt_handler = None
+
+    @property
+    def path(self):
+        """Returns the path of the socket the server listens on"""
+        return self._path
+
+    def serve_forever(self):
+        """Handle commands until interrupted. The socket is removed when the server stops"""
+        self._listen()
+        try:
+            while True:
+                readable, _, _ = select.select([self._socket], [], [], self.POLL_INTERVAL)
+                if readable:
+                    self._accept()
+                self._factory.evict_idle()
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop listening and remove the socket"""
+        if self._socket is None:
+            return
+        self._socket.close()
+        self._socket = None
+        if self._previous_interrupt_handler is not None:
+            signal.signal(signal.SIGINT, self._previous_interrupt_handler)
+            self._previous_interrupt_handler = None
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def _listen(self):
+        make_socket_dir(self._path)
+        if os.path.lexists(self._path):
+            if not is_trusted_socket(self._path):
+                raise PermissionError(f'"{self._path}" was not created by a server of the current user')
+            # left behind by a server that was killed
+            os.remove(self._path)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the user running the server may connect, since commands run as that user
+        umask = os.umask(0o077)
+        try:
+            self._socket.bind(self._path)
+        finally:
+            os.umask(umask)
+        self._socket.listen()
+        # commands are cancelled by interrupting the main thread, which only works when it runs the commands
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'pthread_kill'):
+            self._previous_interrupt_handler = signal.signal(signal.SIGINT, self._handle_interrupt)
+
+    def _accept(self):
+        client, _ = self._socket.accept()
+        with client:
+            connection = Connection(client)
+            try:
+                request = connection.receive()
+            except ValueError:
+                return
+            if request is None or 'argv' not in request:
+                return
+            code = self.run_command(connection, request['argv'])
+            try:
+                connection.send({'exit': code})
+            except OSError:
+                pass
+
+    def run_command(self, connection, argv):
+        """
+        Run a command the same way as `glotter` would, with output and input going through a connection to the client
+
+        :param connection: the Connection to the client
+        :param argv: the command line arguments after the program name, starting with the command
+        :return: the exit code of the command
+        """
+        settings = Settings()
+        settings.source_catalog = self._refresh_catalog()
+        # counts are reported at the end of each command
+        Singleton._instances.pop(BuildCache, None)
+        modules = set(sys.modules)
+        # importing the project's tests adds their test mappings, they are added again when the tests are imported again
+        test_mappings = {project_type: list(funcs) for project_type, funcs in settings.test_mappings.items()}
+        lines = queue.Queue()
+        cancelled = threading.Event()
+        program_argv, stdin = sys.argv, sys.stdin
+        sys.argv, sys.stdin = ['glotter'] + argv, _ClientInput(connection, lines)
+        self._command = cancelled
+        try:
+            with redirect_stdout(_ClientOutput(connection, 'out')), redirect_stderr(_ClientOutput(connection, 'err')):
+                try:
+                    try:
+                        threading.Thread(target=self._watch, args=(connection, cancelled, lines), daemon=True).start()
+                        command_line.run_command()
+                    finally:
+                        self._command = None
+                except SystemExit as e:
+                    return _get_exit_code(e.code)
+                except _Cancelled:
+                    print('interrupted', file=sys.stderr)
+                    return 130
+                except Exception:
+                    traceback.print_exc()
+                    return 1
+            return 0
+        finally:
+            self._command = None
+            sys.argv, sys.stdin = program_argv, stdin
+            self._forget_project_modules(modules)
+            settings.test_mappings = test_mappings
+
+    def _watch(self, connection, cancelled, lines):
+        # reads what the client sends while its command runs. A client that goes away cancels its command too
+        while True:
+            try:
+                message = connection.receive()
+            except ValueError:
+                message = None
+            if message is None or 'cancel' in message:
+                self._cancel(cancelled)
+            elif 'line' in message:
+                lines.put(message['line'])
+            if message is None:
+                lines.put('')
+                return
+
+    def _cancel(self, cancelled):
+        if self._previous_interrupt_handler is None or self._command is not cancelled or cancelled.is_set():
+            return
+        cancelled.set()
+        self._cancel_pending = True
+        signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+    def _handle_interrupt(self, signum, frame):
+        if not self._cancel_pending:
+            raise KeyboardInterrupt
+        self._cancel_pending = False
+        # the command may have finished after it was cancelled, then there is nothing left to interrupt
+        if self._command is not None:
+            raise _Cancelled
+
+    def _refresh_catalog(self):
+        # walking the sources only costs a stat per directory, creating the sources costs more, so they are only
+        # created again when something changed. Sources that are kept also keep their rendered testinfo
+        if self._catalog is not None:
+            self._index.refresh()
+            if not self._index.changed:
+                return self._catalog
+        self._catalog = SourceCatalog(get_sources(Settings().source_root, index=self._index))
+        return self._catalog
+
+    @staticmethod
+    def _forget_project_modules(before):
+        # pytest imports tests from the project, so they are imported again by the next command to pick up changes.
+        # Installed packages are kept even when their environment is inside the project, so pytest is only imported
+        # once and the modules that stay imported, such as glotter's plugins, use the same pytest as the tests
+        root = Settings().project_root + os.sep
+        installed = tuple(path for path in _get_install_dirs() if not root.startswith(path))
+        for name in set(sys.modules) - before:
+            path = getattr(sys.modules[name], '__file__', None)
+            if not path or name.split('.')[0] == 'glotter':
+                continue
+            path = os.path.abspath(path)
+            if path.startswith(root) and not path.startswith(installed):
+                del sys.modules[name]
+
+
+def _get_install_dirs():
+    """
+    Returns the directories packages are installed in, such as a virtualenv
+
+    :return: a list of absolute paths ending with a separator
+    """
+    paths = [sys.prefix, sys.exec_prefix, site.getusersitepackages()]
+    # not available in the site module of old virtualenvs
+    paths.extend(getattr(site, 'getsitepackages', lambda: [])())
+    return [os.path.join(os.path.abspath(path), '') for path in paths]
+
+
+class _Cancelled(KeyboardInterrupt):
+    """Raised in a command that was cancelled by its client"""
+
+
+def _get_exit_code(code):
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return int(code)
+    print(code, file=sys.stderr)
+    return 1
+
+
+class _ClientOutput:
+    """A text stream that sends what is written to it to the client"""
+
+    encoding = 'utf-8'
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self._name = name
+        self._closed = False
+
+    def write(self, text):
+        if text and not self._closed:
+            try:
+                self._connection.send({self._name: text})
+            except OSError:
+                # the client went away, which cancels the command
+                self._closed = True
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class _ClientInput:
+    """A text stream that reads lines from the client's stdin when they are asked for"""
+
+    encoding = 'utf-8'
+
+    def __init__(self, connection, lines):
+        self._connection = connection
+        self._lines = lines
+
+    def readline(self):
+        try:
+            self._connection.send({'input': True})
+        except OSError:
+            return ''
+        return self._lines.get()
+
+    def isatty(self):
+        return False
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import stat
+import socket
+import struct
+import hashlib
+import tempfile
+import threading
+
+# this module is imported by every run and test to find a server, so it only uses the standard library. The server
+# itself is in glotter.serve
+
+# set to run commands in the invoking process even when a server is running
+NO_SERVER_VARIABLE = 'GLOTTER_NO_SERVER'
+# commands that are handed to a server, every other command runs in the invoking process
+FORWARDED_COMMANDS = ('run', 'test')
+
+
+def get_socket_dir():
+    """
+    Returns the directory sockets are kept in. It must only be usable by the current user, since whoever can create
+    a socket in it can answer the commands sent to a server. The user's runtime directory is used when there is one,
+    otherwise a directory of the user's own in the temp directory
+
+    :return: the path of the directory
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir and os.path.isabs(runtime_dir):
+        return os.path.join(runtime_dir, 'glotter')
+    # socket paths are limited to about 100 characters, so they are not kept in the cache directory
+    return os.path.join(tempfile.gettempdir(), f'glotter-{_get_uid()}')
+
+
+def get_socket_path(project_root, config_path=None):
+    """
+    Returns the path of the socket a server for a project listens on. Servers are told apart by the directory they
+    were started in and the .glotter.yml they were given, which is what Settings are loaded from
+
+    :param project_root: the directory glotter is run from
+    :param config_path: optionally the .glotter.yml given with --config or GLOTTER_CONFIG
+    :return: the path of the socket
+    """
+    key = f'{os.path.abspath(project_root)}\0{config_path or ""}'
+    name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(get_socket_dir(), f'{name}.sock')
+
+
+def make_socket_dir(path):
+    """
+    Create the directory for a socket, only usable by the current user
+
+    :param path: the path of the socket
+    :raises PermissionError: if the directory already exists and another user can use it
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not _is_private_dir(directory):
+        raise PermissionError(f'"{directory}" must be a directory that only the current user can use')
+
+
+def is_trusted_socket(path):
+    """
+    Check that a socket was created by the current user in a directory no other user can use, so connecting to it
+    reaches a server run by the current user
+
+    :param path: the path of the socket
+    :return: whether the socket can be trusted
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == _get_uid() and _is_private_dir(os.path.dirname(path))
+
+
+def is_server_running(path):
+    """
+    Check whether a server is listening on a socket
+
+    :param path: the path of the socket
+    :return: whether a connection to the socket was accepted
+    """
+    try:
+        client = _connect(path)
+    except OSError:
+        return False
+    client.close()
+    return True
+
+
+def forward(argv, project_root, config_path=None):
+    """
+    Run a command on the server for a project if one is running. Output is written to this process's stdout and
+    stderr as it arrives, and input the command asks for is read from this process's stdin. Interrupting this
+    process interrupts the command
+
+    :param argv: the command line arguments after the program name, starting with the command
+    :param project_root: the directory glotter is run from
+    :param config_path: optionally the .glotter.yml given with --config or GLOTTER_CONFIG
+    :return: the exit code of the command, or None if it was not run because there is no server to run it
+    """
+    if argv[:1] not in [[command] for command in FORWARDED_COMMANDS] or os.environ.get(NO_SERVER_VARIABLE):
+        return None
+    path = get_socket_path(project_root, config_path)
+    if not os.path.exists(path):
+        return None
+    if not is_trusted_socket(path):
+        print(f'ignoring the glotter server socket "{path}" since it is not private to the current user',
+              file=sys.stderr)
+        return None
+    try:
+        client = _connect(path)
+    except OSError:
+        return None
+
+    with client:
+        if not _is_same_user(client):
+            print(f'ignoring the glotter server on "{path}" since it is run by another user', file=sys.stderr)
+            return None
+        try:
+            return _run_on_server(Connection(client), argv)
+        except OSError:
+            pass
+        except KeyboardInterrupt:
+            # interrupted again while the server was interrupting the command
+            return 130
+    print('the glotter server stopped before the command finished', file=sys.stderr)
+    return 1
+
+
+def _run_on_server(connection, argv):
+    connection.send({'argv': argv})
+    cancelled = False
+    while True:
+        try:
+            message = connection.receive()
+            if message is None:
+                raise ConnectionResetError('the server closed the connection')
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'input' in message:
+                connection.send({'line': sys.stdin.readline()})
+            elif 'exit' in message:
+                return message['exit']
+        except KeyboardInterrupt:
+            if cancelled:
+                raise
+            # the server interrupts the command, which still reports its output and exit code
+            connection.send({'cancel': True})
+            cancelled = True
+
+
+def _get_uid():
+    return getattr(os, 'getuid', lambda: 0)()
+
+
+def _is_private_dir(path):
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == _get_uid() and not info.st_mode & 0o077
+
+
+def _is_same_user(client):
+    # the socket's owner was checked before connecting, the peer's credentials are checked too where they are known
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return True
+    credentials = client.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    return uid == _get_uid()
+
+
+def _connect(path):
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('unix sockets are not supported')
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        client.close()
+        raise
+    return client
+
+
+class Connection:
+    """
+    One end of a connection between a client and a server. Messages are dicts sent as json, one per line. A client
+    sends the command to run, then the server sends output, requests for input and finally the exit code. While the
+    command runs, the client sends the lines of input asked for and can ask for the command to be cancelled
+    """
+
+    def __init__(self, sock):
+        """
+        Initialize a Connection
+
+        :param sock: a connected socket
+        """
+        self._socket = sock
+        self._reader = sock.makefile('r', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        """
+        Send a message. Messages can be sent from several threads at once
+
+        :param message: a dict that can be encoded as json
+        :raises OSError: if the other end closed the connection
+        """
+        data = (json.dumps(message) + '\n').encode('utf-8')
+        with self._lock:
+            self._socket.sendall(data)
+
+    def receive(self):
+        """
+        Wait for the next message
+
+        :return: the message, or None if the other end closed the connection
+        """
+        try:
+            line = self._reader.readline()
+        except OSError:
+            return None
+        return json.loads(line) if line else None
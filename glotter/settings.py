@@ -1,10 +1,11 @@
 import os
-import yaml
 
+from collections import deque
 from warnings import warn
 
+from glotter.limits import ResourceLimits
 from glotter.project import Project, AcronymScheme
-from glotter.containerfactory import Singleton
+from glotter.singleton import Singleton
 
 
 class Settings(metaclass=Singleton):
@@ -13,7 +14,12 @@ class Settings(metaclass=Singleton):
         self._parser = SettingsParser(self._project_root)
         self._projects = self._parser.projects
         self._source_root = self._parser.source_root or self._project_root
+        self._cache_dir = self._parser.cache_dir or os.path.join(self._project_root, '.glotter_cache')
+        self._container_pool_size = self._parser.container_pool_size
+        self._container_idle_timeout = self._parser.container_idle_timeout
+        self._max_containers = self._parser.max_containers
         self._test_mappings = {}
+        self._source_catalog = None
 
     @property
     def projects(self):
@@ -30,11 +36,64 @@ class Settings(metaclass=Singleton):
     @source_root.setter
     def source_root(self, value):
         self._source_root = value or self._project_root
+        self._source_catalog = None
+
+    @property
+    def source_catalog(self):
+        """
+        Returns the SourceCatalog of every source under the source root. Sources are discovered the first time the
+        catalog is used and shared by everything in the process after that
+        """
+        if self._source_catalog is None:
+            from glotter.catalog import SourceCatalog
+            self._source_catalog = SourceCatalog.discover(self._source_root)
+        return self._source_catalog
+
+    @source_catalog.setter
+    def source_catalog(self, value):
+        self._source_catalog = value
+
+    def find_sources(self, filename):
+        """
+        Find the sources with a filename. If sources were not discovered yet, only the directories for the
+        filename's extension are searched instead of discovering every source
+
+        :param filename: the filename including extension but not the path. Case is ignored
+        :return: a dict of project type to a list of sources
+        """
+        if self._source_catalog is not None:
+            return self._source_catalog.by_filename(filename)
+        from glotter.source import find_sources
+        return find_sources(self._source_root, filename)
+
+    def refresh_source_catalog(self):
+        """Discover the sources again the next time the catalog is used, such as after sources were added"""
+        self._source_catalog = None
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def container_pool_size(self):
+        return self._container_pool_size
+
+    @property
+    def container_idle_timeout(self):
+        return self._container_idle_timeout
+
+    @property
+    def max_containers(self):
+        return self._max_containers
 
     @property
     def test_mappings(self):
         return self._test_mappings
 
+    @test_mappings.setter
+    def test_mappings(self, value):
+        self._test_mappings = value
+
     def get_test_mapping_name(self, project_type):
         mappings = self._test_mappings.get(project_type)
         if mappings:
@@ -57,13 +116,47 @@ class Settings(metaclass=Singleton):
 
 
 class SettingsParser:
-    def __init__(self, project_root):
+    DEFAULT_CONTAINER_POOL_SIZE = 2
+    DEFAULT_CONTAINER_IDLE_TIMEOUT = 300
+    DEFAULT_MAX_CONTAINERS = 16
+
+    YML_NAME = '.glotter.yml'
+    # the path to .glotter.yml, or to the directory holding it, which skips searching for it
+    CONFIG_VARIABLE = 'GLOTTER_CONFIG'
+    # how many directories below the project root are searched for .glotter.yml
+    MAX_DEPTH_VARIABLE = 'GLOTTER_CONFIG_MAX_DEPTH'
+    DEFAULT_MAX_DEPTH = 8
+    # directories that are not searched for .glotter.yml, separated by commas
+    IGNORED_DIRS_VARIABLE = 'GLOTTER_CONFIG_IGNORED_DIRS'
+    # directories that never hold .glotter.yml but can be very large. Hidden directories are skipped too
+    DEFAULT_IGNORED_DIRS = frozenset(['node_modules', '__pycache__', 'venv', 'build', 'dist', 'target', 'bin', 'obj'])
+
+    def __init__(self, project_root, yml_path=None, max_depth=None, ignored_dirs=None):
+        """
+        Initialize a SettingsParser, locating and parsing .glotter.yml
+
+        :param project_root: the directory to look for .glotter.yml in
+        :param yml_path: optionally set the path to .glotter.yml, or the directory holding it. Defaults to the
+                         GLOTTER_CONFIG environment variable, then to searching the project root
+        :param max_depth: optionally set how many directories below the project root are searched. Defaults to the
+                          GLOTTER_CONFIG_MAX_DEPTH environment variable, then to DEFAULT_MAX_DEPTH
+        :param ignored_dirs: optionally set the names of directories that are not searched. Defaults to the
+                             GLOTTER_CONFIG_IGNORED_DIRS environment variable, then to DEFAULT_IGNORED_DIRS
+        """
         self._project_root = project_root
+        self._configured_yml_path = yml_path or os.environ.get(self.CONFIG_VARIABLE) or None
+        self._max_depth = max_depth if max_depth is not None else \
+            int(os.environ.get(self.MAX_DEPTH_VARIABLE, self.DEFAULT_MAX_DEPTH))
+        self._ignored_dirs = frozenset(ignored_dirs) if ignored_dirs is not None else self._get_ignored_dirs()
         self._yml_path = None
         self._yml = None
         self._acronym_scheme = None
         self._projects = None
         self._source_root = None
+        self._cache_dir = None
+        self._container_pool_size = self.DEFAULT_CONTAINER_POOL_SIZE
+        self._container_idle_timeout = self.DEFAULT_CONTAINER_IDLE_TIMEOUT
+        self._max_containers = self.DEFAULT_MAX_CONTAINERS
         self._yml_path = self._locate_yml()
         if self._yml_path is not None:
             self._yml = self._parse_yml()
@@ -76,6 +169,8 @@ class SettingsParser:
         if self._yml is not None:
             self._acronym_scheme = self._parse_acronym_scheme()
             self._source_root = self._parse_source_root()
+            self._cache_dir = self._parse_cache_dir()
+            self._parse_container_pool()
 
     def parse_projects_section(self):
         if self.yml is not None:
@@ -105,6 +200,22 @@ class SettingsParser:
     def projects(self):
         return self._projects
 
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def container_pool_size(self):
+        return self._container_pool_size
+
+    @property
+    def container_idle_timeout(self):
+        return self._container_idle_timeout
+
+    @property
+    def max_containers(self):
+        return self._max_containers
+
     def _parse_acronym_scheme(self):
         if 'settings' not in self._yml or 'acronym_scheme' not in self._yml['settings']:
             return
@@ -115,6 +226,18 @@ class SettingsParser:
     def _parse_source_root(self):
         return self._parse_root('source_root')
 
+    def _parse_cache_dir(self):
+        return self._parse_root('cache_dir')
+
+    def _parse_container_pool(self):
+        if 'settings' not in self._yml or 'container_pool' not in self._yml['settings']:
+            return
+
+        pool = self._yml['settings']['container_pool'] or {}
+        self._container_pool_size = int(pool.get('size', self._container_pool_size))
+        self._container_idle_timeout = float(pool.get('idle_timeout', self._container_idle_timeout))
+        self._max_containers = int(pool.get('max_containers', self._max_containers))
+
     def _parse_root(self, key):
         if 'settings' not in self._yml or key not in self._yml['settings']:
             return
@@ -136,21 +259,61 @@ class SettingsParser:
                     requires_parameters=v.get('requires_parameters'),
                     acronyms=v.get('acronyms'),
                     acronym_scheme=v.get('acronym_scheme') or self._acronym_scheme,
+                    limits=ResourceLimits.from_dict(v),
                 )
                 projects[project_name] = project
 
         return projects
 
     def _parse_yml(self):
+        # imported here so the command line can read CONFIG_VARIABLE without loading yaml
+        import yaml
+
         with open(self._yml_path, 'r') as f:
             contents = f.read()
 
         return yaml.safe_load(contents)
 
     def _locate_yml(self):
-        for root, dirs, files in os.walk(self._project_root):
-            if '.glotter.yml' in files:
-                path = os.path.abspath(root)
-                return os.path.join(path, '.glotter.yml')
+        """
+        Find .glotter.yml. A configured path is used as is. Otherwise the project root is checked, then the
+        directories below the project root are searched breadth-first so the shallowest .glotter.yml is found without
+        walking the whole tree
+        """
+        if self._configured_yml_path is not None:
+            path = os.path.abspath(os.path.join(self._project_root, self._configured_yml_path))
+            return os.path.join(path, self.YML_NAME) if os.path.isdir(path) else path
+
+        path = os.path.join(os.path.abspath(self._project_root), self.YML_NAME)
+        if os.path.isfile(path):
+            return path
 
+        return self._search_yml()
+
+    def _search_yml(self):
+        queue = deque([(os.path.abspath(self._project_root), 0)])
+        while queue:
+            directory, depth = queue.popleft()
+            try:
+                with os.scandir(directory) as entries:
+                    entries = sorted(entries, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                if entry.name == self.YML_NAME and entry.is_file():
+                    return entry.path
+                if depth < self._max_depth and self._should_search(entry):
+                    subdirs.append(entry.path)
+            queue.extend((subdir, depth + 1) for subdir in subdirs)
         return None
+
+    def _should_search(self, entry):
+        return entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.') and \
+            entry.name not in self._ignored_dirs
+
+    def _get_ignored_dirs(self):
+        value = os.environ.get(self.IGNORED_DIRS_VARIABLE)
+        if value is None:
+            return self.DEFAULT_IGNORED_DIRS
+        return frozenset(name.strip() for name in value.split(',') if name.strip())
@@ -0,0 +1,102 @@
+import argparse
+
+from glotter.scheduler import partition
+from glotter.durations import DurationStats, get_source_key
+
+
+def get_shard_stats(path=None):
+    """
+    Returns the DurationStats to balance shards by
+
+    :param path: optionally a durations file or merged result file to balance by. It is only read, never updated by
+                 the run, so every machine given the same file picks the same slices. Defaults to the durations
+                 recorded in the cache directory, which each machine updates on its own
+    :return: the DurationStats
+    """
+    if path is None:
+        return DurationStats()
+    return DurationStats(path, read_only=True)
+
+
+class Shard:
+    """
+    One of several slices of the sources, so a run can be split across machines. Every machine that is given the same
+    sources and the same recorded durations picks the same slices, so together the shards cover every source once
+    """
+
+    def __init__(self, index, count):
+        """
+        Initialize a Shard
+
+        :param index: the 1-based number of this shard
+        :param count: the total number of shards
+        """
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f'shard {index}/{count} is not between 1/{count} and {count}/{count}')
+        self._index = index
+        self._count = count
+
+    @classmethod
+    def from_string(cls, value):
+        """
+        Parse a shard written as "i/n"
+
+        :param value: the shard, such as "2/4"
+        :return: the Shard
+        """
+        try:
+            index, count = (int(part) for part in value.split('/'))
+        except ValueError:
+            raise ValueError(f'shard "{value}" is not of the form i/n')
+        return cls(index, count)
+
+    @property
+    def index(self):
+        """Returns the 1-based number of this shard"""
+        return self._index
+
+    @property
+    def count(self):
+        """Returns the total number of shards"""
+        return self._count
+
+    @property
+    def is_first(self):
+        """Returns whether this is the first shard, which also runs work that does not belong to a source"""
+        return self._index == 1
+
+    def select(self, sources, stats=None):
+        """
+        Pick this shard's sources. Sources are balanced between shards by their recorded durations when there are
+        any, and by count otherwise
+
+        :param sources: every source to split between the shards
+        :param stats: optional DurationStats
+        :return: a list of the sources in this shard
+        """
+        weight = stats.weight if stats is not None and stats.exists else None
+        # sort first so the split does not depend on the order sources were discovered in
+        ordered = sorted(sources, key=get_source_key)
+        return partition(ordered, self._count, weight=weight)[self._index - 1]
+
+    def __eq__(self, other):
+        return isinstance(other, Shard) and self._index == other._index and self._count == other._count
+
+    def __str__(self):
+        return f'{self._index}/{self._count}'
+
+    def __repr__(self):
+        return f'Shard({self._index}, {self._count})'
+
+
+def parse_shard(value):
+    """
+    Parse a shard given on the command line
+
+    :param value: the shard, such as "2/4"
+    :return: the Shard
+    """
+    try:
+        return Shard.from_string(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
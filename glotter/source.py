@@ -1,28 +1,46 @@
 import os
+import functools
+import threading
 
-import yaml
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from glotter import testinfo
+from glotter.limits import ResourceLimits
 from glotter.settings import Settings
-from glotter.containerfactory import ContainerFactory
+from glotter.execstream import ExecTimeout
+from glotter.sourceindex import SourceIndex
+
+# rendering testinfo templates is spread across processes once at least this many directories need it, below that
+# starting the processes costs more than it saves
+PARALLEL_RENDER_MIN_DIRECTORIES = 32
 
 
 class Source:
     """Metadata about a source file"""
 
-    def __init__(self, name, language, path, test_info_string):
-        """Initialize source
+    def __init__(self, name, language, path, test_info_string, test_info=None, project_type=None, on_render=None):
+        """Initialize source. The testinfo is not rendered until it is first used, so sources that are only listed
+        or filtered never render it
 
         :param name: filename including extension
         :param path: path to the file excluding name
         :param language: the language of the source
         :param test_info_string: a string in yaml format containing testinfo for a directory
+        :param test_info: optionally an already rendered TestInfo for the source, or a function returning one that is
+                          called the first time the TestInfo is used
+        :param project_type: optionally the project type the source implements, used to look up its limits
+        :param on_render: optional function called with the TestInfo after it is rendered from test_info_string
         """
         self._name = name
         self._language = language
         self._path = path
+        self._project_type = project_type
+        self._test_info_string = test_info_string
+        self._on_render = on_render
 
-        self._test_info = testinfo.TestInfo.from_string(test_info_string, self)
+        self._test_info_loader = test_info if callable(test_info) else None
+        self._test_info = None if callable(test_info) else test_info
 
     @property
     def full_path(self):
@@ -49,21 +67,64 @@ class Source:
         """Returns the extension of the source"""
         return os.path.splitext(self._name)[1]
 
+    @property
+    def project_type(self):
+        """Returns the project type the source implements or None if it is not known"""
+        return self._project_type
+
     @property
     def test_info(self):
-        """Returns parsed TestInfo object"""
+        """Returns parsed TestInfo object. It is rendered the first time it is used"""
+        if self._test_info is None:
+            if self._test_info_loader is not None:
+                self._test_info = self._test_info_loader()
+            else:
+                self._set_rendered(testinfo.TestInfo.from_string(self._test_info_string, self))
         return self._test_info
 
+    @property
+    def _needs_rendering(self):
+        return (
+            self._test_info is None
+            and self._test_info_loader is None
+            and testinfo.has_template_syntax(self._test_info_string)
+        )
+
+    def _set_rendered(self, test_info):
+        self._test_info = test_info
+        if self._on_render is not None:
+            self._on_render(test_info)
+
+    @property
+    def limits(self):
+        """Returns the ResourceLimits for the source. Limits in testinfo override the limits of the project"""
+        project = Settings().projects.get(self._project_type) if self._project_type is not None else None
+        project_limits = project.limits if project is not None else ResourceLimits()
+        return project_limits.override(self.test_info.container_info.limits)
+
     def __repr__(self):
         return f'Source(name: {self.name}, path: {self.path})'
 
     def build(self, params=''):
+        """
+        Build the source if it has a build command. Build outputs are restored from the BuildCache when the source,
+        image and build command are unchanged since a previous successful build
+
+        :param params: extra parameters to pass to the build command
+        """
         if self.test_info.container_info.build is not None:
+            from glotter.buildcache import BuildCache
             command = f'{self.test_info.container_info.build} {params}'
+            cache = BuildCache()
+            key = cache.get_key(self, command)
+            if cache.restore(self, key):
+                return
+
             result = self._container_exec(command)
             if result[0] != 0:
                 raise RuntimeError(f'unable to build using cmd "{self.test_info.container_info.build} {params}":\n'
                                    f'{result[1].decode("utf-8")}')
+            cache.store(self, key)
 
     def run(self, params=None):
         """
@@ -71,12 +132,20 @@ class Source:
 
         :param params: input passed to the source as it's run
         :return: the output of running the source
+        :raises ExecTimeout: if the source runs longer than its timeout
         """
-        params = params or ''
-        command = f'{self.test_info.container_info.cmd} {params}'
-        result = self._container_exec(command)
+        result = self._container_exec(self._get_run_command(params))
         return result[1].decode('utf-8')
 
+    def run_stream(self, params=None):
+        """
+        Run the source and stream the output as it arrives
+
+        :param params: input passed to the source as it's run
+        :return: an ExecStream of the output of running the source
+        """
+        return self.stream(self._get_run_command(params))
+
     def exec(self, command):
         """
         Run a command inside the container for a source
@@ -87,41 +156,134 @@ class Source:
         result = self._container_exec(command)
         return result[1].decode('utf-8')
 
+    def stream(self, command):
+        """
+        Run a command inside the container for a source and stream the output as it arrives
+
+        :param command: command to run
+        :return: an ExecStream of the output of the command
+        """
+        # imported here so listing sources, such as for a report, does not load docker
+        from glotter.containerfactory import ContainerFactory
+        return ContainerFactory().exec_stream(self, command)
+
+    def _get_run_command(self, params):
+        return f'{self.test_info.container_info.cmd} {params or ""}'
+
     def _container_exec(self, command):
         """
         Run a command inside the container for a source
 
         :param command: command to run
         :return:  the exit code and output of the command
+        :raises ExecTimeout: if the command runs longer than the source's timeout
         """
-        container = ContainerFactory().get_container(self)
-        return container.exec_run(
-            cmd=command,
-            detach=False,
-            workdir='/src',
-        )
+        stream = self.stream(command)
+        with stream.collect() as output:
+            if stream.timed_out:
+                raise ExecTimeout(command, stream.timeout, output.read().decode('utf-8', errors='replace'))
+            return stream.exit_code, output.read()
 
     def cleanup(self):
+        from glotter.containerfactory import ContainerFactory
         ContainerFactory().cleanup(self)
 
 
-def get_sources(path):
+def get_sources(path, index=None):
     """
-    Walk through a directory and create Source objects
+    Walk through a directory and create Source objects. Testinfo files are looked up in an on-disk SourceIndex so
+    only directories and testinfo files that changed since the last walk are read and parsed again. Testinfo is not
+    rendered until a source uses it, and renders are stored in the index for the next walk
 
     :param path: path to the directory through which to walk
+    :param index: optionally a SourceIndex of the directory that is already loaded, such as one a server keeps between
+                  runs
     :return: a dict where the key is the ProjectType and the value is a list of all the Source objects of that project
     """
     sources = {k: [] for k in Settings().projects}
-    for root, dirs, files in os.walk(path):
-        path = os.path.abspath(root)
-        if "testinfo.yml" in files:
-            with open(os.path.join(path, 'testinfo.yml'), 'r') as file:
-                test_info_string = file.read()
-            folder_info = testinfo.FolderInfo.from_dict(yaml.safe_load(test_info_string)['folder'])
-            folder_project_names = folder_info.get_project_mappings(include_extension=True)
-            for project_type, project_name in folder_project_names.items():
-                if project_name in files:
-                    source = Source(project_name, os.path.basename(path), path, test_info_string)
-                    sources[project_type].append(source)
+    index = index or SourceIndex(path)
+    for directory in index.refresh():
+        folder_info = testinfo.FolderInfo.from_dict(directory.folder)
+        folder_project_names = folder_info.get_project_mappings(include_extension=True)
+        for project_type, project_name in folder_project_names.items():
+            if project_name in directory.files:
+                sources[project_type].append(_get_source(directory, project_name, project_type))
+    index.save()
+    return sources
+
+
+def render_test_infos(sources, jobs=None):
+    """
+    Render the testinfo of sources that are about to be used. When many testinfo templates need rendering, they are
+    rendered across processes. Sources that are already rendered, or whose testinfo is not a template, are left to
+    render when they are used. Processes are only started while this is the only thread, since a process forked from
+    a threaded one can deadlock, so this is called before the sources are handed to threads or pytest
+
+    :param sources: the sources, other objects are ignored
+    :param jobs: optionally set the number of processes to render testinfo templates in. Defaults to the number of
+                 cpus
+    """
+    jobs = jobs or os.cpu_count() or 1
+    pending = {}
+    for source in sources:
+        if isinstance(source, Source) and source._needs_rendering:
+            pending.setdefault((source.path, source._test_info_string), []).append(source)
+    if jobs <= 1 or len(pending) < PARALLEL_RENDER_MIN_DIRECTORIES or threading.active_count() > 1:
+        return
+
+    work = [
+        (path, test_info_string, sorted({source._name for source in directory_sources}))
+        for (path, test_info_string), directory_sources in pending.items()
+    ]
+    try:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as executor:
+            results = list(executor.map(_render_directory, work, chunksize=max(len(work) // (jobs * 4), 1)))
+    except (OSError, BrokenProcessPool):
+        # processes are not available, so sources are rendered one by one as they are used
+        return
+    for directory_sources, rendered in zip(pending.values(), results):
+        for source in directory_sources:
+            source._set_rendered(testinfo.TestInfo.from_dict(rendered[source._name]))
+
+
+def _render_directory(work):
+    path, test_info_string, filenames = work
+    language = os.path.basename(path)
+    return {
+        filename: Source(filename, language, path, test_info_string).test_info.to_dict()
+        for filename in filenames
+    }
+
+
+def find_sources(path, filename):
+    """
+    Find the sources with a filename without creating a Source for every other file. Only directories whose testinfo
+    has the filename's extension are considered
+
+    :param path: path to the directory through which to walk
+    :param filename: the filename including extension but not the path. Case is ignored
+    :return: a dict where the key is the ProjectType and the value is a list of the matching Source objects
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    sources = {}
+    index = SourceIndex(path)
+    for directory in index.refresh():
+        if str(directory.folder.get('extension', '')).lower() != extension:
+            continue
+        folder_info = testinfo.FolderInfo.from_dict(directory.folder)
+        for project_type, project_name in folder_info.get_project_mappings(include_extension=True).items():
+            if project_name.lower() == filename.lower() and project_name in directory.files:
+                sources.setdefault(project_type, []).append(_get_source(directory, project_name, project_type))
+    index.save()
     return sources
+
+
+def _get_source(directory, filename, project_type):
+    language = os.path.basename(directory.path)
+    rendered = directory.get_rendered(filename)
+    if rendered is not None:
+        return Source(filename, language, directory.path, directory.test_info_string,
+                      test_info=functools.partial(testinfo.TestInfo.from_dict, rendered), project_type=project_type)
+
+    return Source(filename, language, directory.path, directory.test_info_string, project_type=project_type,
+                  on_render=lambda test_info: directory.set_rendered(filename, test_info.to_dict()))
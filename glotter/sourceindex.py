@@ -0,0 +1,266 @@
+import os
+import json
+import atexit
+import hashlib
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from glotter.settings import Settings
+from glotter.testinfo import load_yaml
+
+# changed testinfo files are parsed across processes once at least this many need it, below that starting the
+# processes costs more than it saves
+PARALLEL_PARSE_MIN_FILES = 32
+
+
+class SourceIndex:
+    """
+    An on-disk index of the testinfo files under a directory.
+
+    The index remembers the modification time and subdirectories of every directory it has walked, along with the
+    contents, parsed folder section, files and rendered testinfo of every directory containing a testinfo.yml.
+    Directories whose modification time is unchanged are not listed again and testinfo files whose modification
+    time is unchanged are not read or parsed again.
+    """
+
+    VERSION = 1
+
+    def __init__(self, root, index_path=None):
+        """
+        Initialize a SourceIndex
+
+        :param root: the directory to index
+        :param index_path: where to store the index. Defaults to a file in the cache directory from .glotter.yml
+        """
+        self._root = os.path.abspath(root)
+        self._index_path = index_path or self._default_index_path(self._root)
+        self._dirs = {}
+        self._dirty = False
+        self._changed = False
+        self._save_at_exit_registered = False
+        self._unparsed = []
+        self._load()
+
+    @property
+    def root(self):
+        """Returns the absolute path of the indexed directory"""
+        return self._root
+
+    @property
+    def index_path(self):
+        """Returns the path of the file the index is stored in"""
+        return self._index_path
+
+    @property
+    def changed(self):
+        """
+        Returns whether the last refresh found directories or testinfo files that were added, removed or changed since
+        the refresh before it, or since the index was loaded
+        """
+        return self._changed
+
+    @staticmethod
+    def _default_index_path(root):
+        name = hashlib.sha1(root.encode('utf-8')).hexdigest()
+        return os.path.join(Settings().cache_dir, 'sources', f'{name}.json')
+
+    def _load(self):
+        try:
+            with open(self._index_path, 'r') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return
+        if index.get('version') == self.VERSION and index.get('root') == self._root:
+            self._dirs = index['dirs']
+
+    def save(self):
+        """
+        Write the index to disk if anything changed since it was loaded. Failing to write the index is not an error,
+        the next run will just walk the directory again
+        """
+        if not self._dirty:
+            return
+        index = {'version': self.VERSION, 'root': self._root, 'dirs': self._dirs}
+        tmp_path = f'{self._index_path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._index_path), exist_ok=True)
+            with open(tmp_path, 'w') as file:
+                # dumps uses the C encoder, dump does not
+                file.write(json.dumps(index))
+            os.replace(tmp_path, self._index_path)
+            self._dirty = False
+        except OSError:
+            pass
+
+    def refresh(self):
+        """
+        Bring the index up to date with the filesystem
+
+        :return: a list of IndexedDirectory for every directory containing a testinfo.yml in walk order
+        """
+        self._changed = False
+        self._unparsed = []
+        seen = {}
+        directories = []
+        stack = [self._root]
+        while stack:
+            path = stack.pop()
+            record = self._refresh_dir(path)
+            if record is None:
+                continue
+            seen[path] = record
+            if record['testinfo'] is not None:
+                directories.append(IndexedDirectory(self, path, record['testinfo']))
+            stack.extend(os.path.join(path, name) for name in reversed(record['subdirs']))
+
+        # changed testinfo files are only read during the walk, so they can be parsed together
+        for testinfo, folder in zip(self._unparsed, _parse_folders([t['contents'] for t in self._unparsed])):
+            testinfo['folder'] = folder
+        self._unparsed = []
+
+        if seen.keys() != self._dirs.keys():
+            self._dirty = True
+            self._changed = True
+        self._dirs = seen
+        return directories
+
+    def _refresh_dir(self, path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        record = self._dirs.get(path)
+        if record is None or record['mtime'] != mtime:
+            record = self._list_dir(path, mtime, record)
+            self._dirty = True
+            self._changed = True
+        elif record['testinfo'] is not None:
+            self._refresh_testinfo(path, record)
+        return record
+
+    def _list_dir(self, path, mtime, old_record):
+        subdirs = []
+        files = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir() and not entry.is_symlink():
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        record = {'mtime': mtime, 'subdirs': sorted(subdirs), 'testinfo': None}
+        if 'testinfo.yml' in files:
+            record['testinfo'] = old_record['testinfo'] if old_record is not None else None
+            self._refresh_testinfo(path, record)
+            record['testinfo']['files'] = sorted(files)
+        return record
+
+    def _refresh_testinfo(self, path, record):
+        testinfo_path = os.path.join(path, 'testinfo.yml')
+        try:
+            mtime = os.stat(testinfo_path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        testinfo = record['testinfo']
+        if testinfo is not None and testinfo['mtime'] == mtime:
+            return
+
+        with open(testinfo_path, 'r') as file:
+            contents = file.read()
+        record['testinfo'] = {
+            'mtime': mtime,
+            'contents': contents,
+            'folder': None,
+            'files': testinfo['files'] if testinfo is not None else [],
+            'rendered': {},
+        }
+        self._unparsed.append(record['testinfo'])
+        self._dirty = True
+        self._changed = True
+
+    def _remember_rendered(self, testinfo, filename, rendered):
+        testinfo['rendered'][filename] = rendered
+        self._dirty = True
+        # sources are rendered when they are first used, which is usually after the walk that saved the index
+        if not self._save_at_exit_registered:
+            atexit.register(self._save_at_exit)
+            self._save_at_exit_registered = True
+
+    def _save_at_exit(self):
+        if os.path.isdir(self._root):
+            self.save()
+
+
+def _parse_folders(contents, jobs=None):
+    """
+    Parse the folder section of testinfo files. When many files need parsing, they are parsed across processes.
+    Processes are only started while this is the only thread, since a process forked from a threaded one can deadlock
+
+    :param contents: a list of the contents of testinfo files
+    :param jobs: optionally set the number of processes to parse in. Defaults to the number of cpus
+    :return: a list of the parsed folder sections in the same order
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(contents) >= PARALLEL_PARSE_MIN_FILES and threading.active_count() == 1:
+        try:
+            with ProcessPoolExecutor(max_workers=min(jobs, len(contents))) as executor:
+                return list(executor.map(_parse_folder, contents, chunksize=max(len(contents) // (jobs * 4), 1)))
+        except (OSError, BrokenProcessPool):
+            # processes are not available, so files are parsed in this process
+            pass
+    return [_parse_folder(string) for string in contents]
+
+
+def _parse_folder(contents):
+    return load_yaml(contents)['folder']
+
+
+class IndexedDirectory:
+    """A directory containing a testinfo.yml as recorded in a SourceIndex"""
+
+    def __init__(self, index, path, testinfo):
+        self._index = index
+        self._path = path
+        self._testinfo = testinfo
+
+    @property
+    def path(self):
+        """Returns the absolute path of the directory"""
+        return self._path
+
+    @property
+    def test_info_string(self):
+        """Returns the contents of the directory's testinfo.yml"""
+        return self._testinfo['contents']
+
+    @property
+    def folder(self):
+        """Returns the parsed folder section of the directory's testinfo.yml"""
+        return self._testinfo['folder']
+
+    @property
+    def files(self):
+        """Returns the names of the files in the directory"""
+        return self._testinfo['files']
+
+    def get_rendered(self, filename):
+        """
+        Get the rendered testinfo for a source in the directory if it was stored
+
+        :param filename: the source filename including extension
+        :return: the rendered testinfo as a dictionary or None
+        """
+        return self._testinfo['rendered'].get(filename)
+
+    def set_rendered(self, filename, rendered):
+        """
+        Store the rendered testinfo for a source in the directory
+
+        :param filename: the source filename including extension
+        :param rendered: the rendered testinfo as a dictionary
+        """
+        self._index._remember_rendered(self._testinfo, filename, rendered)
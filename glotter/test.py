@@ -1,22 +1,42 @@
-import re
 import os
 import sys
+import time
+import queue
+import multiprocessing
 
 import pytest
 
-from glotter.source import get_sources
 from glotter.settings import Settings
+from glotter.catalog import SourceCatalog
+from glotter.singleton import Singleton
+from glotter.containerfactory import ContainerFactory, get_run_id
+from glotter.source import render_test_infos
+from glotter.scheduler import partition_by_image
+from glotter.buildcache import BuildCache
+from glotter.shard import get_shard_stats
+from glotter.durations import DurationStats
+from glotter.plugin import SelectionPlugin, TimeoutReportPlugin, ImageAffinityPlugin, DurationPlugin, \
+    ResultFilePlugin
+from glotter.resultcache import ResultCachePlugin
+from glotter.resultfile import ResultFile
 
 
 def test(args):
+    options = {
+        'jobs': max(args.jobs, 1),
+        'use_cache': not args.no_cache,
+        'shard': getattr(args, 'shard', None),
+        'durations_path': getattr(args, 'durations', None),
+        'results_path': getattr(args, 'results', None),
+    }
     if args.language:
-        _run_language(args.language)
+        _run_language(args.language, **options)
     elif args.project:
-        _run_project(args.project)
+        _run_project(args.project, **options)
     elif args.source:
-        _run_source(args.source)
+        _run_source(args.source, **options)
     else:
-        _run_all()
+        _run_all(**options)
 
 
 def _error_and_exit(msg):
@@ -24,92 +44,279 @@ def _error_and_exit(msg):
     sys.exit(1)
 
 
-def _get_tests(project_type, all_tests, src=None):
-    test_functions = Settings().get_test_mapping_name(project_type)
-    tests = []
-    for test_func in test_functions:
-        if src is not None:
-            filename = f'{src.name}{src.extension}'
-            pattern = rf'^(\w/?)*\.py::{test_func}\[{filename}(-.*)?\]$'
+def _run_all(**options):
+    _run_pytest_and_exit({}, **options)
+
+
+def _run_language(language, **options):
+    _run_pytest_and_exit({'language': language}, error=f'No tests found for sources in language "{language}"',
+                         **options)
+
+
+def _run_project(project, **options):
+    error = f'Either tests or sources not found for project: "{project}"'
+    if not Settings().verify_project_type(project):
+        _error_and_exit(error)
+    _run_pytest_and_exit({'project': project}, error=error, **options)
+
+
+def _run_source(source, **options):
+    settings = Settings()
+    # the test fixtures only see the matching sources, so the rest of the archive is never discovered
+    settings.source_catalog = SourceCatalog(settings.find_sources(source))
+    _run_pytest_and_exit({'source': source}, error=f'No tests could be found for source "{source}"', **options)
+
+
+def _run_pytest_and_exit(selection, jobs=1, use_cache=True, error=None, shard=None, results_path=None,
+                         durations_path=None):
+    """
+    Run the selected tests in a single pytest session, or across worker processes
+
+    :param selection: keyword arguments for the SelectionPlugin
+    :param jobs: the maximum number of worker processes
+    :param use_cache: whether to skip tests that passed before and restore builds from the build cache
+    :param error: optionally a message to exit with if no tests were selected
+    :param shard: optionally only run the tests for this Shard's sources
+    :param results_path: optionally write the outcome of each test to this ResultFile
+    :param durations_path: optionally balance shards by the durations in this file rather than the cache directory
+    """
+    if shard is not None:
+        selection = _select_shard(selection, shard, error, durations_path)
+    # rendered before pytest and the workers start, so the workers inherit the rendered testinfo
+    render_test_infos(_get_selected_sources(selection))
+    if jobs > 1:
+        code = _run_parallel(selection, jobs, use_cache, shard, results_path)
+    else:
+        plugins = [SelectionPlugin(**selection)] + _get_plugins(use_cache, shard, results_path)
+        code = pytest.main(args=['-v'], plugins=plugins)
+    if code == pytest.ExitCode.NO_TESTS_COLLECTED:
+        if shard is not None:
+            print(f'no tests in shard {shard}')
+            sys.exit(0)
+        if error is not None:
+            _error_and_exit(error)
+    sys.exit(code)
+
+
+def _select_shard(selection, shard, error=None, durations_path=None):
+    """
+    Narrow a selection to the sources in a shard
+
+    :param selection: keyword arguments for the SelectionPlugin
+    :param shard: the Shard to run
+    :param error: optionally a message to exit with if no sources were selected before sharding
+    :param durations_path: optionally balance shards by the durations in this file rather than the cache directory
+    :return: keyword arguments for a SelectionPlugin that only keeps the shard's tests
+    """
+    sources = _get_selected_sources(selection)
+    if not sources and error is not None:
+        _error_and_exit(error)
+    selected = shard.select(sources, get_shard_stats(durations_path))
+    print(f'shard {shard}: testing {len(selected)} of {len(sources)} sources')
+    return dict(selection, paths=[source.full_path for source in selected], keep_other_tests=shard.is_first)
+
+
+def _get_selected_sources(selection):
+    plugin = SelectionPlugin(**selection)
+    return [
+        source
+        for project_type, sources in Settings().source_catalog.sources_by_type.items()
+        for source in sources
+        if plugin.matches_source(project_type, source)
+    ]
+
+
+def _get_plugins(use_cache, shard=None, results_path=None):
+    BuildCache().enabled = use_cache
+    stats = DurationStats()
+    plugins = [BuildCacheReportPlugin(), TimeoutReportPlugin(), ImageAffinityPlugin(stats), DurationPlugin(stats)]
+    if use_cache:
+        plugins.append(ResultCachePlugin())
+    if results_path is not None:
+        plugins.append(ResultFilePlugin(results_path, shard))
+    return plugins
+
+
+def _run_parallel(selection, jobs, use_cache=True, shard=None, results_path=None):
+    """
+    Run tests across worker processes. Selected sources are split between the workers so all the tests for a source
+    run in the same worker and each source is only built once. Sources that share an image are kept on the same
+    worker where that does not leave a worker idle, and sources are balanced by how long they took in previous
+    runs. Each worker collects and runs its own sources in a
+    single pytest session and reports its results back as they happen. The results are merged into one summary
+
+    :param selection: keyword arguments for the SelectionPlugin
+    :param jobs: the maximum number of worker processes
+    :param use_cache: whether to skip tests that passed before and restore builds from the build cache
+    :param shard: optionally the Shard being run
+    :param results_path: optionally write the outcome of each test to this ResultFile. Each worker writes its own
+                         file next to it and they are merged once every worker is done
+    :return: the pytest exit code for the whole run
+    """
+    sources = _get_selected_sources(selection)
+    if not sources:
+        return int(pytest.ExitCode.NO_TESTS_COLLECTED)
+    groups = [
+        [source.full_path for source in group]
+        for group in partition_by_image(sources, min(jobs, len(sources)), weight=DurationStats().weight)
+    ]
+    print(f'running tests for {len(sources)} sources across {len(groups)} workers')
+
+    start = time.time()
+    # read the run id before starting the workers so they inherit it and label their containers with it
+    get_run_id()
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=_run_worker,
+            args=(index, selection, group, results, use_cache, shard, _get_worker_results_path(results_path, index)),
+        )
+        for index, group in enumerate(groups)
+    ]
+    for worker in workers:
+        worker.start()
+
+    summary = _ParallelSummary()
+    codes = {}
+    while len(codes) < len(workers):
+        try:
+            message = results.get(timeout=1)
+        except KeyboardInterrupt:
+            # workers only get the interrupt too when they share this process's terminal, which a server does not,
+            # so they are stopped here and their containers removed for them
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+            ContainerFactory().reap(whole_run=True)
+            raise
+        except queue.Empty:
+            for index, worker in enumerate(workers):
+                if index not in codes and not worker.is_alive():
+                    codes[index] = pytest.ExitCode.INTERNAL_ERROR
+                    print(f'worker {index} exited unexpectedly with code {worker.exitcode}')
+            continue
+        kind, index, payload = message
+        if kind == 'done':
+            codes[index] = payload['code']
+            summary.add_build_cache(*payload['build_cache'])
         else:
-            pattern = rf'^(\w/?)*\.py::{test_func}\[.+\]$'
-        tests.extend([tst for tst in all_tests if re.fullmatch(pattern, tst) is not None])
-    return tests
+            summary.add(payload)
+    for worker in workers:
+        worker.join()
 
+    if any(code == pytest.ExitCode.INTERNAL_ERROR for code in codes.values()):
+        # a worker that died could not remove its containers
+        ContainerFactory().reap(whole_run=True)
 
-def _run_all():
-    _run_pytest_and_exit()
+    summary.print(time.time() - start)
+    if results_path is not None:
+        _merge_worker_results(results_path, len(workers))
+    return _merge_exit_codes(codes.values())
 
 
-def _run_language(language):
-    all_tests = _collect_tests()
-    sources_by_type = get_sources(path=os.path.join('archive', language[0], language))
-    if all([len(sources) <= 0 for _, sources in sources_by_type.items()]):
-        _error_and_exit(f'No valid sources found for language: "{language}"')
-    tests = []
-    for project_type, sources in sources_by_type.items():
-        for src in sources:
-            tests.extend(_get_tests(project_type, all_tests, src))
-    try:
-        _verify_test_list_not_empty(tests)
-        _run_pytest_and_exit(*tests)
-    except KeyError:
-        _error_and_exit(f'No tests found for sources in language "{language}"')
+def _get_worker_results_path(results_path, index):
+    return f'{results_path}.{index}' if results_path is not None else None
 
 
-def _run_project(project):
-    try:
-        Settings().verify_project_type(project)
-        tests = _get_tests(project, _collect_tests())
-        _verify_test_list_not_empty(tests)
-        _run_pytest_and_exit(*tests)
-    except KeyError:
-        _error_and_exit(f'Either tests or sources not found for project: "{project}"')
-
-
-def _run_source(source):
-    all_tests = _collect_tests()
-    sources_by_type = get_sources('archive')
-    for project_type, sources in sources_by_type.items():
-        for src in sources:
-            filename = f'{src.name}{src.extension}'
-            if filename.lower() == source.lower():
-                tests = _get_tests(project_type, all_tests, src)
-                try:
-                    _verify_test_list_not_empty(tests)
-                    _run_pytest_and_exit(*tests)
-                except KeyError:
-                    _error_and_exit(f'No tests could be found for source "{source}"')
-                break
-        else:  # If didn't break inner loop continue
+def _merge_worker_results(results_path, count):
+    result_files = []
+    for index in range(count):
+        path = _get_worker_results_path(results_path, index)
+        try:
+            result_files.append(ResultFile.load(path))
+        except (OSError, ValueError):
             continue
-        break  # Else break this loop as well
-    else:
-        _error_and_exit(f'Source "{source}" could not be found')
+        os.remove(path)
+    ResultFile.merge(result_files).save(results_path)
 
 
-def _verify_test_list_not_empty(tests):
-    if not tests:
-        raise KeyError(f'No tests were found')
+def _run_worker(index, selection, paths, results, use_cache, shard=None, results_path=None):
+    Singleton._instances.pop(ContainerFactory, None)
+    keep_other_tests = index == 0 and selection.get('keep_other_tests', True)
+    selection_plugin = SelectionPlugin(**dict(selection, paths=paths, keep_other_tests=keep_other_tests))
+    plugins = [selection_plugin, _WorkerReportPlugin(index, results)] + _get_plugins(use_cache, shard, results_path)
+    try:
+        code = pytest.main(args=['-p', 'no:terminal'], plugins=plugins)
+    finally:
+        # worker processes exit without running atexit handlers
+        factory = Singleton._instances.get(ContainerFactory)
+        if factory is not None:
+            factory.reap()
+    cache = BuildCache()
+    results.put(('done', index, {'code': int(code), 'build_cache': (cache.hits, cache.misses)}))
 
 
-def _run_pytest_and_exit(*args):
-    args = ['-v'] + list(args)
-    code = pytest.main(args=args)
-    sys.exit(code)
+def _merge_exit_codes(codes):
+    codes = [int(code) for code in codes]
+    if all(code == pytest.ExitCode.NO_TESTS_COLLECTED for code in codes):
+        return int(pytest.ExitCode.NO_TESTS_COLLECTED)
+    return max(code for code in codes if code != pytest.ExitCode.NO_TESTS_COLLECTED)
+
 
+class _WorkerReportPlugin:
+    def __init__(self, index, results):
+        self._index = index
+        self._results = results
+        self._config = None
 
-class TestCollectionPlugin:
+    def pytest_configure(self, config):
+        self._config = config
+
+    def pytest_runtest_logreport(self, report):
+        self._send(report)
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self._send(report)
+
+    def _send(self, report):
+        status = self._config.hook.pytest_report_teststatus(report=report, config=self._config)
+        category, word = (status[0], status[2]) if status else (report.outcome, report.outcome.upper())
+        if not category or (report.passed and report.when != 'call'):
+            return
+        if isinstance(word, tuple):
+            word = word[0]
+        if category == 'failed' and report.when != 'call':
+            category, word = 'error', 'ERROR'
+        self._results.put(('report', self._index, {
+            'nodeid': report.nodeid,
+            'category': category,
+            'word': word or category.upper(),
+            'longrepr': report.longreprtext if report.failed else '',
+        }))
+
+
+class _ParallelSummary:
     def __init__(self):
-        self.collected = []
-
-    def pytest_collection_modify_items(self, items):
-        for item in items:
-            self.collected.append(item.nodeid)
-            
-
-def _collect_tests():
-    print('============================= collect test totals ==============================')
-    plugin = TestCollectionPlugin()
-    pytest.main(['-qq', '--collect-only'], plugins=[plugin])
-    return plugin.collected
+        self.counts = {}
+        self.failures = []
+        self.build_cache_hits = 0
+        self.build_cache_misses = 0
+
+    def add(self, result):
+        print(f'{result["nodeid"]} {result["word"]}')
+        self.counts[result['category']] = self.counts.get(result['category'], 0) + 1
+        if result['longrepr']:
+            self.failures.append(result)
+
+    def add_build_cache(self, hits, misses):
+        self.build_cache_hits += hits
+        self.build_cache_misses += misses
+
+    def print(self, duration):
+        if self.failures:
+            print(' FAILURES '.center(80, '='))
+            for failure in self.failures:
+                print(f' {failure["nodeid"]} '.center(80, '_'))
+                print(failure['longrepr'])
+        if self.build_cache_hits or self.build_cache_misses:
+            print(f'build cache: {self.build_cache_hits} hits, {self.build_cache_misses} misses')
+        totals = ', '.join(f'{count} {category}' for category, count in sorted(self.counts.items())) or 'no tests ran'
+        print(f' {totals} in {duration:.2f}s '.center(80, '='))
+
+
+class BuildCacheReportPlugin:
+    def pytest_terminal_summary(self, terminalreporter):
+        cache = BuildCache()
+        if cache.hits or cache.misses:
+            terminalreporter.write_line(cache.summary())
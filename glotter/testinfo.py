@@ -1,14 +1,64 @@
+import functools
+import threading
+
 import yaml
-from jinja2 import Environment, BaseLoader
 
+from glotter.limits import ResourceLimits
 from glotter.project import NamingScheme
 from glotter.settings import Settings
 
+# testinfo files are shared by every source in a directory, so they are parsed and compiled once per content
+_CACHE_SIZE = 1024
+# a testinfo without any of these is not a template, so it renders to itself
+_TEMPLATE_MARKERS = ('{{', '{%', '{#')
+# the libyaml parser is many times faster than the pure python one when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+_environment = None
+_environment_lock = threading.Lock()
+
+
+def has_template_syntax(string):
+    """
+    Check whether a testinfo needs to be rendered with Jinja2
+
+    :param string: contents of a testinfo file
+    :return: whether the string contains Jinja2 expressions, statements or comments
+    """
+    return any(marker in string for marker in _TEMPLATE_MARKERS)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def load_yaml(string):
+    """
+    Parse the contents of a testinfo file as yaml. Results are cached by content and shared between callers, so
+    they must not be modified
+
+    :param string: contents of a testinfo file
+    :return: the parsed yaml
+    """
+    return yaml.load(string, Loader=_YAML_LOADER)
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _compile(string):
+    return _get_environment().from_string(string)
+
+
+def _get_environment():
+    global _environment
+    with _environment_lock:
+        if _environment is None:
+            # imported here so sources whose testinfo is not a template never load jinja2
+            from jinja2 import Environment, BaseLoader
+            _environment = Environment(loader=BaseLoader)
+        return _environment
+
 
 class ContainerInfo:
     """Configuration for a container to run for a directory"""
 
-    def __init__(self, image, tag, cmd, build=None):
+    def __init__(self, image, tag, cmd, build=None, limits=None):
         """
         Initialize a ContainerInfo
 
@@ -16,11 +66,13 @@ class ContainerInfo:
         :param tag: the tag of the image to run
         :param cmd: the command to run the source inside the container
         :param build: an optional command to run to build the source before running the command
+        :param limits: optional ResourceLimits for the container that override the limits of the project
         """
         self._image = image
         self._cmd = cmd
         self._tag = tag
         self._build = build
+        self._limits = limits or ResourceLimits()
 
     @property
     def image(self):
@@ -42,6 +94,11 @@ class ContainerInfo:
         """Returns the command to build the source before running it inside the container"""
         return self._build
 
+    @property
+    def limits(self):
+        """Returns the ResourceLimits set for the container"""
+        return self._limits
+
     @classmethod
     def from_dict(cls, dictionary):
         """
@@ -58,14 +115,32 @@ class ContainerInfo:
             image=image,
             tag=tag,
             cmd=cmd,
-            build=build
+            build=build,
+            limits=ResourceLimits.from_dict(dictionary),
         )
 
+    def to_dict(self):
+        """
+        Create a dictionary from a ContainerInfo
+
+        :return: the dictionary representing ContainerInfo
+        """
+        dictionary = {
+            'image': self.image,
+            'tag': self.tag,
+            'cmd': self.cmd,
+        }
+        if self.build is not None:
+            dictionary['build'] = self.build
+        dictionary.update(self.limits.to_dict())
+        return dictionary
+
     def __eq__(self, other):
         return self.image == other.image and \
                self.cmd == other.cmd and \
                self.tag == other.tag and \
-               self.build == other.build
+               self.build == other.build and \
+               self.limits == other.limits
 
 
 class FolderInfo:
@@ -122,6 +197,17 @@ class FolderInfo:
         """
         return FolderInfo(dictionary['extension'], dictionary['naming'])
 
+    def to_dict(self):
+        """
+        Create a dictionary from a FolderInfo
+
+        :return: the dictionary representing FolderInfo
+        """
+        return {
+            'extension': self.extension,
+            'naming': self.naming.name,
+        }
+
 
 class TestInfo:
     """an object representation of a testinfo file"""
@@ -159,18 +245,31 @@ class TestInfo:
             file_info=FolderInfo.from_dict(dictionary['folder'])
         )
 
+    def to_dict(self):
+        """
+        Create a dictionary from a TestInfo
+
+        :return: the dictionary representing TestInfo
+        """
+        return {
+            'container': self.container_info.to_dict(),
+            'folder': self.file_info.to_dict(),
+        }
+
     @classmethod
     def from_string(cls, string, source):
         """
-        Create a TestInfo from a string. Modify the string using Jinja2 templating. Then parse it as yaml
+        Create a TestInfo from a string. Modify the string using Jinja2 templating. Then parse it as yaml. Templates
+        are compiled once per content and strings without template syntax are parsed once and not rendered
 
         :param string: contents of a testinfo file
         :param source: a source object to use for jinja2 template parsing
         :return: a new TestInfo
         """
-        template = Environment(loader=BaseLoader).from_string(string)
-        template_string = template.render(source=source)
-        info_yaml = yaml.safe_load(template_string)
+        if not has_template_syntax(string):
+            return cls.from_dict(load_yaml(string))
+        template_string = _compile(string).render(source=source)
+        info_yaml = yaml.load(template_string, Loader=_YAML_LOADER)
         return cls.from_dict(info_yaml)
 
     def __eq__(self, other):
@@ -11,5 +11,5 @@ setup(
         'pytest>=5.2.1, <5.3',
         'PyYAML>=5.1, <5.2'
     ],
-    python_requires='>=3.5',
+    python_requires='>=3.7',
 )
@@ -1,7 +1,9 @@
+import os
 import shutil
 import tempfile
 import pytest
 
+from glotter.limits import ResourceLimits
 from glotter.project import Project
 
 
@@ -24,6 +26,9 @@ projects:
     words:
       - "fibonacci"
     requires_parameters: true
+    timeout: 10
+    cpus: 0.5
+    memory: "128m"
   helloworld:
     words:
       - "hello"
@@ -46,7 +51,8 @@ def glotter_yml_projects():
         ),
         "fibonacci": Project(
             words=["fibonacci"],
-            requires_parameters=True
+            requires_parameters=True,
+            limits=ResourceLimits(timeout=10, cpus=0.5, memory='128m'),
         ),
         "helloworld": Project(
             words=["hello", "world"],
@@ -92,3 +98,9 @@ def tmp_dir():
 @pytest.fixture
 def mock_projects(glotter_yml_projects, monkeypatch):
     return monkeypatch.setattr('glotter.settings.Settings.projects', glotter_yml_projects)
+
+
+@pytest.fixture
+def mock_cache_dir(tmp_dir, monkeypatch):
+    cache_dir = os.path.join(tmp_dir, '.glotter_cache')
+    return monkeypatch.setattr('glotter.settings.Settings.cache_dir', cache_dir)
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from glotter.buildcache import BuildCache
+from glotter.singleton import Singleton
+from glotter.source import Source
+
+from test.integration.fixtures import tmp_dir, test_info_string_with_build
+
+
+class FactoryMock:
+    def __init__(self):
+        self.digest = 'sha256:digest'
+        self.imported = []
+
+    def get_image_digest(self, container_info):
+        return self.digest
+
+    def export_working_dir(self, source):
+        return b'archive'
+
+    def import_working_dir(self, source, archive):
+        self.imported.append(archive)
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    factory = FactoryMock()
+    monkeypatch.setattr('glotter.buildcache.ContainerFactory', lambda: factory)
+    return factory
+
+
+@pytest.fixture
+def build_cache(tmp_dir, factory):
+    Singleton._instances.pop(BuildCache, None)
+    yield BuildCache(cache_dir=os.path.join(tmp_dir, 'builds'))
+    Singleton._instances.pop(BuildCache, None)
+
+
+@pytest.fixture
+def source(tmp_dir, test_info_string_with_build):
+    with open(os.path.join(tmp_dir, 'hello-world.go'), 'w') as file:
+        file.write('package main')
+    return Source('hello-world.go', 'go', tmp_dir, test_info_string_with_build)
+
+
+def test_get_key_is_stable(build_cache, source):
+    assert build_cache.get_key(source, 'go build') == build_cache.get_key(source, 'go build')
+
+
+def test_get_key_changes_with_command(build_cache, source):
+    assert build_cache.get_key(source, 'go build') != build_cache.get_key(source, 'go build -v')
+
+
+def test_get_key_changes_with_source_contents(build_cache, source):
+    before = build_cache.get_key(source, 'go build')
+    with open(source.full_path, 'a') as file:
+        file.write('\n')
+    assert build_cache.get_key(source, 'go build') != before
+
+
+def test_get_key_changes_with_image(build_cache, source, factory):
+    before = build_cache.get_key(source, 'go build')
+    factory.digest = 'sha256:other'
+    assert build_cache.get_key(source, 'go build') != before
+
+
+def test_restore_misses_when_not_stored(build_cache, source):
+    assert not build_cache.restore(source, 'key')
+    assert (build_cache.hits, build_cache.misses) == (0, 1)
+
+
+def test_restore_imports_stored_archive(build_cache, source, factory):
+    build_cache.store(source, 'key')
+    assert build_cache.restore(source, 'key')
+    assert factory.imported == [b'archive']
+    assert (build_cache.hits, build_cache.misses) == (1, 0)
@@ -0,0 +1,67 @@
+import os
+
+from glotter.durations import DurationStats
+from glotter.source import Source
+
+from test.integration.fixtures import tmp_dir, test_info_string_no_build
+
+
+def _source(name, test_info_string):
+    return Source(name, 'python', 'path', test_info_string)
+
+
+def test_durations_are_saved_and_loaded(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'durations.json')
+    source = _source('slow.py', test_info_string_no_build)
+    stats = DurationStats(path)
+    stats.record(source, 12.5)
+    stats.save()
+    assert DurationStats(path).get(source) == 12.5
+
+
+def test_durations_are_averaged_with_previous_runs(tmp_dir, test_info_string_no_build):
+    source = _source('slow.py', test_info_string_no_build)
+    stats = DurationStats(os.path.join(tmp_dir, 'durations.json'))
+    stats.record(source, 10)
+    stats.record(source, 20)
+    assert stats.get(source) == 15
+
+
+def test_save_keeps_durations_saved_by_others(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'durations.json')
+    first, second = _source('first.py', test_info_string_no_build), _source('second.py', test_info_string_no_build)
+    stats, other = DurationStats(path), DurationStats(path)
+    other.record(second, 2)
+    other.save()
+    stats.record(first, 1)
+    stats.save()
+    loaded = DurationStats(path)
+    assert (loaded.get(first), loaded.get(second)) == (1, 2)
+
+
+def test_weight_of_unknown_source_is_average(tmp_dir, test_info_string_no_build):
+    stats = DurationStats(os.path.join(tmp_dir, 'durations.json'))
+    unknown = _source('unknown.py', test_info_string_no_build)
+    assert stats.weight(unknown) == DurationStats.DEFAULT_DURATION
+    stats.record(_source('first.py', test_info_string_no_build), 2)
+    stats.record(_source('second.py', test_info_string_no_build), 4)
+    assert stats.weight(unknown) == 3
+
+
+def test_unreadable_file_is_ignored(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'durations.json')
+    with open(path, 'w') as file:
+        file.write('not json')
+    assert DurationStats(path).get(_source('slow.py', test_info_string_no_build)) is None
+
+
+def test_read_only_durations_are_not_saved(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'durations.json')
+    source = _source('slow.py', test_info_string_no_build)
+    stats = DurationStats(path)
+    stats.record(source, 10)
+    stats.save()
+    pinned = DurationStats(path, read_only=True)
+    pinned.record(source, 20)
+    pinned.save()
+    assert DurationStats(path).get(source) == 10
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from test.integration.fixtures import tmp_dir, test_info_string_no_build
+
+HEAVY_MODULES = ['docker', 'pytest', 'jinja2', 'yaml']
+
+_HELP_SCRIPT = """
+import sys, json
+sys.argv = ['glotter', '--help']
+from glotter.__main__ import main
+try:
+    main()
+except SystemExit:
+    pass
+print(json.dumps({'modules': sorted(sys.modules)}))
+"""
+
+_IMPORT_SCRIPT = """
+import sys, json
+import {modules}
+print(json.dumps({{'modules': sorted(sys.modules)}}))
+"""
+
+
+_REPORT_SCRIPT = """
+import sys, json
+sys.argv = ['glotter', 'report']
+from glotter.__main__ import main
+main()
+print(json.dumps({'modules': sorted(sys.modules)}))
+"""
+
+_GLOTTER_YML = """settings:
+  source_root: "."
+projects:
+  helloworld:
+    words: ["hello", "world"]
+    requires_parameters: false
+"""
+
+
+def _run(script, cwd=None):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root)
+    output = subprocess.run([sys.executable, '-c', script], env=env, cwd=cwd, check=True,
+                            stdout=subprocess.PIPE).stdout
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def test_help_does_not_import_dependencies():
+    result = _run(_HELP_SCRIPT)
+    assert [module for module in HEAVY_MODULES if module in result['modules']] == []
+
+
+@pytest.mark.parametrize(('modules', 'unexpected'), [
+    ('glotter', HEAVY_MODULES),
+    ('glotter.report', ['docker', 'pytest']),
+    ('glotter.merge', HEAVY_MODULES[:3]),
+])
+def test_commands_only_import_what_they_need(modules, unexpected):
+    result = _run(_IMPORT_SCRIPT.format(modules=modules))
+    assert [module for module in unexpected if module in result['modules']] == []
+
+
+def test_report_does_not_render_testinfo(tmp_dir, test_info_string_no_build):
+    files = {
+        '.glotter.yml': _GLOTTER_YML,
+        os.path.join('python', 'testinfo.yml'): test_info_string_no_build,
+        os.path.join('python', 'hello_world.py'): 'print("Hello, world!")',
+    }
+    for name, contents in files.items():
+        os.makedirs(os.path.dirname(os.path.join(tmp_dir, name)), exist_ok=True)
+        with open(os.path.join(tmp_dir, name), 'w') as file:
+            file.write(contents)
+    result = _run(_REPORT_SCRIPT, cwd=tmp_dir)
+    assert [module for module in ['docker', 'pytest', 'jinja2'] if module in result['modules']] == []
+
+
+def test_package_attributes_are_imported_when_used():
+    import glotter
+    from glotter.settings import Settings
+    from glotter.decorators import project_test
+    assert glotter.Settings is Settings
+    assert glotter.project_test is project_test
+    with pytest.raises(AttributeError):
+        glotter.missing
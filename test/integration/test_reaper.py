@@ -0,0 +1,26 @@
+import os
+
+from glotter.reaper import remove_stale_temp_files
+
+from test.integration.fixtures import tmp_dir
+
+
+def _touch(*parts):
+    path = os.path.join(*parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'w').close()
+    return path
+
+
+def test_remove_stale_temp_files_keeps_files_of_running_processes(tmp_dir, monkeypatch):
+    monkeypatch.setattr('glotter.reaper.is_process_running', lambda pid: pid == 1)
+    stale = _touch(tmp_dir, 'builds', 'key.tar.2.140.tmp')
+    stale_index = _touch(tmp_dir, 'sources', 'root.json.3.tmp')
+    running = _touch(tmp_dir, 'durations.json.1.140.tmp')
+    complete = _touch(tmp_dir, 'durations.json')
+    assert remove_stale_temp_files(tmp_dir) == 2
+    assert [os.path.exists(path) for path in (stale, stale_index, running, complete)] == [False, False, True, True]
+
+
+def test_remove_stale_temp_files_ignores_missing_directory(tmp_dir):
+    assert remove_stale_temp_files(os.path.join(tmp_dir, 'missing')) == 0
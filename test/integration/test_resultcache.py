@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from glotter.resultcache import ResultCache, ResultCachePlugin
+from glotter.source import Source
+
+from test.integration.fixtures import tmp_dir, test_info_string_no_build
+
+
+class FactoryMock:
+    digest = 'sha256:digest'
+
+    def get_image_digest(self, container_info, pull=True):
+        assert not pull
+        return self.digest
+
+
+class CallSpec:
+    def __init__(self, params):
+        self.params = params
+
+
+class Item:
+    def __init__(self, nodeid, function, source=None):
+        self.nodeid = nodeid
+        self.function = function
+        self.callspec = CallSpec({'source': source}) if source is not None else None
+        self.markers = []
+        self.user_properties = []
+
+    def add_marker(self, marker):
+        self.markers.append(marker)
+
+
+class Report:
+    def __init__(self, nodeid, when, outcome, user_properties=None):
+        self.nodeid = nodeid
+        self.when = when
+        self.passed = outcome == 'passed'
+        self.skipped = outcome == 'skipped'
+        self.user_properties = user_properties or []
+
+
+def check_hello_world(hello_world):
+    pass
+
+
+def check_other(hello_world):
+    assert True
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    factory = FactoryMock()
+    monkeypatch.setattr('glotter.resultcache.ContainerFactory', lambda: factory)
+    return factory
+
+
+@pytest.fixture
+def cache(tmp_dir, factory):
+    return ResultCache(cache_dir=os.path.join(tmp_dir, 'results'))
+
+
+@pytest.fixture
+def source(tmp_dir, test_info_string_no_build):
+    with open(os.path.join(tmp_dir, 'hello_world.py'), 'w') as file:
+        file.write('print("Hello, World!")')
+    return Source('hello_world.py', 'python', tmp_dir, test_info_string_no_build)
+
+
+@pytest.fixture
+def item(source):
+    return Item('test_hello_world.py::test_hello_world[hello_world.py]', check_hello_world, source)
+
+
+def test_get_key_is_none_without_source(cache):
+    assert cache.get_key(Item('test_hello_world.py::test_hello_world', check_hello_world)) is None
+
+
+def test_get_key_is_stable(cache, item):
+    assert cache.get_key(item) == cache.get_key(item)
+
+
+def test_get_key_changes_with_source_contents(cache, item, source):
+    before = cache.get_key(item)
+    with open(source.full_path, 'a') as file:
+        file.write('\n')
+    assert cache.get_key(item) != before
+
+
+def test_get_key_changes_with_image(cache, item, factory):
+    before = cache.get_key(item)
+    factory.digest = 'sha256:other'
+    assert cache.get_key(item) != before
+
+
+def test_get_key_is_none_without_local_image(cache, item, factory):
+    factory.digest = None
+    assert cache.get_key(item) is None
+
+
+def test_get_key_changes_with_test_function(cache, item, source):
+    other = Item(item.nodeid, check_other, source)
+    assert cache.get_key(item) != cache.get_key(other)
+
+
+def test_record_pass(cache):
+    assert not cache.has_passed('key')
+    cache.record_pass('key')
+    assert cache.has_passed('key')
+
+
+def test_plugin_skips_items_that_passed_before(cache, item):
+    cache.record_pass(cache.get_key(item))
+    ResultCachePlugin(cache).pytest_collection_modifyitems([item])
+    assert item.markers
+    assert ('glotter', 'cached') in item.user_properties
+
+
+def test_plugin_runs_items_that_did_not_pass_before(cache, item):
+    ResultCachePlugin(cache).pytest_collection_modifyitems([item])
+    assert not item.markers
+
+
+def test_plugin_records_passed_call(cache, item):
+    plugin = ResultCachePlugin(cache)
+    plugin.pytest_collection_modifyitems([item])
+    plugin.pytest_runtest_logreport(Report(item.nodeid, 'call', 'passed'))
+    assert cache.has_passed(cache.get_key(item))
+
+
+def test_plugin_does_not_record_failed_call(cache, item):
+    plugin = ResultCachePlugin(cache)
+    plugin.pytest_collection_modifyitems([item])
+    plugin.pytest_runtest_logreport(Report(item.nodeid, 'call', 'failed'))
+    assert not cache.has_passed(cache.get_key(item))
+
+
+def test_plugin_reports_cached_status(cache, item):
+    report = Report(item.nodeid, 'setup', 'skipped', [('glotter', 'cached')])
+    assert ResultCachePlugin(cache).pytest_report_teststatus(report) == ('cached', 'c', 'CACHED')
+
+
+def test_plugin_runs_and_records_items_without_local_image(cache, item, factory):
+    factory.digest = None
+    plugin = ResultCachePlugin(cache)
+    plugin.pytest_collection_modifyitems([item])
+    assert not item.markers
+
+    factory.digest = 'sha256:pulled'
+    plugin.pytest_runtest_logreport(Report(item.nodeid, 'call', 'passed'))
+    assert cache.has_passed(cache.get_key(item))
@@ -0,0 +1,45 @@
+import os
+
+from glotter.durations import DurationStats
+from glotter.resultfile import ResultFile
+from glotter.settings import Settings
+from glotter.source import Source
+
+from test.integration.fixtures import tmp_dir, test_info_string_no_build
+
+
+def _source(name, test_info_string):
+    return Source(name, 'python', os.path.join(Settings().source_root, 'p', 'python'), test_info_string)
+
+
+def test_results_are_saved_and_loaded(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'results.json')
+    source = _source('slow.py', test_info_string_no_build)
+    result_file = ResultFile(shards=['1/2'])
+    result_file.add('test_slow', 'passed', 2.5, source=source)
+    result_file.add('test_slow_again', 'failed', 1.5, source=source)
+    result_file.save(path)
+    loaded = ResultFile.load(path)
+    assert loaded.shards == ['1/2']
+    assert [result['id'] for result in loaded.failed] == ['test_slow_again']
+    assert loaded.durations == {'p/python/slow.py': 4}
+
+
+def test_merge_combines_shards(test_info_string_no_build):
+    first = ResultFile(shards=['1/2'])
+    first.add('test_b', 'passed', 1, source=_source('b.py', test_info_string_no_build))
+    second = ResultFile(shards=['2/2'])
+    second.add('test_a', 'timeout', 3, source=_source('a.py', test_info_string_no_build))
+    merged = ResultFile.merge([first, second, ResultFile(shards=['2/2'])])
+    assert merged.shards == ['1/2', '2/2']
+    assert [result['id'] for result in merged.results] == ['test_a', 'test_b']
+    assert merged.durations == {'p/python/a.py': 3, 'p/python/b.py': 1}
+
+
+def test_merged_results_can_be_used_as_durations(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'merged.json')
+    source = _source('slow.py', test_info_string_no_build)
+    result_file = ResultFile(shards=['1/1'])
+    result_file.add('test_slow', 'passed', 7, source=source)
+    ResultFile.merge([result_file]).save(path)
+    assert DurationStats(path).get(source) == 7
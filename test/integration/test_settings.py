@@ -34,6 +34,59 @@ def test_locate_yml_when_glotter_yml_is_not_at_root(tmp_dir, glotter_yml):
     assert settings_parser.yml_path == expected
 
 
+def test_locate_yml_finds_shallowest_glotter_yml(tmp_dir, glotter_yml):
+    expected = os.path.join(tmp_dir, 'b', '.glotter.yml')
+    for path in (os.path.join(tmp_dir, 'a', 'deeper', '.glotter.yml'), expected):
+        os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(glotter_yml)
+    assert SettingsParser(tmp_dir).yml_path == expected
+
+
+@pytest.mark.parametrize('ignored', ['.git', 'node_modules'])
+def test_locate_yml_skips_ignored_directories(tmp_dir, glotter_yml, ignored):
+    settings_parser = setup_settings_parser(tmp_dir, os.path.join(tmp_dir, ignored, '.glotter.yml'), glotter_yml)
+    assert settings_parser.yml_path is None
+
+
+def test_locate_yml_stops_at_max_depth(tmp_dir, glotter_yml):
+    path = os.path.join(tmp_dir, 'one', 'two', '.glotter.yml')
+    setup_settings_parser(tmp_dir, path, glotter_yml)
+    assert SettingsParser(tmp_dir, max_depth=1).yml_path is None
+    assert SettingsParser(tmp_dir, max_depth=2).yml_path == path
+
+
+def test_locate_yml_finds_new_shallower_file(tmp_dir, glotter_yml):
+    setup_settings_parser(tmp_dir, os.path.join(tmp_dir, 'one', 'two', '.glotter.yml'), glotter_yml)
+    expected = os.path.join(tmp_dir, 'three', '.glotter.yml')
+    assert setup_settings_parser(tmp_dir, expected, glotter_yml).yml_path == expected
+
+
+def test_locate_yml_does_not_write_to_project_root(tmp_dir, glotter_yml):
+    setup_settings_parser(tmp_dir, os.path.join(tmp_dir, 'deeper', '.glotter.yml'), glotter_yml)
+    assert sorted(os.listdir(tmp_dir)) == ['deeper']
+
+
+def test_locate_yml_uses_configured_ignored_directories(tmp_dir, glotter_yml, monkeypatch):
+    path = os.path.join(tmp_dir, 'vendor', '.glotter.yml')
+    setup_settings_parser(tmp_dir, path, glotter_yml)
+    assert SettingsParser(tmp_dir, ignored_dirs=['vendor']).yml_path is None
+    monkeypatch.setenv(SettingsParser.IGNORED_DIRS_VARIABLE, 'vendor, other')
+    assert SettingsParser(tmp_dir).yml_path is None
+    monkeypatch.setenv(SettingsParser.IGNORED_DIRS_VARIABLE, '')
+    assert SettingsParser(tmp_dir).yml_path == path
+
+
+@pytest.mark.parametrize('configured', ['config/.glotter.yml', 'config'])
+def test_locate_yml_uses_configured_path(tmp_dir, glotter_yml, configured, monkeypatch):
+    expected = os.path.join(tmp_dir, 'config', '.glotter.yml')
+    setup_settings_parser(tmp_dir, os.path.join(tmp_dir, '.glotter.yml'), glotter_yml)
+    setup_settings_parser(tmp_dir, expected, glotter_yml)
+    assert SettingsParser(tmp_dir, yml_path=configured).yml_path == expected
+    monkeypatch.setenv(SettingsParser.CONFIG_VARIABLE, os.path.join(tmp_dir, configured))
+    assert SettingsParser(tmp_dir).yml_path == expected
+
+
 @pytest.mark.parametrize(('scheme_str', 'expected'),
                          [
                              ('upper', AcronymScheme.upper),
@@ -48,7 +101,7 @@ def test_parse_acronym_scheme(scheme_str, expected, tmp_dir):
     assert settings_parser.acronym_scheme == expected
 
 
-@pytest.mark.parametrize('root_type', ['source_root'])
+@pytest.mark.parametrize('root_type', ['source_root', 'cache_dir'])
 def test_parses_root_when_path_absolute(root_type, tmp_dir):
     expected = os.path.abspath(os.path.join(tmp_dir, 'subdir'))
     os.makedirs(expected)
@@ -59,7 +112,7 @@ def test_parses_root_when_path_absolute(root_type, tmp_dir):
     assert settings_parser.__getattribute__(root_type) == expected
 
 
-@pytest.mark.parametrize('root_type', ['source_root'])
+@pytest.mark.parametrize('root_type', ['source_root', 'cache_dir'])
 def test_parses_root_when_path_relative(root_type, tmp_dir):
     expected = os.path.abspath(os.path.join(tmp_dir, 'src'))
     os.makedirs(expected)
@@ -83,3 +136,21 @@ def test_parse_projects(tmp_dir, glotter_yml, glotter_yml_projects):
     settings_parser = setup_settings_parser(tmp_dir, path, glotter_yml)
     settings_parser.parse_projects_section()
     assert settings_parser.projects == glotter_yml_projects
+
+
+def test_parse_container_pool_defaults_when_not_set(tmp_dir):
+    glotter_yml = f'settings:\n  acronym_scheme: "upper"'
+    path = os.path.join(tmp_dir, '.glotter.yml')
+    settings_parser = setup_settings_parser(tmp_dir, path, glotter_yml)
+    assert settings_parser.container_pool_size == SettingsParser.DEFAULT_CONTAINER_POOL_SIZE
+    assert settings_parser.container_idle_timeout == SettingsParser.DEFAULT_CONTAINER_IDLE_TIMEOUT
+    assert settings_parser.max_containers == SettingsParser.DEFAULT_MAX_CONTAINERS
+
+
+def test_parse_container_pool(tmp_dir):
+    glotter_yml = 'settings:\n  container_pool:\n    size: 4\n    idle_timeout: 60\n    max_containers: 8'
+    path = os.path.join(tmp_dir, '.glotter.yml')
+    settings_parser = setup_settings_parser(tmp_dir, path, glotter_yml)
+    assert settings_parser.container_pool_size == 4
+    assert settings_parser.container_idle_timeout == 60
+    assert settings_parser.max_containers == 8
@@ -3,7 +3,7 @@ import os
 from glotter import source
 
 from test.integration.fixtures import tmp_dir, test_info_string_no_build, test_info_string_with_build, \
-    glotter_yml_projects, mock_projects
+    glotter_yml_projects, mock_projects, mock_cache_dir
 
 
 def get_hello_world(language):
@@ -25,7 +25,7 @@ def create_files_from_list(files):
 
 
 def test_get_sources_when_no_testinfo(tmp_dir, test_info_string_no_build, test_info_string_with_build,
-                                      mock_projects):
+                                      mock_projects, mock_cache_dir):
 
     files = {
         os.path.join(tmp_dir, 'python', 'helloworld.py'): get_hello_world('python'),
@@ -37,7 +37,7 @@ def test_get_sources_when_no_testinfo(tmp_dir, test_info_string_no_build, test_i
 
 
 def test_get_sources(tmp_dir, test_info_string_no_build, test_info_string_with_build, glotter_yml_projects,
-                     monkeypatch, mock_projects):
+                     monkeypatch, mock_projects, mock_cache_dir):
     files = {
         os.path.join(tmp_dir, 'python', 'testinfo.yml'): test_info_string_no_build,
         os.path.join(tmp_dir, 'python', 'hello_world.py'): get_hello_world('python'),
@@ -49,3 +49,77 @@ def test_get_sources(tmp_dir, test_info_string_no_build, test_info_string_with_b
     assert len(sources["helloworld"]) == 2
     assert not any(source_list for project_type, source_list in sources.items()
                    if project_type != "helloworld" and len(source_list) > 0)
+
+
+def test_find_sources_only_builds_sources_for_extension(tmp_dir, test_info_string_no_build,
+                                                        test_info_string_with_build, mock_projects, mock_cache_dir,
+                                                        monkeypatch):
+    files = {
+        os.path.join(tmp_dir, 'python', 'testinfo.yml'): test_info_string_no_build,
+        os.path.join(tmp_dir, 'python', 'hello_world.py'): get_hello_world('python'),
+        os.path.join(tmp_dir, 'go', 'testinfo.yml'): test_info_string_with_build,
+        os.path.join(tmp_dir, 'go', 'hello-world.go'): get_hello_world('go'),
+    }
+    create_files_from_list(files)
+    built = []
+    get_source = source._get_source
+    monkeypatch.setattr(source, '_get_source', lambda *args: built.append(args[1]) or get_source(*args))
+    sources = source.find_sources(tmp_dir, 'HELLO_WORLD.py')
+    assert [src.name for src in sources['helloworld']] == ['hello_world']
+    assert built == ['hello_world.py']
+    assert source.find_sources(tmp_dir, 'hello_world.go') == {}
+
+
+def _create_languages(tmp_dir, test_info_string, count):
+    for index in range(count):
+        language = f'python{index}'
+        create_files_from_list({
+            os.path.join(tmp_dir, language, 'testinfo.yml'): test_info_string,
+            os.path.join(tmp_dir, language, 'hello_world.py'): get_hello_world('python'),
+            os.path.join(tmp_dir, language, 'baklava.py'): get_hello_world('python'),
+        })
+
+
+def test_get_sources_does_not_render_testinfo(tmp_dir, test_info_string_no_build, mock_projects, mock_cache_dir,
+                                              monkeypatch):
+    _create_languages(tmp_dir, test_info_string_no_build, 2)
+    monkeypatch.setattr(source.testinfo.TestInfo, 'from_string', _fail_rendering(os.getpid()))
+    sources = source.get_sources(tmp_dir)
+    assert sorted(f'{s.language}/{s.name}{s.extension}' for s in sources['helloworld']) == \
+        ['python0/hello_world.py', 'python1/hello_world.py']
+
+
+def test_get_sources_stores_testinfo_rendered_after_walk(tmp_dir, test_info_string_no_build, mock_projects,
+                                                         mock_cache_dir, monkeypatch):
+    _create_languages(tmp_dir, test_info_string_no_build, 1)
+    registered = []
+    monkeypatch.setattr('glotter.sourceindex.atexit.register', registered.append)
+    src = source.get_sources(tmp_dir)['helloworld'][0]
+    assert registered == []
+    assert src.test_info.container_info.cmd == 'python hello_world.py'
+    assert len(registered) == 1
+
+    registered[0]()
+    monkeypatch.setattr(source.testinfo.TestInfo, 'from_string', _fail_rendering(os.getpid()))
+    src = source.get_sources(tmp_dir)['helloworld'][0]
+    assert src.test_info.container_info.cmd == 'python hello_world.py'
+
+
+def test_render_test_infos_in_parallel(tmp_dir, test_info_string_no_build, mock_projects, mock_cache_dir,
+                                       monkeypatch):
+    _create_languages(tmp_dir, test_info_string_no_build, 5)
+    sources = source.get_sources(tmp_dir)['helloworld']
+    monkeypatch.setattr(source, 'PARALLEL_RENDER_MIN_DIRECTORIES', 1)
+    monkeypatch.setattr(source.testinfo.TestInfo, 'from_string', _fail_rendering(os.getpid()))
+    source.render_test_infos(sources, jobs=2)
+    assert [s.test_info.container_info.cmd for s in sources] == ['python hello_world.py'] * 5
+
+
+def _fail_rendering(pid):
+    from_string = source.testinfo.TestInfo.from_string
+
+    def wrapper(string, src):
+        # testinfo must not be rendered in this process, only in processes started by it
+        assert os.getpid() != pid
+        return from_string(string, src)
+    return wrapper
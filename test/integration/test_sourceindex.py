@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+from glotter import source, sourceindex
+from glotter.sourceindex import SourceIndex
+
+from test.integration.fixtures import tmp_dir, test_info_string_no_build, glotter_yml_projects, mock_projects, \
+    mock_cache_dir
+from test.integration.test_source import create_files_from_list, get_hello_world
+
+
+@pytest.fixture
+def python_dir(tmp_dir, test_info_string_no_build):
+    path = os.path.join(tmp_dir, 'archive', 'p', 'python')
+    create_files_from_list({
+        os.path.join(path, 'testinfo.yml'): test_info_string_no_build,
+        os.path.join(path, 'hello_world.py'): get_hello_world('python'),
+    })
+    return path
+
+
+def touch_later(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+
+def test_refresh_finds_testinfo_directories(tmp_dir, python_dir, mock_projects, mock_cache_dir):
+    directories = SourceIndex(tmp_dir).refresh()
+    assert [d.path for d in directories] == [python_dir]
+    assert directories[0].folder == {'extension': '.py', 'naming': 'underscore'}
+    assert 'hello_world.py' in directories[0].files
+
+
+def test_refresh_reports_changes(tmp_dir, python_dir, mock_projects, mock_cache_dir):
+    index = SourceIndex(tmp_dir)
+    index.refresh()
+    assert index.changed
+    index.refresh()
+    assert not index.changed
+
+    touch_later(os.path.join(python_dir, 'testinfo.yml'))
+    index.refresh()
+    assert index.changed
+    index.refresh()
+    assert not index.changed
+
+
+def test_refresh_parses_changed_testinfo_in_parallel(tmp_dir, test_info_string_no_build, mock_projects,
+                                                     mock_cache_dir, monkeypatch):
+    paths = [os.path.join(tmp_dir, f'python{index}') for index in range(4)]
+    create_files_from_list({os.path.join(path, 'testinfo.yml'): test_info_string_no_build for path in paths})
+    monkeypatch.setattr(sourceindex, 'PARALLEL_PARSE_MIN_FILES', 1)
+    monkeypatch.setattr('os.cpu_count', lambda: 2)
+    pid = os.getpid()
+    load_yaml = sourceindex.load_yaml
+
+    def parse_in_other_process(string):
+        assert os.getpid() != pid
+        return load_yaml(string)
+    monkeypatch.setattr(sourceindex, 'load_yaml', parse_in_other_process)
+    directories = SourceIndex(tmp_dir).refresh()
+    assert [d.path for d in directories] == paths
+    assert all(d.folder == {'extension': '.py', 'naming': 'underscore'} for d in directories)
+
+
+def test_get_sources_does_not_parse_testinfo_when_index_is_current(tmp_dir, python_dir, mock_projects,
+                                                                   mock_cache_dir, monkeypatch):
+    source.get_sources(tmp_dir)
+    monkeypatch.setattr('yaml.safe_load', lambda *args, **kwargs: pytest.fail('testinfo was parsed'))
+    monkeypatch.setattr('jinja2.Environment.from_string', lambda *args, **kwargs: pytest.fail('testinfo was rendered'))
+    sources = source.get_sources(tmp_dir)
+    assert [s.name for s in sources['helloworld']] == ['hello_world']
+    assert sources['helloworld'][0].test_info.container_info.cmd == 'python hello_world.py'
+
+
+def test_get_sources_finds_new_source(tmp_dir, python_dir, mock_projects, mock_cache_dir):
+    source.get_sources(tmp_dir)
+    create_files_from_list({os.path.join(python_dir, 'baklava.py'): 'print("baklava")'})
+    touch_later(python_dir)
+    sources = source.get_sources(tmp_dir)
+    assert [s.name for s in sources['baklava']] == ['baklava']
+
+
+def test_get_sources_finds_new_directory(tmp_dir, python_dir, test_info_string_no_build, mock_projects,
+                                         mock_cache_dir):
+    source.get_sources(tmp_dir)
+    python3_dir = os.path.join(tmp_dir, 'archive', 'p', 'python3')
+    create_files_from_list({
+        os.path.join(python3_dir, 'testinfo.yml'): test_info_string_no_build,
+        os.path.join(python3_dir, 'hello_world.py'): get_hello_world('python'),
+    })
+    touch_later(os.path.dirname(python3_dir))
+    sources = source.get_sources(tmp_dir)
+    assert sorted(s.language for s in sources['helloworld']) == ['python', 'python3']
+
+
+def test_get_sources_reparses_changed_testinfo(tmp_dir, python_dir, test_info_string_no_build, mock_projects,
+                                               mock_cache_dir):
+    source.get_sources(tmp_dir)
+    testinfo_path = os.path.join(python_dir, 'testinfo.yml')
+    create_files_from_list({testinfo_path: test_info_string_no_build.replace('3.7-alpine', '3.8-alpine')})
+    touch_later(testinfo_path)
+    sources = source.get_sources(tmp_dir)
+    assert sources['helloworld'][0].test_info.container_info.tag == '3.8-alpine'
+
+
+def test_save_ignores_unwritable_index_path(tmp_dir, python_dir, mock_projects):
+    index_path = os.path.join(python_dir, 'hello_world.py', 'index.json')
+    index = SourceIndex(tmp_dir, index_path=index_path)
+    index.refresh()
+    index.save()
+    assert not os.path.exists(index_path)
@@ -18,7 +18,10 @@ def docker():
 
 @pytest.fixture
 def factory(docker):
-    return containerfactory.ContainerFactory(docker_client=docker)
+    factory = containerfactory.ContainerFactory(docker_client=docker)
+    yield factory
+    factory.cleanup_all()
+    containerfactory.ContainerFactory._instances.pop(containerfactory.ContainerFactory, None)
 
 
 @pytest.fixture
@@ -82,9 +85,11 @@ def source_with_build(test_info_string_with_build):
 
 @pytest.fixture
 def no_io(monkeypatch):
-    monkeypatch.setattr('tempfile.mkdtemp', lambda *args, **kwargs: 'TEMP_DIR')
-    monkeypatch.setattr('shutil.copy', lambda *args, **kwargs: '')
-    monkeypatch.setattr('shutil.rmtree', lambda *args, **kwargs: '')
+    monkeypatch.setattr('glotter.containerfactory._get_dir_name', lambda *args, **kwargs: 'SOURCE_DIR')
+    monkeypatch.setattr('glotter.containerfactory._archive_source', lambda *args, **kwargs: b'ARCHIVE')
+    monkeypatch.setattr('glotter.buildcache.BuildCache.get_key', lambda *args, **kwargs: 'KEY')
+    monkeypatch.setattr('glotter.buildcache.BuildCache.restore', lambda *args, **kwargs: False)
+    monkeypatch.setattr('glotter.buildcache.BuildCache.store', lambda *args, **kwargs: None)
 
 
 @pytest.fixture
@@ -1,10 +1,18 @@
+import io
+import os
+import tarfile
+
 from uuid import uuid4 as uuid
 
+from docker.errors import ImageNotFound
+
 
 class ContainerExec:
     def __init__(self, cmd, attributes):
         self.cmd = cmd
         self._attributes = attributes
+        self.output = 'executed'.encode('utf-8')
+        self.exit_code = 0
 
     def __getitem__(self, key):
         return self._attributes[key]
@@ -14,9 +22,14 @@ class Container:
     def __init__(self, image, name, attributes):
         self.image = image
         self.name = name
+        self.id = uuid().hex
         self._attributes = attributes
+        self.labels = attributes.get('labels', {})
+        self.status = 'running'
         self.removed = False
         self.execs = []
+        self.archives = []
+        self.files = {}
 
     def __getitem__(self, key):
         return self._attributes[key]
@@ -28,12 +41,38 @@ class Container:
         self.execs.append(ContainerExec(cmd, kwargs))
         return 0, 'executed'.encode('utf-8')
 
+    def put_archive(self, path, data):
+        self.archives.append((path, data))
+        return True
+
+    def get_archive(self, path):
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w') as tar:
+            directory = tarfile.TarInfo(os.path.basename(path))
+            directory.type = tarfile.DIRTYPE
+            tar.addfile(directory)
+            for name, contents in self.files.items():
+                info = tarfile.TarInfo(f'{os.path.basename(path)}/{name}')
+                info.size = len(contents)
+                tar.addfile(info, io.BytesIO(contents))
+        return iter([buffer.getvalue()]), {'name': os.path.basename(path)}
+
+
+def all_labels_match(container_labels, labels):
+    for label in labels:
+        key, _, value = label.partition('=')
+        if key not in container_labels or ('=' in label and container_labels[key] != value):
+            return False
+    return True
+
 
 class Containers:
     container_list = {}
 
     @classmethod
     def run(cls, image, **kwargs):
+        if image is None or image.tags[0] not in Images.image_list:
+            raise ImageNotFound(f'No such image: {image}')
         name = kwargs['name'] if 'name' in kwargs else uuid().hex
         info = Container(image, name, kwargs)
         if name not in cls.container_list:
@@ -41,11 +80,27 @@ class Containers:
             return cls.container_list[name]
         raise EnvironmentError('Container exists')
 
+    @classmethod
+    def list(cls, all=False, filters=None):
+        labels = (filters or {}).get('label', [])
+        labels = [labels] if isinstance(labels, str) else labels
+        return [
+            container for container in cls.container_list.values()
+            if not container.removed and (all or container.status == 'running')
+            and all_labels_match(container.labels, labels)
+        ]
+
     @classmethod
     def clear(cls):
         cls.container_list = {}
 
 
+class Image:
+    def __init__(self, name):
+        self.id = f'sha256:{name}'
+        self.tags = [name]
+
+
 class Images:
     image_list = []
 
@@ -56,10 +111,20 @@ class Images:
 
     @classmethod
     def list(cls, name=None, **kwargs):
-        if name and name in cls.image_list:
-            return [name]
+        if name:
+            return [Image(name)] if name in cls.image_list else []
 
-        return cls.image_list
+        return [Image(image) for image in cls.image_list]
+
+    @classmethod
+    def get(cls, name):
+        if name not in cls.image_list:
+            raise ImageNotFound(f'No such image: {name}')
+        return Image(name)
+
+    @classmethod
+    def remove(cls, name):
+        cls.image_list.remove(name)
 
     @classmethod
     def clear(cls):
@@ -67,11 +132,42 @@ class Images:
 
 
 class DockerApi:
+    exec_list = {}
+
     @staticmethod
     def pull(repository, **kwargs):
         tag = kwargs.get('tag') or 'latest'
         Images.add_image(f'{repository}:{tag}')
-        return Images.list(f'{repository}:{tag}')
+        return [
+            {'status': f'Pulling from {repository}', 'id': tag},
+            {'status': 'Pulling fs layer', 'id': 'layer1'},
+            {'status': 'Downloading', 'id': 'layer1', 'progressDetail': {'current': 512, 'total': 1024}},
+            {'status': 'Download complete', 'id': 'layer1'},
+            {'status': 'Pull complete', 'id': 'layer1'},
+            {'status': f'Status: Downloaded newer image for {repository}:{tag}'},
+        ]
+
+    @classmethod
+    def exec_create(cls, container, cmd, **kwargs):
+        container = next(c for c in Containers.container_list.values() if c.id == container)
+        container_exec = ContainerExec(cmd, kwargs)
+        container.execs.append(container_exec)
+        exec_id = uuid().hex
+        cls.exec_list[exec_id] = container_exec
+        return {'Id': exec_id}
+
+    @classmethod
+    def exec_start(cls, exec_id, stream=False, **kwargs):
+        output = cls.exec_list[exec_id].output
+        return iter([output]) if stream else output
+
+    @classmethod
+    def exec_inspect(cls, exec_id):
+        return {'ExitCode': cls.exec_list[exec_id].exit_code}
+
+    @classmethod
+    def clear(cls):
+        cls.exec_list = {}
 
 
 class DockerMock:
@@ -82,4 +178,5 @@ class DockerMock:
     @classmethod
     def clear(cls):
         cls.images.clear()
-        cls.containers.clear()
\ No newline at end of file
+        cls.containers.clear()
+        cls.api.clear()
\ No newline at end of file
@@ -0,0 +1,54 @@
+import pytest
+
+from glotter.catalog import SourceCatalog
+
+
+class SourceMock:
+    def __init__(self, name, extension, language):
+        self.name = name
+        self.extension = extension
+        self.language = language
+
+    def __repr__(self):
+        return f'{self.name}{self.extension}'
+
+
+@pytest.fixture
+def sources():
+    return {
+        'helloworld': [SourceMock('hello_world', '.py', 'python'), SourceMock('hello-world', '.go', 'go')],
+        'baklava': [SourceMock('baklava', '.py', 'python')],
+        'fibonacci': [],
+    }
+
+
+@pytest.fixture
+def catalog(sources):
+    return SourceCatalog(sources)
+
+
+def test_sources(catalog, sources):
+    assert catalog.sources == sources['helloworld'] + sources['baklava']
+
+
+@pytest.mark.parametrize(('project_type', 'expected'), [
+    ('helloworld', 2),
+    ('HelloWorld', 2),
+    ('fibonacci', 0),
+    ('unknown', 0),
+])
+def test_by_project(catalog, project_type, expected):
+    assert len(catalog.by_project(project_type)) == expected
+
+
+def test_by_language_ignores_case(catalog, sources):
+    assert catalog.by_language('Python') == {
+        'helloworld': [sources['helloworld'][0]],
+        'baklava': sources['baklava'],
+    }
+    assert catalog.by_language('cobol') == {}
+
+
+def test_by_filename_ignores_case(catalog, sources):
+    assert catalog.by_filename('HELLO-WORLD.go') == {'helloworld': [sources['helloworld'][1]]}
+    assert catalog.by_filename('hello-world') == {}
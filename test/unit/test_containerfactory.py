@@ -1,10 +1,26 @@
-from test.unit.mockdocker import Containers, Images
-from test.unit.fixtures import factory, container_info, source_no_build, docker, test_info_string_no_build, no_io
+import io
+import os
+import time
+import socket
+import tarfile
+import threading
+
+import pytest
+
+from docker.errors import NotFound
+
+from glotter.source import Source
+from glotter.execstream import ExecTimeout
+from glotter.containerfactory import LABEL, RUN_ID_LABEL, PID_LABEL, HOST_LABEL
+from glotter.testinfo import ContainerInfo
+from test.unit.mockdocker import Containers, Images, DockerApi
+from test.unit.fixtures import factory, container_info, source_no_build, source_with_build, docker, \
+    test_info_string_no_build, test_info_string_with_build, no_io
 
 
 def test_get_image_returns_image(factory, container_info):
     result = factory.get_image(container_info, quiet=True)
-    assert result == f'{container_info.image}:{container_info.tag}'
+    assert result.tags == [f'{container_info.image}:{container_info.tag}']
 
 
 def test_get_image_downloads_image_when_not_found(factory, container_info):
@@ -16,42 +32,341 @@ def test_get_image_returns_correct_tag(factory, container_info):
     Images.add_image(f'{container_info.image}:{container_info.tag}')
     Images.add_image(f'{container_info.image}:other-tag')
     result = factory.get_image(container_info, quiet=True)
-    assert result == f'{container_info.image}:{container_info.tag}'
+    assert result.tags == [f'{container_info.image}:{container_info.tag}']
+
 
+def test_get_image_lists_images_once(factory, container_info, monkeypatch):
+    Images.add_image(f'{container_info.image}:{container_info.tag}')
+    calls = []
+    images_list = Images.list
+    monkeypatch.setattr(Images, 'list', lambda *args, **kwargs: calls.append(kwargs) or images_list(*args, **kwargs))
+    factory.get_image(container_info, quiet=True)
+    factory.get_image(container_info, quiet=True)
+    assert calls == [{}]
 
-def test_get_container_uses_correct_image(factory, source_no_build, monkeypatch):
-    monkeypatch.setattr('tempfile.mkdtemp', lambda *args, **kwargs: 'TEMP_DIR')
-    monkeypatch.setattr('shutil.copy', lambda *args, **kwargs: '')
+
+def test_get_image_digest_without_pull_does_not_pull(factory, container_info):
+    assert factory.get_image_digest(container_info, pull=False) is None
+    assert f'{container_info.image}:{container_info.tag}' not in Images.image_list
+    Images.add_image(f'{container_info.image}:{container_info.tag}')
+    assert factory.get_image_digest(container_info, pull=False) == f'sha256:{container_info.image}:{container_info.tag}'
+
+
+def test_get_image_finds_images_added_after_listing(factory, container_info):
+    factory.get_image(container_info, quiet=True)
+    other = ContainerInfo(image=container_info.image, tag='other-tag', cmd=container_info.cmd)
+    Images.add_image(f'{container_info.image}:other-tag')
+    assert factory.get_image(other, quiet=True).tags == [f'{container_info.image}:other-tag']
+
+
+def test_get_container_pulls_image_removed_after_caching(factory, source_no_build, no_io):
+    factory.get_image(source_no_build.test_info.container_info, quiet=True)
+    Images.remove('python:3.7-alpine')
+    result = factory.get_container(source_no_build)
+    assert result.image.tags == ['python:3.7-alpine']
+    assert 'python:3.7-alpine' in Images.image_list
+
+
+def test_get_container_uses_correct_image(factory, source_no_build, no_io):
     result = factory.get_container(source_no_build)
-    assert result.image == 'python:3.7-alpine'
+    assert result.image.tags == ['python:3.7-alpine']
 
 
-def test_get_container_runs_container_with_correct_settings(factory, source_no_build, monkeypatch):
-    monkeypatch.setattr('tempfile.mkdtemp', lambda *args, **kwargs: 'TEMP_DIR')
-    monkeypatch.setattr('shutil.copy', lambda *args, **kwargs: '')
+def test_get_container_runs_container_with_correct_settings(factory, source_no_build, no_io):
     result = factory.get_container(source_no_build)
-    assert result.name.startswith(source_no_build.name)
+    assert result.name.startswith('glotter_python_3.7-alpine_')
     assert result['command'] == 'sleep 1h'
     assert result['working_dir'] == '/src'
     assert result['detach']
 
 
-def test_get_container_builds_correct_volume_info(factory, source_no_build, monkeypatch):
-    monkeypatch.setattr('shutil.copy', lambda *args, **kwargs: '')
-    monkeypatch.setattr('tempfile.mkdtemp', lambda *args, **kwargs: 'TEMP_DIR')
+def test_get_container_does_not_mount_volumes(factory, source_no_build, no_io):
+    result = factory.get_container(source_no_build)
+    assert 'volumes' not in result._attributes
+
+
+def test_get_container_streams_source_into_container(factory, source_no_build, no_io):
+    result = factory.get_container(source_no_build)
+    assert result.archives == [('/src', b'ARCHIVE')]
+
+
+def test_get_container_streams_source_once(factory, source_no_build, no_io):
+    factory.get_container(source_no_build)
     result = factory.get_container(source_no_build)
-    assert result['volumes'] == {'TEMP_DIR': {'bind': '/src', 'mode': 'rw'}}
+    assert len(result.archives) == 1
+
+
+def test_get_container_reuses_idle_container_for_same_image(factory, test_info_string_no_build, no_io):
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    second = Source('second.py', 'python', 'path', test_info_string_no_build)
+    container = factory.get_container(first)
+    factory.cleanup(first)
+    assert factory.get_container(second) is container
+
+
+def test_get_container_does_not_share_busy_container(factory, test_info_string_no_build, no_io):
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    second = Source('second.py', 'python', 'path', test_info_string_no_build)
+    assert factory.get_container(first) is not factory.get_container(second)
+
+
+def test_get_container_shares_container_at_max_containers(factory, test_info_string_no_build, no_io, monkeypatch):
+    monkeypatch.setattr(factory, '_max_containers', 1)
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    second = Source('second.py', 'python', 'path', test_info_string_no_build)
+    assert factory.get_container(first) is factory.get_container(second)
+
+
+def test_get_container_does_not_share_container_of_source_with_timeout(factory, test_info_string_no_build, no_io,
+                                                                       monkeypatch):
+    monkeypatch.setattr(factory, '_max_containers', 2)
+    limited = _limited_source('limited.py', test_info_string_no_build)
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    second = Source('second.py', 'python', 'path', test_info_string_no_build)
+    container = factory.get_container(limited)
+    assert factory.get_container(first) is not container
+    assert factory.get_container(second) is not container
+
+
+def test_get_container_waits_rather_than_share_with_source_with_timeout(factory, test_info_string_no_build, no_io,
+                                                                        monkeypatch):
+    monkeypatch.setattr(factory, '_max_containers', 1)
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    limited = _limited_source('limited.py', test_info_string_no_build)
+    factory.get_container(first)
+    leased = []
+    thread = threading.Thread(target=lambda: leased.append(factory.get_container(limited)))
+    thread.start()
+    thread.join(0.2)
+    assert leased == []
+    factory.cleanup(first)
+    thread.join(5)
+    assert len(leased) == 1
+
+
+def test_get_container_evicts_idle_container_at_max_containers(factory, source_no_build, test_info_string_with_build,
+                                                               no_io, monkeypatch):
+    monkeypatch.setattr(factory, '_max_containers', 1)
+    container = factory.get_container(source_no_build)
+    factory.cleanup(source_no_build)
+    factory.get_container(Source('hello-world.go', 'go', 'path', test_info_string_with_build))
+    assert Containers.container_list[container.name].removed
+
+
+def test_get_container_does_not_block_other_images_while_starting(factory, source_no_build, source_with_build, no_io,
+                                                                  monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    blocked = []
+    run = Containers.run
+
+    def slow_run(image, **kwargs):
+        if image.tags[0].startswith('python'):
+            started.set()
+            if not release.wait(5):
+                blocked.append(image)
+        return run(image, **kwargs)
+
+    monkeypatch.setattr(Containers, 'run', slow_run)
+    thread = threading.Thread(target=factory.get_container, args=(source_no_build,))
+    thread.start()
+    assert started.wait(5)
+    assert factory.get_container(source_with_build).image.tags == ['golang:1.12-alpine']
+    release.set()
+    thread.join()
+    assert blocked == []
+    assert factory.get_container(source_no_build).image.tags == ['python:3.7-alpine']
+
+
+def test_get_container_shares_starting_container_at_max_containers(factory, test_info_string_no_build, no_io,
+                                                                   monkeypatch):
+    monkeypatch.setattr(factory, '_max_containers', 1)
+    first = Source('first.py', 'python', 'path', test_info_string_no_build)
+    second = Source('second.py', 'python', 'path', test_info_string_no_build)
+    containers = []
+    threads = [
+        threading.Thread(target=lambda s=s: containers.append(factory.get_container(s))) for s in (first, second)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(containers) == 2 and containers[0] is containers[1]
+
+
+def test_get_working_dir_is_source_directory_in_container(factory, source_no_build, no_io):
+    assert factory.get_working_dir(source_no_build) == '/src/SOURCE_DIR'
+
+
+def test_get_working_dir_is_unique_per_source_path(factory, test_info_string_no_build, monkeypatch):
+    monkeypatch.setattr('glotter.containerfactory._archive_source', lambda *args, **kwargs: b'')
+    first = Source('name.py', 'python', 'first', test_info_string_no_build)
+    second = Source('name.py', 'python', 'second', test_info_string_no_build)
+    assert factory.get_working_dir(first) != factory.get_working_dir(second)
+    assert factory.get_working_dir(first).startswith('/src/name_')
 
 
-def test_cleanup_removes_container(source_no_build, factory, no_io):
+def test_export_working_dir_is_relative_to_working_dir(factory, source_no_build, no_io):
+    factory.get_container(source_no_build).files = {'a.out': b'binary'}
+    archive = factory.export_working_dir(source_no_build)
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        assert tar.getnames() == ['.', './a.out']
+        assert tar.extractfile('./a.out').read() == b'binary'
+
+
+def test_import_working_dir_puts_archive_in_working_dir(factory, source_no_build, no_io):
+    factory.import_working_dir(source_no_build, b'BUILD')
+    assert factory.get_container(source_no_build).archives[-1] == ('/src/SOURCE_DIR', b'BUILD')
+
+
+def test_cleanup_keeps_container_warm(source_no_build, factory, no_io):
     container = factory.get_container(source_no_build)
     factory.cleanup(source_no_build)
+    assert not Containers.container_list[container.name].removed
+
+
+def test_cleanup_removes_container_beyond_pool_size(source_no_build, factory, no_io, monkeypatch):
+    monkeypatch.setattr(factory, '_pool_size', 0)
+    container = factory.get_container(source_no_build)
+    factory.cleanup(source_no_build)
+    assert Containers.container_list[container.name].removed
+
+
+def test_cleanup_all_removes_containers(source_no_build, factory, no_io):
+    container = factory.get_container(source_no_build)
+    factory.cleanup_all()
     assert Containers.container_list[container.name].removed
 
 
-def test_cleanup_removes_volume_dir(source_no_build, factory, no_io):
-    def verify_rmtree(path, ignore_errors=False, *args, **kwargs):
-        assert path == 'TEMP_DIR'
-        assert ignore_errors
+def test_containers_are_labelled_with_run(source_no_build, factory, no_io):
+    container = factory.get_container(source_no_build)
+    assert container.labels[RUN_ID_LABEL] == factory.run_id
+    assert container.labels[PID_LABEL] == str(os.getpid())
+
+
+def _labelled_container(name, run_id='other-run', pid=None, host=None, status='running'):
+    labels = {
+        LABEL: '',
+        RUN_ID_LABEL: run_id,
+        PID_LABEL: str(pid or os.getpid()),
+        HOST_LABEL: host or socket.gethostname(),
+    }
+    Images.add_image(f'{name}:latest')
+    container = Containers.run(Images.get(f'{name}:latest'), name=name, labels=labels)
+    container.status = status
+    return container
+
+
+def test_reap_removes_containers_the_pool_lost_track_of(source_no_build, factory, no_io):
+    pooled = factory.get_container(source_no_build)
+    untracked = _labelled_container('untracked', run_id=factory.run_id)
+    other_process = _labelled_container('other_process', run_id=factory.run_id, pid=os.getpid() + 1)
+    factory.reap()
+    assert pooled.removed and untracked.removed
+    assert not other_process.removed
+    factory.reap(whole_run=True)
+    assert other_process.removed
+
+
+def test_remove_orphans_keeps_containers_of_live_runs(factory, monkeypatch):
+    monkeypatch.setattr('glotter.containerfactory.is_process_running', lambda pid: pid == os.getpid())
+    current_run = _labelled_container('current_run', run_id=factory.run_id, pid=os.getpid() + 1)
+    live = _labelled_container('live')
+    dead = _labelled_container('dead', pid=os.getpid() + 1)
+    stopped = _labelled_container('stopped', status='exited')
+    other_host = _labelled_container('other_host', pid=os.getpid() + 1, host='other-host')
+    assert factory.remove_orphans() == 2
+    assert [c.removed for c in (current_run, live, dead, stopped, other_host)] == [False, False, True, True, False]
+    assert factory.remove_orphans(include_live=True) == 2
+    assert live.removed and other_host.removed
+
+
+def test_cleanup_removes_source_directory(source_no_build, factory, no_io):
+    container = factory.get_container(source_no_build)
+    factory.cleanup(source_no_build)
+    assert container.execs[-1].cmd == ['rm', '-rf', '/src/SOURCE_DIR']
+
+
+def test_cleanup_ignores_container_removed_meanwhile(source_no_build, factory, no_io, monkeypatch):
+    container = factory.get_container(source_no_build)
+
+    def exec_run(cmd, **kwargs):
+        raise NotFound('No such container')
+    monkeypatch.setattr(container, 'exec_run', exec_run)
+    factory.cleanup(source_no_build)
+
+
+def _limited_source(name, test_info_string):
+    limits = '  timeout: 0.05\n  cpus: 0.5\n  memory: "64m"\n'
+    return Source(name, 'python', 'path', test_info_string + limits)
+
+
+def test_get_container_applies_resource_limits(factory, test_info_string_no_build, no_io):
+    result = factory.get_container(_limited_source('limited.py', test_info_string_no_build))
+    assert result['nano_cpus'] == 500000000
+    assert result['mem_limit'] == '64m'
+
+
+def test_get_container_does_not_reuse_container_with_other_limits(factory, test_info_string_no_build, no_io):
+    limited = _limited_source('limited.py', test_info_string_no_build)
+    container = factory.get_container(limited)
+    factory.cleanup(limited)
+    assert factory.get_container(Source('other.py', 'python', 'path', test_info_string_no_build)) is not container
+
+
+def test_exec_timeout_removes_container(factory, test_info_string_no_build, no_io, monkeypatch):
+    def exec_start(exec_id, stream=False):
+        yield b'partial'
+        while not container.removed:
+            time.sleep(0.01)
+
+    monkeypatch.setattr(DockerApi, 'exec_start', exec_start)
+    source = _limited_source('limited.py', test_info_string_no_build)
+    container = factory.get_container(source)
+    with pytest.raises(ExecTimeout) as e:
+        source.run()
+    assert e.value.output == 'partial'
+    assert container.removed
+    assert factory.get_container(source) is not container
+
+
+def test_cleanup_image_removes_idle_containers_of_image(factory, source_no_build, source_with_build, no_io):
+    idle = factory.get_container(source_no_build)
+    factory.cleanup(source_no_build)
+    busy = factory.get_container(source_with_build)
+    factory.cleanup_image(source_no_build.test_info.container_info)
+    factory.cleanup_image(source_with_build.test_info.container_info)
+    assert idle.removed
+    assert not busy.removed
+
+
+def test_cleanup_image_removes_leased_containers_once_released(factory, source_no_build, no_io):
+    container = factory.get_container(source_no_build)
+    factory.cleanup_image(source_no_build.test_info.container_info)
+    assert not container.removed
+    factory.cleanup(source_no_build)
+    assert container.removed
+
+
+def test_cleanup_image_is_forgotten_when_image_is_leased_again(factory, source_no_build, test_info_string_no_build,
+                                                               no_io):
     factory.get_container(source_no_build)
     factory.cleanup(source_no_build)
+    factory.cleanup_image(source_no_build.test_info.container_info)
+    other = Source('other.py', 'python', 'path', test_info_string_no_build)
+    container = factory.get_container(other)
+    factory.cleanup(other)
+    assert not container.removed
+
+
+def test_cleanup_image_keeps_idle_containers_warm_until_idle_timeout(factory, source_no_build, no_io, monkeypatch):
+    factory.keep_warm = True
+    idle = factory.get_container(source_no_build)
+    factory.cleanup(source_no_build)
+    factory.cleanup_image(source_no_build.test_info.container_info)
+    factory.evict_idle()
+    assert not idle.removed
+
+    monkeypatch.setattr(factory, '_idle_timeout', -1)
+    factory.evict_idle()
+    assert idle.removed
@@ -0,0 +1,33 @@
+from glotter import download
+from glotter.source import Source
+from test.unit.fixtures import factory, docker, test_info_string_no_build, test_info_string_with_build
+
+
+def _source(name, test_info_string):
+    return Source(name=name, language='lang', path=f'path/{name}', test_info_string=test_info_string)
+
+
+def test_download_pulls_each_image_once(factory, test_info_string_no_build, test_info_string_with_build,
+                                        monkeypatch):
+    pulls = []
+    pull = factory._api_client.pull
+    monkeypatch.setattr(factory._api_client, 'pull', lambda repository, **kwargs: pulls.append(repository) or
+                        pull(repository, **kwargs))
+    monkeypatch.setattr('glotter.download.ContainerFactory', lambda: factory)
+    sources = [
+        _source('one', test_info_string_no_build),
+        _source('two', test_info_string_with_build),
+        _source('three', test_info_string_no_build),
+    ]
+    download._download_images_from_sources(sources, jobs=4)
+    assert sorted(pulls) == ['golang', 'python']
+    assert sorted(factory._client.images.image_list) == ['golang:1.12-alpine', 'python:3.7-alpine']
+
+
+def test_download_skips_present_images(factory, test_info_string_no_build, monkeypatch):
+    pulls = []
+    factory._client.images.add_image('python:3.7-alpine')
+    monkeypatch.setattr(factory._api_client, 'pull', lambda repository, **kwargs: pulls.append(repository) or [])
+    monkeypatch.setattr('glotter.download.ContainerFactory', lambda: factory)
+    download._download_images_from_sources([_source('one', test_info_string_no_build)], jobs=2)
+    assert pulls == []
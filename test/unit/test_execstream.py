@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from glotter.execstream import ExecStream, ExecTimeout
+
+
+class ApiMock:
+    def __init__(self, chunks, exit_code=0):
+        self.chunks = chunks
+        self.exit_code = exit_code
+
+    def exec_start(self, exec_id, stream=False):
+        return iter(self.chunks)
+
+    def exec_inspect(self, exec_id):
+        return {'ExitCode': self.exit_code}
+
+
+def test_iterating_yields_chunks_as_they_arrive():
+    stream = ExecStream(ApiMock([b'one', b'two']), 'id')
+    assert list(stream) == [b'one', b'two']
+
+
+def test_exit_code_is_none_until_output_is_read():
+    stream = ExecStream(ApiMock([b'one'], exit_code=3), 'id')
+    assert stream.exit_code is None
+    list(stream)
+    assert stream.exit_code == 3
+
+
+def test_output_can_only_be_read_once():
+    stream = ExecStream(ApiMock([b'one']), 'id')
+    list(stream)
+    with pytest.raises(RuntimeError):
+        list(stream)
+
+
+def test_iter_text_keeps_characters_split_across_chunks():
+    encoded = 'héllo'.encode('utf-8')
+    stream = ExecStream(ApiMock([encoded[:2], encoded[2:]]), 'id')
+    assert ''.join(stream.iter_text()) == 'héllo'
+
+
+def test_collect_keeps_small_output_in_memory():
+    stream = ExecStream(ApiMock([b'one', b'two']), 'id')
+    with stream.collect(max_memory=10) as output:
+        assert not output._rolled
+        assert output.read() == b'onetwo'
+
+
+def test_collect_spills_large_output_to_file():
+    stream = ExecStream(ApiMock([b'x' * 8, b'y' * 8]), 'id')
+    with stream.collect(max_memory=10) as output:
+        assert output._rolled
+        assert output.read() == b'x' * 8 + b'y' * 8
+
+
+class BlockingApiMock(ApiMock):
+    def __init__(self):
+        super().__init__([])
+        self.stopped = threading.Event()
+
+    def exec_start(self, exec_id, stream=False):
+        yield b'partial'
+        self.stopped.wait(5)
+        raise ConnectionError('container removed')
+
+
+def test_timeout_stops_command_and_ends_output():
+    api = BlockingApiMock()
+    stream = ExecStream(api, 'id', timeout=0.01, on_timeout=api.stopped.set)
+    assert list(stream) == [b'partial']
+    assert stream.timed_out
+    assert stream.exit_code is None
+
+
+def test_errors_without_timeout_are_raised():
+    api = BlockingApiMock()
+    api.stopped.set()
+    stream = ExecStream(api, 'id', timeout=5)
+    with pytest.raises(ConnectionError):
+        list(stream)
+    assert not stream.timed_out
+
+
+def test_exec_timeout_message_includes_partial_output():
+    assert str(ExecTimeout('cmd', 2, 'partial')) == '"cmd" timed out after 2s with output:\npartial'
+    assert str(ExecTimeout('cmd', 2)) == '"cmd" timed out after 2s'
@@ -0,0 +1,16 @@
+from glotter.limits import ResourceLimits
+
+
+def test_override_prefers_set_limits():
+    project = ResourceLimits(timeout=10, cpus=1, memory='256m')
+    container = ResourceLimits(timeout=2, memory=None)
+    assert project.override(container) == ResourceLimits(timeout=2, cpus=1, memory='256m')
+
+
+def test_from_dict_ignores_other_keys():
+    limits = ResourceLimits.from_dict({'image': 'python', 'cpus': 0.5})
+    assert limits == ResourceLimits(cpus=0.5)
+
+
+def test_to_dict_leaves_out_unset_limits():
+    assert ResourceLimits(timeout=3).to_dict() == {'timeout': 3}
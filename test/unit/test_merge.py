@@ -0,0 +1,13 @@
+import pytest
+
+from glotter.merge import get_missing_shards
+from glotter.shard import Shard
+
+
+@pytest.mark.parametrize(('shards', 'expected'), [
+    (['1/3', '2/3', '3/3'], []),
+    (['1/3', '3/3'], [Shard(2, 3)]),
+    ([], []),
+])
+def test_get_missing_shards(shards, expected):
+    assert get_missing_shards(shards) == expected
@@ -0,0 +1,219 @@
+import os
+
+import pytest
+
+from glotter.plugin import SelectionPlugin, ItemIndex, TimeoutReportPlugin, ImageAffinityPlugin, DurationPlugin, \
+    ResultFilePlugin, get_item_source
+from glotter.resultfile import ResultFile
+from glotter.shard import Shard
+from glotter.source import Source
+from test.unit.fixtures import test_info_string_no_build, test_info_string_with_build
+
+
+class CallSpec:
+    def __init__(self, params):
+        self.params = params
+
+
+class Item:
+    def __init__(self, function, source=None):
+        self.originalname = function
+        self.name = function
+        self.nodeid = f'test/projects/test_x.py::{function}'
+        self.callspec = None
+        if source is not None:
+            self.nodeid += f'[{source.name}{source.extension}]'
+            self.callspec = CallSpec({'source': source, 'other': 'param'})
+
+
+class Hook:
+    def __init__(self):
+        self.deselected = []
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+class Config:
+    def __init__(self):
+        self.hook = Hook()
+
+
+@pytest.fixture
+def python_source(test_info_string_no_build):
+    return Source('hello_world.py', 'python', os.path.join('archive', 'p', 'python'), test_info_string_no_build)
+
+
+@pytest.fixture
+def go_source(test_info_string_with_build):
+    return Source('hello-world.go', 'go', os.path.join('archive', 'g', 'go'), test_info_string_with_build)
+
+
+@pytest.fixture
+def items(python_source, go_source, monkeypatch):
+    monkeypatch.setattr('glotter.settings.Settings.test_mappings', {'helloworld': [], 'baklava': []})
+    monkeypatch.setattr('glotter.settings.Settings.get_test_mapping_name',
+                        lambda self, project_type: {'helloworld': ['test_hello_world'],
+                                                    'baklava': ['test_baklava']}[project_type])
+    return [
+        Item('test_hello_world', python_source),
+        Item('test_hello_world', go_source),
+        Item('test_baklava', python_source),
+        Item('test_unrelated'),
+    ]
+
+
+def select(plugin, items):
+    config = Config()
+    items = list(items)
+    plugin.pytest_collection_modifyitems(config, items)
+    return items, config.hook.deselected
+
+
+def test_get_item_source(python_source):
+    assert get_item_source(Item('test_hello_world', python_source)) is python_source
+
+
+def test_get_item_source_without_params():
+    assert get_item_source(Item('test_hello_world')) is None
+
+
+def test_item_index_finds_items_by_function_and_filename(items, python_source, go_source):
+    index = ItemIndex(items)
+    assert index.get('test_hello_world', 'HELLO_WORLD.py') == [(python_source, [items[0]])]
+    assert index.get('test_hello_world') == [(python_source, [items[0]]), (go_source, [items[1]])]
+    assert index.get('test_hello_world', 'baklava.py') == []
+
+
+def test_item_index_finds_unmapped_items(items):
+    assert ItemIndex(items).get_unmapped({'test_hello_world'}) == [items[3], items[2]]
+
+
+def test_selection_without_filters_keeps_everything(items):
+    selected, deselected = select(SelectionPlugin(), items)
+    assert selected == items
+    assert deselected == []
+
+
+def test_selection_by_language(items):
+    selected, deselected = select(SelectionPlugin(language='Python'), items)
+    assert selected == [items[0], items[2]]
+    assert deselected == [items[1], items[3]]
+
+
+def test_selection_by_project(items):
+    selected, _ = select(SelectionPlugin(project='helloworld'), items)
+    assert selected == items[0:2]
+
+
+def test_selection_by_source(items):
+    plugin = SelectionPlugin(source='HELLO-WORLD.go')
+    selected, _ = select(plugin, items)
+    assert selected == [items[1]]
+    assert plugin.selected == [items[1].nodeid]
+
+
+def test_selection_by_paths(items, go_source):
+    selected, _ = select(SelectionPlugin(paths=[go_source.full_path]), items)
+    assert selected == [items[1]]
+
+
+def test_selection_by_paths_keeping_other_tests(items, go_source):
+    selected, _ = select(SelectionPlugin(paths=[go_source.full_path], keep_other_tests=True), items)
+    assert selected == [items[1], items[3]]
+
+
+class Report:
+    def __init__(self, failed, user_properties):
+        self.failed = failed
+        self.user_properties = user_properties
+
+
+@pytest.mark.parametrize(('report', 'expected'), [
+    (Report(True, [('glotter', 'timeout')]), ('failed', 'T', 'TIMEOUT')),
+    (Report(True, []), None),
+])
+def test_timeout_report_plugin_reports_timeouts(report, expected):
+    assert TimeoutReportPlugin().pytest_report_teststatus(report) == expected
+
+
+class FactoryMock:
+    def __init__(self, removed):
+        self._removed = removed
+
+    def cleanup_image(self, container_info):
+        self._removed.append(container_info.image)
+
+
+def test_image_affinity_plugin_orders_tests_by_image(items):
+    ordered = list(items)
+    ImageAffinityPlugin().pytest_collection_modifyitems(ordered)
+    assert ordered == [items[3], items[0], items[2], items[1]]
+
+
+def test_image_affinity_plugin_removes_containers_after_last_test_of_image(items, monkeypatch):
+    removed = []
+    monkeypatch.setattr('glotter.plugin.ContainerFactory', lambda: FactoryMock(removed))
+    plugin = ImageAffinityPlugin()
+    plugin.pytest_collection_modifyitems(list(items))
+    for item in [items[3], items[0], items[2], items[1]]:
+        plugin.pytest_runtest_teardown(item)
+    assert removed == ['python', 'golang']
+
+
+class StatsMock:
+    def __init__(self):
+        self.recorded = {}
+        self.saved = False
+
+    def record(self, source, duration):
+        self.recorded[source.name] = duration
+
+    def save(self):
+        self.saved = True
+
+
+class LogReport:
+    def __init__(self, nodeid, duration, skipped=False):
+        self.nodeid = nodeid
+        self.duration = duration
+        self.skipped = skipped
+
+
+def test_duration_plugin_records_time_per_source(items):
+    stats = StatsMock()
+    plugin = DurationPlugin(stats)
+    plugin.pytest_collection_modifyitems(items)
+    plugin.pytest_runtest_logreport(LogReport(items[0].nodeid, 2))
+    plugin.pytest_runtest_logreport(LogReport(items[2].nodeid, 1))
+    plugin.pytest_runtest_logreport(LogReport(items[1].nodeid, 5, skipped=True))
+    plugin.pytest_runtest_logreport(LogReport(items[3].nodeid, 1))
+    plugin.pytest_sessionfinish()
+    assert stats.recorded == {'hello_world': 3}
+    assert stats.saved
+
+
+class OutcomeReport(LogReport):
+    def __init__(self, nodeid, duration, outcome, user_properties=()):
+        super().__init__(nodeid, duration, skipped=outcome == 'skipped')
+        self.failed = outcome == 'failed'
+        self.when = 'call'
+        self.user_properties = list(user_properties)
+
+
+def test_result_file_plugin_writes_outcome_per_test(items, tmp_path):
+    path = str(tmp_path / 'results.json')
+    plugin = ResultFilePlugin(path, Shard(1, 2))
+    plugin.pytest_collection_modifyitems(items)
+    plugin.pytest_runtest_logreport(OutcomeReport(items[0].nodeid, 2, 'passed'))
+    plugin.pytest_runtest_logreport(OutcomeReport(items[1].nodeid, 1, 'skipped'))
+    plugin.pytest_runtest_logreport(OutcomeReport(items[2].nodeid, 1, 'passed'))
+    plugin.pytest_runtest_logreport(OutcomeReport(items[2].nodeid, 3, 'failed', [('glotter', 'timeout')]))
+    plugin.pytest_sessionfinish()
+    result_file = ResultFile.load(path)
+    assert result_file.shards == ['1/2']
+    assert [(result['id'], result['outcome'], result['duration']) for result in result_file.results] == [
+        (items[0].nodeid, 'passed', 2),
+        (items[1].nodeid, 'skipped', 1),
+        (items[2].nodeid, 'timeout', 4),
+    ]
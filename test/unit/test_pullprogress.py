@@ -0,0 +1,49 @@
+import io
+
+from glotter.pullprogress import PullProgress
+
+
+def _events(layer, total):
+    return [
+        {'status': 'Pulling fs layer', 'id': layer},
+        {'status': 'Downloading', 'id': layer, 'progressDetail': {'current': total // 2, 'total': total}},
+        {'status': 'Download complete', 'id': layer},
+        {'status': 'Pull complete', 'id': layer},
+    ]
+
+
+def test_summary_aggregates_layers_across_images():
+    progress = PullProgress(2, stream=io.StringIO(), interval=0)
+    for event in _events('a', 2048):
+        progress.update('python:3.7', event)
+    progress.update('golang:1.12', _events('b', 1024)[1])
+    progress.image_done('python:3.7')
+    assert progress.summary() == '1/2 images, 1/2 layers, 2.5 KB/3.0 KB downloaded'
+
+
+def test_update_ignores_events_without_layers():
+    progress = PullProgress(1, stream=io.StringIO(), interval=0)
+    progress.update('python:3.7', {'status': 'Pulling from library/python', 'id': '3.7'})
+    progress.update('python:3.7', {'status': 'Digest: sha256:abc'})
+    assert progress.summary() == '0/1 images, 0/0 layers, 0 B/0 B downloaded'
+
+
+def test_already_existing_layers_count_as_done():
+    progress = PullProgress(1, stream=io.StringIO(), interval=0)
+    progress.update('python:3.7', {'status': 'Already exists', 'id': 'a'})
+    assert progress.summary() == '0/1 images, 1/1 layers, 0 B/0 B downloaded'
+
+
+def test_writes_a_line_per_finished_image_when_not_a_terminal():
+    stream = io.StringIO()
+    progress = PullProgress(1, stream=stream, interval=60)
+    for event in _events('a', 1024):
+        progress.update('python:3.7', event)
+    progress.image_done('python:3.7')
+    progress.close()
+    assert stream.getvalue().splitlines() == [
+        '0/1 images, 0/1 layers, 0 B/0 B downloaded',
+        'Pulled python:3.7',
+        '1/1 images, 1/1 layers, 1.0 KB/1.0 KB downloaded',
+        '1/1 images, 1/1 layers, 1.0 KB/1.0 KB downloaded',
+    ]
@@ -0,0 +1,156 @@
+import time
+import signal
+import threading
+
+import pytest
+
+from glotter import run
+from glotter.shard import Shard
+from glotter.catalog import SourceCatalog
+from glotter.testinfo import ContainerInfo
+from test.unit.fixtures import glotter_yml_projects, mock_projects, factory, docker
+
+
+class StreamMock:
+    def __init__(self, chunks, timed_out=False):
+        self._chunks = chunks
+        self.command = 'command'
+        self.timeout = 1
+        self.timed_out = timed_out
+
+    def iter_text(self):
+        return iter(self._chunks)
+
+
+class InfoMock:
+    def __init__(self, image):
+        self.container_info = ContainerInfo(image=image, tag='latest', cmd='cmd')
+
+
+class SourceMock:
+    def __init__(self, name, output='', error=None, timed_out=False, image='python'):
+        self.name = name
+        self.full_path = f'/src/{name}.py'
+        self.test_info = InfoMock(image)
+        self.timed_out = timed_out
+        self.extension = '.py'
+        self.language = 'python'
+        self.output = output
+        self.error = error
+        self.cleaned_up = False
+
+    def build(self):
+        if self.error is not None:
+            raise self.error
+
+    def run_stream(self, params):
+        return StreamMock([self.output[:2], self.output[2:], params], timed_out=self.timed_out)
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+def test_collect_runs_prompts_once_per_project_type(mock_projects, monkeypatch):
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt: prompts.append(prompt) or '5')
+    first, second, third = SourceMock('first'), SourceMock('second'), SourceMock('third')
+    runs = run._collect_runs({'fibonacci': [first, second], 'helloworld': [third], 'baklava': []})
+    assert prompts == ['input parameters for "fibonacci": ']
+    assert runs == [(first, '5'), (second, '5'), (third, '')]
+
+
+def test_get_project_runs_ignores_case(mock_projects, monkeypatch):
+    source = SourceMock('hello_world')
+    monkeypatch.setattr('glotter.settings.Settings.source_catalog', SourceCatalog({'helloworld': [source]}))
+    assert run._get_project_runs('HelloWorld') == [(source, '')]
+
+
+def test_get_project_runs_exits_without_sources(mock_projects, monkeypatch, capsys):
+    monkeypatch.setattr('glotter.settings.Settings.source_catalog', SourceCatalog({'helloworld': []}))
+    with pytest.raises(SystemExit):
+        run._get_project_runs('HelloWorld')
+    assert 'No valid sources found for project: "HelloWorld"' in capsys.readouterr().out
+
+
+def test_run_sources_prefixes_output_lines(factory, capsys):
+    sources = [SourceMock('first', output='one\ntwo\n'), SourceMock('second', output='three')]
+    run._run_sources([(source, '') for source in sources], jobs=2)
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(lines) == sorted([
+        '[python/first.py] one',
+        '[python/first.py] two',
+        '[python/second.py] three',
+    ])
+
+
+def test_run_sources_reports_errors_and_cleans_up(factory, capsys):
+    failing = SourceMock('failing', error=RuntimeError('unable to build'))
+    passing = SourceMock('passing')
+    results = run._run_sources([(failing, ''), (passing, '')], jobs=2)
+    assert [result.succeeded for result in results] == [False, True]
+    assert failing.cleaned_up and passing.cleaned_up
+    assert '[python/failing.py] error: unable to build' in capsys.readouterr().out
+
+
+def test_run_sources_reports_timeouts(factory, capsys):
+    source = SourceMock('slow', output='partial\n', timed_out=True)
+    result = run._run_sources([(source, '')], jobs=1)[0]
+    assert result.timed_out and not result.succeeded
+    assert capsys.readouterr().out.splitlines() == [
+        '[python/slow.py] partial',
+        '[python/slow.py] timed out after 1s',
+    ]
+
+
+def test_run_sources_runs_sources_image_by_image(factory, capsys):
+    sources = [SourceMock('a', image='python'), SourceMock('b', image='golang'), SourceMock('c', image='python')]
+    results = run._run_sources([(source, '') for source in sources], jobs=1)
+    assert [result.source.name for result in results] == ['a', 'c', 'b']
+
+
+def test_run_sources_removes_containers_after_last_source_of_image(factory, monkeypatch):
+    removed = []
+    monkeypatch.setattr(factory, 'cleanup_image', lambda info: removed.append(info.image))
+    monkeypatch.setattr('glotter.run.ContainerFactory', lambda: factory)
+    sources = [SourceMock('a', image='python'), SourceMock('b', image='golang'), SourceMock('c', image='python')]
+    run._run_sources([(source, '') for source in sources], jobs=1)
+    assert removed == ['python', 'golang']
+
+
+def test_run_sources_drops_sources_not_started_when_interrupted(factory):
+    class InterruptingSource(SourceMock):
+        def build(self):
+            # interrupt the main thread once it waits for the results while this source still runs, as Ctrl+C would
+            time.sleep(0.1)
+            signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+            time.sleep(0.2)
+
+    sources = [InterruptingSource('first'), SourceMock('second')]
+    with pytest.raises(KeyboardInterrupt):
+        run._run_sources([(source, '') for source in sources], jobs=1)
+    assert [source.cleaned_up for source in sources] == [True, False]
+
+
+def test_run_sources_returns_nothing_for_no_runs():
+    assert run._run_sources([], jobs=4) == []
+
+
+@pytest.mark.parametrize(('writes', 'expected'), [
+    (['a\nb', 'c\n'], ['> a', '> bc']),
+    (['no newline'], ['> no newline']),
+    (['\n'], ['> ']),
+])
+def test_prefixed_writer_prints_whole_lines(writes, expected, capsys):
+    writer = run._PrefixedWriter('>', threading.Lock())
+    for text in writes:
+        writer.write(text)
+    writer.flush()
+    assert capsys.readouterr().out.splitlines() == expected
+
+
+def test_select_shard_keeps_params(capsys):
+    runs = [(SourceMock(name), name) for name in ['first', 'second', 'third']]
+    selected = [run._select_shard(runs, Shard(index, 2)) for index in (1, 2)]
+    assert sorted(selected[0] + selected[1], key=lambda r: r[1]) == sorted(runs, key=lambda r: r[1])
+    assert all(source.name == params for source, params in selected[0] + selected[1])
+    assert 'shard 1/2: running 2 of 3 sources' in capsys.readouterr().out
@@ -0,0 +1,91 @@
+import pytest
+
+from glotter.scheduler import partition, partition_by_image, ImagePlan
+from glotter.testinfo import ContainerInfo
+
+
+class SourceMock:
+    def __init__(self, name, image):
+        self.name = name
+        self.test_info = self
+        self.container_info = ContainerInfo(image=image, tag='latest', cmd='cmd')
+
+    def __repr__(self):
+        return self.name
+
+
+def _sources(images):
+    return [SourceMock(f'{image}{index}', image) for index, image in enumerate(images)]
+
+
+def test_partition_returns_requested_number_of_groups():
+    groups = partition(range(10), 3)
+    assert len(groups) == 3
+    assert sorted(item for group in groups for item in group) == list(range(10))
+
+
+def test_partition_returns_empty_groups_when_fewer_items_than_groups():
+    groups = partition(['a'], 3)
+    assert groups == [['a'], [], []]
+
+
+@pytest.mark.parametrize(('weights', 'expected'), [
+    ({'a': 5, 'b': 3, 'c': 2}, [['a'], ['b', 'c']]),
+    ({'a': 1, 'b': 1, 'c': 1, 'd': 1}, [['a', 'c'], ['b', 'd']]),
+])
+def test_partition_balances_weight(weights, expected):
+    groups = partition(weights.keys(), 2, weight=weights.get)
+    assert groups == expected
+
+
+def test_image_plan_orders_items_image_by_image():
+    sources = _sources(['python', 'go', 'python', 'go', 'rust'])
+    plan = ImagePlan(sources)
+    assert [source.name for source in plan.items] == ['python0', 'python2', 'go1', 'go3', 'rust4']
+
+
+def test_image_plan_puts_items_without_source_first():
+    sources = _sources(['python', 'go'])
+    plan = ImagePlan(sources + ['other'], get_source=lambda item: None if item == 'other' else item)
+    assert plan.items == ['other'] + sources
+
+
+def test_image_plan_finish_returns_image_after_last_item():
+    sources = _sources(['python', 'go', 'python'])
+    plan = ImagePlan(sources)
+    assert plan.finish(sources[0]) is None
+    assert plan.finish(sources[1]).image == 'go'
+    assert plan.finish(sources[2]).image == 'python'
+
+
+def test_partition_by_image_keeps_images_together():
+    sources = _sources(['python', 'go', 'python', 'go'])
+    groups = partition_by_image(sources, 2)
+    assert sorted([source.name for source in group] for group in groups) == [['go1', 'go3'], ['python0', 'python2']]
+
+
+def test_partition_by_image_splits_images_that_would_leave_groups_empty():
+    sources = _sources(['python'] * 4)
+    groups = partition_by_image(sources, 2)
+    assert [len(group) for group in groups] == [2, 2]
+
+
+def test_image_plan_with_weights_puts_slowest_image_and_source_first():
+    sources = _sources(['python', 'go', 'python', 'go'])
+    weights = {'python0': 1, 'go1': 2, 'python2': 5, 'go3': 3}
+    plan = ImagePlan(sources, weight=lambda source: weights[source.name])
+    assert [source.name for source in plan.items] == ['python2', 'python0', 'go3', 'go1']
+
+
+def test_image_plan_with_weights_keeps_items_for_a_source_together():
+    first, second = _sources(['python', 'python'])
+    items = [(first, 'a'), (second, 'a'), (first, 'b'), (second, 'b')]
+    plan = ImagePlan(items, get_source=lambda item: item[0], weight=lambda source: 2 if source is second else 1)
+    assert plan.items == [(second, 'a'), (second, 'b'), (first, 'a'), (first, 'b')]
+
+
+def test_partition_by_image_balances_weight():
+    sources = _sources(['python', 'go', 'rust', 'go'])
+    weights = {'python0': 4, 'go1': 1, 'rust2': 2, 'go3': 1}
+    groups = partition_by_image(sources, 2, weight=lambda source: weights[source.name])
+    assert sorted([source.name for source in group] for group in groups) == [['go1', 'go3', 'rust2'], ['python0']]
@@ -0,0 +1,301 @@
+import os
+import sys
+import time
+import types
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import subprocess
+
+import pytest
+
+from glotter import server, serve
+from glotter.settings import Settings
+from glotter.server import forward, get_socket_path, is_server_running, make_socket_dir
+from test.unit.fixtures import factory, docker
+
+
+@pytest.fixture
+def socket_path(monkeypatch):
+    path = os.path.join(tempfile.mkdtemp(), 'glotter.sock')
+    monkeypatch.setattr(server, 'get_socket_path', lambda *args: path)
+    monkeypatch.delenv(server.NO_SERVER_VARIABLE, raising=False)
+    yield path
+    if os.path.exists(path):
+        os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+@pytest.fixture
+def source_root(monkeypatch):
+    root = tempfile.mkdtemp()
+    monkeypatch.setattr('glotter.settings.Settings.source_root', root)
+    monkeypatch.setattr('glotter.settings.Settings.cache_dir', os.path.join(root, '.glotter_cache'))
+    yield root
+    shutil.rmtree(root, ignore_errors=True)
+
+
+@pytest.fixture
+def discoveries(monkeypatch):
+    discoveries = []
+
+    def get_sources(path, index=None):
+        discoveries.append(path)
+        index.refresh()
+        return {}
+    monkeypatch.setattr(serve, 'get_sources', get_sources)
+    return discoveries
+
+
+@pytest.fixture
+def glotter_server(factory, socket_path, source_root, discoveries):
+    glotter_server = serve.Server(socket_path)
+    glotter_server._listen()
+    yield glotter_server
+    glotter_server.close()
+
+
+class ConnectionMock:
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def send(self, message):
+        pass
+
+    def receive(self):
+        self.closed.wait()
+        return None
+
+
+_CLIENT_SCRIPT = """
+import sys
+from glotter import server
+server.get_socket_path = lambda *args: {path!r}
+sys.exit(server.forward({argv!r}, '/project'))
+"""
+
+
+def _start_client(socket_path, argv, stdin=''):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root)
+    env.pop(server.NO_SERVER_VARIABLE, None)
+    with tempfile.TemporaryFile() as stdin_file:
+        stdin_file.write(stdin.encode('utf-8'))
+        stdin_file.seek(0)
+        return subprocess.Popen([sys.executable, '-c', _CLIENT_SCRIPT.format(path=socket_path, argv=argv)],
+                                env=env, stdin=stdin_file, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def test_get_socket_path_differs_by_project_and_config():
+    paths = {
+        get_socket_path('/project'),
+        get_socket_path('/project', '/project/.glotter.yml'),
+        get_socket_path('/other'),
+    }
+    assert len(paths) == 3
+    assert get_socket_path('/project') == get_socket_path('/project/')
+
+
+def test_get_socket_path_is_in_runtime_dir(monkeypatch):
+    monkeypatch.setenv('XDG_RUNTIME_DIR', '/run/user/1000')
+    assert get_socket_path('/project').startswith('/run/user/1000/glotter/')
+    monkeypatch.delenv('XDG_RUNTIME_DIR')
+    assert os.path.dirname(get_socket_path('/project')) == \
+        os.path.join(tempfile.gettempdir(), f'glotter-{os.getuid()}')
+
+
+def test_make_socket_dir_is_private(socket_path):
+    path = os.path.join(os.path.dirname(socket_path), 'sockets', 'glotter.sock')
+    make_socket_dir(path)
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+    os.rmdir(os.path.dirname(path))
+
+
+def test_make_socket_dir_refuses_shared_dir(socket_path):
+    os.chmod(os.path.dirname(socket_path), 0o777)
+    with pytest.raises(PermissionError):
+        make_socket_dir(socket_path)
+
+
+def test_forward_ignores_socket_of_other_user(glotter_server, monkeypatch, capsys):
+    uid = os.getuid()
+    monkeypatch.setattr(server, '_get_uid', lambda: uid + 1)
+    assert forward(['run'], '/project') is None
+    assert 'not private' in capsys.readouterr().err
+
+
+def test_forward_ignores_socket_in_shared_dir(glotter_server, socket_path, capsys):
+    os.chmod(os.path.dirname(socket_path), 0o777)
+    assert forward(['run'], '/project') is None
+    assert 'not private' in capsys.readouterr().err
+
+
+def test_peer_of_own_socket_is_same_user():
+    first, second = socket.socketpair()
+    with first, second:
+        assert server._is_same_user(first)
+
+
+def test_listen_refuses_file_it_did_not_create(factory, socket_path, source_root, discoveries):
+    with open(socket_path, 'w'):
+        pass
+    glotter_server = serve.Server(socket_path)
+    with pytest.raises(PermissionError):
+        glotter_server._listen()
+    assert os.path.exists(socket_path)
+
+
+def test_listen_replaces_socket_left_behind(factory, socket_path, source_root, discoveries):
+    stale = serve.Server(socket_path)
+    stale._listen()
+    stale._socket.close()
+    glotter_server = serve.Server(socket_path)
+    glotter_server._listen()
+    assert is_server_running(socket_path)
+    glotter_server.close()
+
+
+def test_forward_without_server(socket_path):
+    assert forward(['run'], '/project') is None
+    assert not is_server_running(socket_path)
+
+
+@pytest.mark.parametrize('argv', [['report'], ['download', '-l', 'python'], []])
+def test_forward_only_forwards_run_and_test(glotter_server, argv):
+    assert forward(argv, '/project') is None
+
+
+def test_forward_when_disabled(glotter_server, monkeypatch):
+    monkeypatch.setenv(server.NO_SERVER_VARIABLE, '1')
+    assert forward(['run'], '/project') is None
+
+
+def test_server_runs_command_for_client(glotter_server, socket_path, monkeypatch):
+    def run_command():
+        print(f'running {sys.argv[1:]}')
+        params = input('params: ')
+        print(f'got {params}', file=sys.stderr)
+        sys.exit(3)
+
+    monkeypatch.setattr('glotter.__main__.run_command', run_command)
+    client = _start_client(socket_path, ['run', '-l', 'python'], stdin='5 4 3\n')
+    glotter_server._accept()
+    stdout, stderr = client.communicate(timeout=10)
+
+    assert client.returncode == 3
+    assert stdout.decode('utf-8') == "running ['run', '-l', 'python']\nparams: "
+    assert stderr.decode('utf-8') == 'got 5 4 3\n'
+    assert sys.argv[0] != 'glotter'
+
+
+def test_server_reports_errors_to_client(glotter_server, socket_path, monkeypatch):
+    def run_command():
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr('glotter.__main__.run_command', run_command)
+    client = _start_client(socket_path, ['test'])
+    glotter_server._accept()
+    _, stderr = client.communicate(timeout=10)
+
+    assert client.returncode == 1
+    assert 'RuntimeError: boom' in stderr.decode('utf-8')
+
+
+def test_client_interrupt_cancels_command(glotter_server, socket_path, monkeypatch):
+    def run_command():
+        print('started')
+        time.sleep(10)
+        print('finished')
+
+    def interrupt_client_once_started():
+        client.stdout.readline()
+        client.send_signal(signal.SIGINT)
+
+    monkeypatch.setattr('glotter.__main__.run_command', run_command)
+    client = _start_client(socket_path, ['run'])
+    interrupter = threading.Thread(target=interrupt_client_once_started)
+    interrupter.start()
+    start = time.monotonic()
+    glotter_server._accept()
+    interrupter.join()
+    stdout, stderr = client.communicate(timeout=10)
+
+    assert time.monotonic() - start < 5
+    assert client.returncode == 130
+    assert stdout.decode('utf-8') == ''
+    assert stderr.decode('utf-8') == 'interrupted\n'
+
+
+def test_cancel_after_command_finished_is_ignored(glotter_server):
+    cancelled = threading.Event()
+    glotter_server._cancel(cancelled)
+    assert not cancelled.is_set()
+    glotter_server._cancel_pending = True
+    glotter_server._handle_interrupt(signal.SIGINT, None)
+    with pytest.raises(KeyboardInterrupt):
+        glotter_server._handle_interrupt(signal.SIGINT, None)
+
+
+def test_server_forgets_test_mappings_of_command(glotter_server, monkeypatch):
+    def run_command():
+        Settings().test_mappings.setdefault('helloworld', []).append(run_command)
+
+    monkeypatch.setattr('glotter.__main__.run_command', run_command)
+    before = dict(Settings().test_mappings)
+    connection = ConnectionMock()
+    assert glotter_server.run_command(connection, ['test']) == 0
+    connection.closed.set()
+    assert Settings().test_mappings == before
+
+
+def test_server_forgets_project_modules_but_not_installed_ones(glotter_server, source_root, monkeypatch):
+    monkeypatch.setattr('glotter.settings.Settings.project_root', source_root)
+    monkeypatch.setattr(sys, 'prefix', os.path.join(source_root, 'venv'))
+    before = set(sys.modules)
+    for name, path in [('test_project', 'test/test_project.py'), ('pytest_in_venv', 'venv/lib/pytest_in_venv.py'),
+                       ('outside_project', '/elsewhere/outside_project.py')]:
+        module = types.ModuleType(name)
+        module.__file__ = os.path.join(source_root, path)
+        monkeypatch.setitem(sys.modules, name, module)
+    glotter_server._forget_project_modules(before)
+    assert 'test_project' not in sys.modules
+    assert 'pytest_in_venv' in sys.modules
+    assert 'outside_project' in sys.modules
+
+
+def test_server_keeps_containers_warm(glotter_server, factory):
+    assert factory.keep_warm
+
+
+def test_server_discovers_sources_again_only_when_they_change(glotter_server, source_root, discoveries):
+    catalog = glotter_server._refresh_catalog()
+    assert glotter_server._refresh_catalog() is catalog
+    assert len(discoveries) == 1
+
+    os.makedirs(os.path.join(source_root, 'python'))
+    stat = os.stat(source_root)
+    os.utime(source_root, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert glotter_server._refresh_catalog() is not catalog
+    assert len(discoveries) == 2
+
+
+def test_close_removes_socket(glotter_server, socket_path):
+    assert is_server_running(socket_path)
+    glotter_server._accept()
+    glotter_server.close()
+    assert not os.path.exists(socket_path)
+
+
+def test_forward_when_server_stops_mid_command(socket_path):
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen()
+    client = _start_client(socket_path, ['run'])
+    connection, _ = listener.accept()
+    connection.close()
+    listener.close()
+    _, stderr = client.communicate(timeout=10)
+    assert client.returncode == 1
+    assert 'stopped' in stderr.decode('utf-8')
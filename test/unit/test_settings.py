@@ -27,3 +27,16 @@ def test_add_test_mapping_when_project_type_already_has_mapping(glotter_yml_proj
 
 def test_get_test_mapping_name_when_project_type_not_found(glotter_yml_projects):
     assert Settings().get_test_mapping_name('nonexistentproject') == []
+
+
+def test_source_catalog_is_discovered_once(glotter_yml_projects, monkeypatch):
+    discovered = []
+    monkeypatch.setattr('glotter.catalog.SourceCatalog.discover', lambda path: discovered.append(path) or object())
+    settings = Settings()
+    settings.refresh_source_catalog()
+    catalog = settings.source_catalog
+    assert settings.source_catalog is catalog
+    settings.refresh_source_catalog()
+    assert settings.source_catalog is not catalog
+    assert discovered == [settings.source_root] * 2
+    settings.refresh_source_catalog()
@@ -0,0 +1,82 @@
+import argparse
+
+import pytest
+
+from glotter.shard import Shard, parse_shard
+
+
+class SourceMock:
+    def __init__(self, name):
+        self.name = name
+        self.full_path = f'/src/{name}'
+
+    def __repr__(self):
+        return self.name
+
+
+class StatsMock:
+    def __init__(self, durations):
+        self._durations = durations
+
+    @property
+    def exists(self):
+        return bool(self._durations)
+
+    def weight(self, source):
+        return self._durations.get(source.name, 1)
+
+
+def _sources(count):
+    return [SourceMock(f'source{index}') for index in range(count)]
+
+
+@pytest.mark.parametrize(('value', 'expected'), [
+    ('1/1', Shard(1, 1)),
+    ('2/4', Shard(2, 4)),
+])
+def test_from_string(value, expected):
+    assert Shard.from_string(value) == expected
+
+
+@pytest.mark.parametrize('value', ['1', '0/2', '3/2', 'a/b', '1/2/3', '1/0'])
+def test_from_string_rejects_invalid_shards(value):
+    with pytest.raises(ValueError):
+        Shard.from_string(value)
+
+
+def test_parse_shard_raises_argparse_error():
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard('5/4')
+
+
+def test_str():
+    assert str(Shard(2, 4)) == '2/4'
+
+
+def test_shards_cover_every_source_once():
+    sources = _sources(10)
+    selected = [Shard(index, 3).select(sources) for index in range(1, 4)]
+    assert sorted(source.name for group in selected for source in group) == sorted(s.name for s in sources)
+    assert sorted(len(group) for group in selected) == [3, 3, 4]
+
+
+def test_select_does_not_depend_on_discovery_order():
+    sources = _sources(7)
+    shard = Shard(2, 3)
+    assert shard.select(sources) == shard.select(list(reversed(sources)))
+
+
+def test_select_balances_by_recorded_durations():
+    stats = StatsMock({'source0': 10, 'source1': 4, 'source2': 3, 'source3': 3})
+    sources = _sources(4)
+    assert Shard(1, 2).select(sources, stats) == [sources[0]]
+    assert Shard(2, 2).select(sources, stats) == [sources[1], sources[2], sources[3]]
+
+
+def test_select_balances_by_count_without_recorded_durations():
+    sources = _sources(4)
+    assert [len(Shard(index, 2).select(sources, StatsMock({}))) for index in (1, 2)] == [2, 2]
+
+
+def test_select_returns_nothing_when_more_shards_than_sources():
+    assert Shard(3, 3).select(_sources(2)) == []
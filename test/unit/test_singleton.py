@@ -0,0 +1,24 @@
+import time
+import threading
+
+from glotter.singleton import Singleton
+
+
+class SlowSingleton(metaclass=Singleton):
+    created = 0
+
+    def __init__(self):
+        time.sleep(0.05)
+        SlowSingleton.created += 1
+
+
+def test_singleton_is_created_once_across_threads():
+    Singleton._instances.pop(SlowSingleton, None)
+    instances = []
+    threads = [threading.Thread(target=lambda: instances.append(SlowSingleton())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert SlowSingleton.created == 1
+    assert all(instance is instances[0] for instance in instances)
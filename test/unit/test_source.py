@@ -1,6 +1,8 @@
 import os
 import pytest
 
+from glotter.limits import ResourceLimits
+from glotter.project import Project
 from glotter.source import Source
 from glotter.testinfo import TestInfo
 from test.unit.fixtures import test_info_string_no_build, test_info_string_with_build, factory, docker, no_io, source_no_build, source_with_build
@@ -44,8 +46,22 @@ def test_build_runs_build_command(factory, source_with_build, monkeypatch, no_io
     container = factory.get_container(source_with_build)
     actual = container.execs[0]
     assert actual.cmd.strip() == build_cmd.strip()
-    assert not actual['detach']
-    assert actual['workdir'] == '/src'
+    assert actual['workdir'] == '/src/SOURCE_DIR'
+
+
+def test_build_skips_build_command_when_restored_from_cache(source_with_build, monkeypatch, no_io):
+    monkeypatch.setattr('glotter.buildcache.BuildCache.restore', lambda *args, **kwargs: True)
+    monkeypatch.setattr('glotter.source.Source._container_exec',
+                        lambda *args, **kwargs: pytest.fail('build command was executed'))
+    source_with_build.build()
+
+
+def test_build_stores_build_in_cache(source_with_build, monkeypatch, no_io):
+    stored = []
+    monkeypatch.setattr('glotter.source.Source._container_exec', lambda *args, **kwargs: (0, b''))
+    monkeypatch.setattr('glotter.buildcache.BuildCache.store', lambda self, src, key: stored.append((src, key)))
+    source_with_build.build()
+    assert stored == [(source_with_build, 'KEY')]
 
 
 def test_build_raises_error_on_non_zero_exit_code_from_exec(source_with_build, monkeypatch, no_io):
@@ -61,8 +77,7 @@ def test_run_execs_run_command(factory, source_no_build, no_io):
     container = factory.get_container(source_no_build)
     actual = container.execs[0]
     assert actual.cmd.strip() == run_cmd.strip()
-    assert not actual['detach']
-    assert actual['workdir'] == '/src'
+    assert actual['workdir'] == '/src/SOURCE_DIR'
 
 
 def test_run_execs_run_command_with_params(factory, source_no_build, no_io):
@@ -72,8 +87,7 @@ def test_run_execs_run_command_with_params(factory, source_no_build, no_io):
     container = factory.get_container(source_no_build)
     actual = container.execs[0]
     assert actual.cmd.strip() == run_cmd.strip()
-    assert not actual['detach']
-    assert actual['workdir'] == '/src'
+    assert actual['workdir'] == '/src/SOURCE_DIR'
 
 
 def test_run_on_non_zero_exit_code_from_exec_raises_no_error(source_no_build, monkeypatch, no_io):
@@ -91,8 +105,7 @@ def test_exec_runs_command(factory, source_no_build, no_io):
     container = factory.get_container(source_no_build)
     actual = container.execs[0]
     assert actual.cmd.strip() == exec_cmd.strip()
-    assert not actual['detach']
-    assert actual['workdir'] == '/src'
+    assert actual['workdir'] == '/src/SOURCE_DIR'
 
 
 def test_exec_on_non_zero_exit_code_raises_no_error(source_no_build, monkeypatch, no_io):
@@ -103,3 +116,30 @@ def test_exec_on_non_zero_exit_code_raises_no_error(source_no_build, monkeypatch
         source_no_build.exec(exec_cmd)
     except Exception as e:
         pytest.fail(f'unexpected exception was thrown: {e}')
+
+
+def test_run_stream_streams_run_command(factory, source_no_build, no_io):
+    stream = source_no_build.run_stream(params='param')
+    assert list(stream) == [b'executed']
+    assert stream.exit_code == 0
+    actual = factory.get_container(source_no_build).execs[0]
+    assert actual.cmd == f'{source_no_build.test_info.container_info.cmd} param'
+    assert actual['workdir'] == '/src/SOURCE_DIR'
+
+
+def test_container_exec_returns_exit_code_and_output(factory, source_no_build, no_io, monkeypatch):
+    monkeypatch.setattr('test.unit.mockdocker.DockerApi.exec_inspect', lambda exec_id: {'ExitCode': 2})
+    assert source_no_build._container_exec('command') == (2, b'executed')
+
+
+def test_limits_in_testinfo_override_project_limits(test_info_string_no_build, monkeypatch):
+    monkeypatch.setattr('glotter.settings.Settings.projects', {
+        'fibonacci': Project(words=['fibonacci'], limits=ResourceLimits(timeout=10, cpus=1)),
+    })
+    src = Source('name.py', 'python', 'path', test_info_string_no_build + '  timeout: 1\n', project_type='fibonacci')
+    assert src.limits == ResourceLimits(timeout=1, cpus=1)
+
+
+def test_limits_without_project_type_come_from_testinfo(test_info_string_no_build):
+    src = Source('name.py', 'python', 'path', test_info_string_no_build + '  memory: "64m"\n')
+    assert src.limits == ResourceLimits(memory='64m')
@@ -1,7 +1,9 @@
 import pytest
 
 from uuid import uuid4 as uuid
+from glotter import testinfo
 from glotter.testinfo import ContainerInfo, FolderInfo, TestInfo
+from glotter.limits import ResourceLimits
 from glotter.project import NamingScheme
 
 
@@ -24,6 +26,13 @@ def test_container_info_from_dict(build):
     assert info == expected
 
 
+def test_container_info_from_dict_with_limits():
+    dct = {'image': 'python', 'tag': '3.7', 'cmd': 'python', 'timeout': 5, 'memory': '64m'}
+    info = ContainerInfo.from_dict(dct)
+    assert info.limits == ResourceLimits(timeout=5, memory='64m')
+    assert info.to_dict() == dct
+
+
 def test_folder_info_from_dict():
     dct = {
         'extension': '.py',
@@ -55,3 +64,54 @@ def test_test_info_from_dict():
     })
     expected = TestInfo(container_info=ci, file_info=fi)
     assert test_info == expected
+
+
+class SourceMock:
+    def __init__(self, name):
+        self.name = name
+        self.extension = '.py'
+
+
+_TEMPLATE = """folder:
+  extension: ".py"
+  naming: "underscore"
+
+container:
+  image: "python"
+  tag: "3.7-alpine"
+  cmd: "python {{ source.name }}{{ source.extension }}"
+"""
+
+
+def test_test_info_from_string_renders_template_per_source():
+    first = TestInfo.from_string(_TEMPLATE, SourceMock('first'))
+    second = TestInfo.from_string(_TEMPLATE, SourceMock('second'))
+    assert first.container_info.cmd == 'python first.py'
+    assert second.container_info.cmd == 'python second.py'
+
+
+def test_test_info_from_string_compiles_template_once():
+    template = _TEMPLATE.replace('python {{', 'python3 {{')
+    testinfo._compile.cache_clear()
+    for name in ('first', 'second', 'third'):
+        TestInfo.from_string(template, SourceMock(name))
+    assert (testinfo._compile.cache_info().hits, testinfo._compile.cache_info().misses) == (2, 1)
+
+
+def test_test_info_from_string_without_template_syntax_is_not_rendered(monkeypatch):
+    def compile_template(string):
+        raise AssertionError('rendered a testinfo without template syntax')
+    monkeypatch.setattr(testinfo, '_compile', compile_template)
+    string = _TEMPLATE.replace('{{ source.name }}{{ source.extension }}', 'main.py')
+    info = TestInfo.from_string(string, SourceMock('first'))
+    assert info.container_info.cmd == 'python main.py'
+
+
+@pytest.mark.parametrize(('string', 'expected'), [
+    ('cmd: "{{ source.name }}"', True),
+    ('cmd: "{% if true %}x{% endif %}"', True),
+    ('cmd: "x" {# comment #}', True),
+    ('cmd: "{ not: template }"', False),
+])
+def test_has_template_syntax(string, expected):
+    assert testinfo.has_template_syntax(string) == expected